@@ -11,8 +11,18 @@ from datetime import datetime
 # Adicionar o diretório pai ao path para permitir importações
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.processor import LogProcessor
-from core.report_manager import ReportManager
+def _create_processor(engine: str = 'threads'):
+    """Cria o processador do motor escolhido; os módulos pesados são importados só aqui."""
+    if engine == 'async':
+        from core.async_engine import AsyncLogProcessor
+        return AsyncLogProcessor()
+    from core.processor import LogProcessor
+    return LogProcessor()
+
+def _create_report_manager():
+    """Cria o gerenciador de relatórios (importado apenas pelos comandos que o usam)."""
+    from core.report_manager import ReportManager
+    return ReportManager()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -21,11 +31,18 @@ def main():
         epilog="""
 Exemplos de uso:
   python cli/main.py                    # Execução manual
+  python cli/main.py --daemon --interval 60  # Execução contínua
+  python cli/main.py --watch /mnt/logs  # Processar cada escrita em diretório local/montado
+  python cli/main.py --backfill /arquivo  # Carregar ZIPs do histórico (sem diretório: FTP)
   python cli/main.py --status           # Ver status
   python cli/main.py --config           # Ver configurações
   python cli/main.py --stats            # Ver estatísticas
   python cli/main.py --report-daily     # Gerar relatório diário
   python cli/main.py --report-weekly    # Gerar relatório semanal
+  python cli/main.py --report-range 2025-01-01 2025-01-31  # Regerar relatórios do período
+  python cli/main.py --report-traffic   # Tráfego EDI por hora e formato
+  python cli/main.py --backfill-rollups # Recalcular rollups do histórico
+  python cli/main.py --migrate-formats  # Migrar para esquema normalizado
         """
     )
     
@@ -36,14 +53,24 @@ Exemplos de uso:
                        help='Mostrar status do processamento')
     parser.add_argument('--stats', action='store_true', 
                        help='Mostrar estatísticas do processamento')
+    parser.add_argument('--exact', action='store_true',
+                       help='Com --status, usar contagem exata (COUNT) em vez dos metadados')
     
     # Argumentos de relatórios
     parser.add_argument('--report-daily', action='store_true',
                        help='Gerar relatório diário')
     parser.add_argument('--report-weekly', action='store_true',
                        help='Gerar relatório semanal')
+    parser.add_argument('--report-range', nargs=2, metavar=('INICIO', 'FIM'),
+                       help='Regerar os relatórios diários de INICIO a FIM (AAAA-MM-DD, inclusive)')
+    parser.add_argument('--report-workers', type=int, default=1,
+                       help='Com --report-range, número de partições processadas em paralelo')
+    parser.add_argument('--report-traffic', action='store_true',
+                       help='Gerar relatório de tráfego EDI por hora e formato')
     parser.add_argument('--stats-days', type=int, default=30,
                        help='Número de dias para estatísticas (padrão: 30)')
+    parser.add_argument('--backfill-rollups', action='store_true',
+                       help='Recalcular os rollups por hora/dia a partir do histórico de sessões')
     
     # Argumentos de limpeza
     parser.add_argument('--cleanup', action='store_true',
@@ -55,39 +82,80 @@ Exemplos de uso:
     parser.add_argument('--force-reprocess', action='store_true',
                        help='Forçar reprocessamento de todos os arquivos ConsoleEDI_')
     
-    args = parser.parse_args()
+    # Execução contínua
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                       help='Motor de ingestão: pipeline em threads (padrão) ou asyncio')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Executar continuamente em um único processo, com agendamento interno')
+    parser.add_argument('--interval', type=int,
+                       help='Com --daemon, intervalo em segundos entre ciclos (padrão: DAEMON_CONFIG)')
+    parser.add_argument('--watch', nargs='*', metavar='DIR',
+                       help='Monitorar diretórios locais/montados e processar cada escrita (padrão: WATCH_CONFIG)')
+    parser.add_argument('--backfill', nargs='*', metavar='DIR',
+                       help='Carregar os ZIPs ConsoleEDI_*.Log.zip dos diretórios (padrão: servidor FTP), retomável')
+    
+    parser.add_argument('--benchmark-catchup', type=int, metavar='N',
+                       help='Comparar perfis de carga com N registros sintéticos em SQLite local')
+    
+    # Argumentos de esquema do banco
+    parser.add_argument('--migrate-formats', action='store_true',
+                       help='Migrar EDI_LOGS para o esquema normalizado (dimensão EDI_FORMATS)')
     
-    # Inicializar processadores
-    processor = LogProcessor()
-    report_manager = ReportManager()
+    args = parser.parse_args()
     
-    # Executar comandos
+    # Executar comandos (processadores são criados apenas pelos comandos que os usam)
     if args.config:
-        processor.show_config()
+        _create_processor(args.engine).show_config()
         return
     
     if args.status:
-        processor.show_status()
+        _create_processor(args.engine).show_status(exact=args.exact)
         return
     
     if args.stats:
-        report_manager.print_statistics(args.stats_days)
+        _create_report_manager().print_statistics(args.stats_days)
         return
     
     if args.report_daily:
-        report_file = report_manager.generate_daily_report()
+        report_file = _create_report_manager().generate_daily_report()
         if report_file:
             print(f"📊 Relatório salvo em: {report_file}")
         return
     
     if args.report_weekly:
-        report_file = report_manager.generate_weekly_report()
+        report_file = _create_report_manager().generate_weekly_report()
+        if report_file:
+            print(f"📊 Relatório salvo em: {report_file}")
+        return
+    
+    if args.report_range:
+        try:
+            start_date, end_date = (datetime.strptime(value, '%Y-%m-%d') for value in args.report_range)
+        except ValueError:
+            print("❌ Datas inválidas - use o formato AAAA-MM-DD")
+            sys.exit(1)
+        report_manager = _create_report_manager()
+        report_files = report_manager.generate_report_range(start_date, end_date, args.report_workers)
+        if report_files:
+            print(f"📊 Relatórios salvos em: {report_manager.reports_dir}")
+        return
+    
+    if args.report_traffic:
+        report_file = _create_report_manager().generate_traffic_report()
         if report_file:
             print(f"📊 Relatório salvo em: {report_file}")
         return
     
+    if args.backfill_rollups:
+        print("🔄 Recalculando rollups de sessões...")
+        days = _create_report_manager().state_store.backfill_rollups()
+        print(f"✅ Rollups recalculados: {days} dias agregados")
+        return
+    
     if args.cleanup:
         print("🧹 Iniciando limpeza...")
+        processor = _create_processor(args.engine)
+        report_manager = _create_report_manager()
         processor.zip_processor.cleanup_temp_files()
         processor.csv_processor.cleanup_old_csvs()
         report_manager.cleanup_old_reports()
@@ -124,8 +192,42 @@ Exemplos de uso:
             sys.exit(1)
         return
     
+    if args.benchmark_catchup:
+        from core.catchup import benchmark_catchup
+        benchmark_catchup(args.benchmark_catchup)
+        return
+    
+    if args.migrate_formats:
+        print("🔄 Migrando EDI_LOGS para o esquema normalizado...")
+        from db.sql_server_client import migrate_to_normalized_schema
+        if migrate_to_normalized_schema():
+            print("✅ Migração concluída! Ative SQL_SCHEMA_CONFIG['normalized_formats'] em config/settings.py.")
+        else:
+            print("❌ Erro durante a migração!")
+            sys.exit(1)
+        return
+    
+    if args.backfill is not None:
+        from core.backfill import Backfill
+        if not Backfill(_create_processor()).run(args.backfill):
+            sys.exit(1)
+        return
+    
+    if args.watch is not None:
+        from core.log_watcher import LogWatcher
+        if not LogWatcher(_create_processor(args.engine), args.watch).run():
+            sys.exit(1)
+        return
+    
+    if args.daemon:
+        from core.daemon import ProcessingDaemon
+        ProcessingDaemon(_create_processor(args.engine), _create_report_manager(), args.interval).run()
+        return
+    
     # Execução padrão - processamento completo
     print("🚀 Iniciando processamento EDI...")
+    processor = _create_processor(args.engine)
+    report_manager = _create_report_manager()
     success = processor.run_processing()
     
     if success:
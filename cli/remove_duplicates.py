@@ -7,10 +7,15 @@ Resolve problemas de arquivos duplicados e reset do banco de dados.
 """
 
 import os
-import sqlite3
+import sys
 import shutil
 from datetime import datetime
 
+# Permitir execução direta (python cli/remove_duplicates.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.state_store import get_state_store
+
 def reset_processing():
     """Reseta completamente o processamento, removendo arquivos temporários e resetando banco."""
     print("🔄 RESETANDO PROCESSAMENTO EDI")
@@ -36,16 +41,13 @@ def reset_processing():
     # 3. Resetar banco de dados
     print("🗄️ Resetando banco de dados...")
     try:
-        conn = sqlite3.connect('processed_files.db')
-        cursor = conn.cursor()
+        store = get_state_store()
+        store.init_schema()
         
         # Limpar tabelas
-        cursor.execute("DELETE FROM processed_zips")
-        cursor.execute("DELETE FROM processed_logs")
-        cursor.execute("DELETE FROM processing_sessions")
-        
-        conn.commit()
-        conn.close()
+        store.clear_tables(['processed_zips', 'processed_logs', 'processing_sessions', 'loader_tuning',
+                           'session_rollup_hourly', 'session_rollup_daily', 'edi_traffic_hourly',
+                           'log_offsets', 'processed_zip_members', 'report_state'])
         print("✅ Banco de dados resetado")
         
     except Exception as e:
@@ -72,11 +74,9 @@ def clean_duplicates_only():
     # 2. Resetar apenas tabela de ZIPs
     print("🗄️ Resetando controle de ZIPs...")
     try:
-        conn = sqlite3.connect('processed_files.db')
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM processed_zips")
-        conn.commit()
-        conn.close()
+        store = get_state_store()
+        store.init_schema()
+        store.clear_tables(['processed_zips', 'processed_zip_members'])
         print("✅ Controle de ZIPs resetado")
         
     except Exception as e:
@@ -93,13 +93,11 @@ def force_reprocess_logs():
     print("=" * 50)
     
     try:
-        conn = sqlite3.connect('processed_files.db')
-        cursor = conn.cursor()
+        store = get_state_store()
+        store.init_schema()
         
         # Limpar apenas a tabela de logs processados
-        cursor.execute("DELETE FROM processed_logs")
-        conn.commit()
-        conn.close()
+        store.clear_tables(['processed_logs', 'log_offsets'])
         
         print("✅ Controle de logs resetado - todos os arquivos serão reprocessados")
         return True
@@ -131,19 +129,13 @@ def show_status():
     
     # Verificar banco de dados
     try:
-        conn = sqlite3.connect('processed_files.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM processed_zips")
-        zips_processed = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM processed_logs")
-        logs_processed = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM processing_sessions")
-        sessions = cursor.fetchone()[0]
+        store = get_state_store()
+        store.init_schema()
         
-        conn.close()
+        ledger = store.ledger_counts()
+        zips_processed = ledger['zips']
+        logs_processed = ledger['logs']
+        sessions = store.session_count()
         
         print(f"🗄️ ZIPs processados (DB): {zips_processed}")
         print(f"🗄️ Logs processados (DB): {logs_processed}")
@@ -19,6 +19,16 @@ DB_CONFIG = {
     'trust_server_certificate': 'yes'  # Confiar em certificados auto-assinados
 }
 
+# Esquema normalizado opcional no SQL Server
+# Com 'normalized_formats' ativo, formato_processo vira uma chave SMALLINT em EDI_FORMATS
+# e EDI_LOGS passa a ser uma view sobre a tabela de fatos (migração: --migrate-formats)
+SQL_SCHEMA_CONFIG = {
+    'normalized_formats': False,
+    'formats_table': 'EDI_FORMATS',
+    'fact_table': 'EDI_LOGS_DATA',
+    'legacy_table': 'EDI_LOGS_LEGACY'  # Nome da tabela original após a migração
+}
+
 # Configurações do Compartilhamento SMB (LEGADO - pode ser removido)
 # O sistema irá processar apenas arquivos com padrão 'ConsoleEDI_' nesta pasta
 SMB_CONFIG = {
@@ -56,6 +66,15 @@ LOCAL_CONFIG = {
     'max_file_size_mb': 100
 }
 
+# Configurações do SQLite local (sink de fallback quando não há pyodbc)
+SQLITE_CONFIG = {
+    'journal_mode': 'WAL',        # Leitores não bloqueiam o escritor
+    'synchronous': 'NORMAL',      # Seguro com WAL e bem mais rápido que FULL
+    'cache_size_kb': 20000,       # Cache de páginas (~20 MB)
+    'temp_store': 'MEMORY',
+    'busy_timeout_ms': 5000
+}
+
 # Configurações de Processamento
 PROCESSING_CONFIG = {
     'log_file_pattern': 'ConsoleEDI_',  # Apenas arquivos que começam com 'ConsoleEDI_'
@@ -71,6 +90,135 @@ PROCESSING_CONFIG = {
     'check_file_changes': True  # Verifica mudanças no tamanho/timestamp do arquivo
 }
 
+# Histórico arquivado (ConsoleEDI_*.Log.zip no FTP)
+# Com 'streaming' os membros são lidos direto do ZIP (ZipFile.open) pelo parser de blocos,
+# sem extractall nem arquivos em temp_unzipped_logs; o ZIP baixado fica em um buffer em memória
+ZIP_CONFIG = {
+    'enabled': False,             # Processa os ZIPs a cada ciclo (padrão: apenas logs .Log)
+    'streaming': True,            # False: baixa e extrai em temp_unzipped_logs (modo antigo)
+    'spool_max_bytes': 64 * 1024 * 1024  # ZIPs maiores que isso transbordam do buffer para disco
+}
+
+# Configurações da Outbox local (fila de registros pendentes para o SQL Server)
+# O parser sempre grava aqui; o dreno envia em lotes grandes quando o banco está acessível
+OUTBOX_CONFIG = {
+    'outbox_dir': 'outbox',
+    'drain_batch_size': 50000,   # Registros por transação no dreno
+    'connect_timeout': 5         # Timeout curto para detectar banco fora do ar
+}
+
+# Modo catch-up: perfil de alta vazão para grandes backlogs (ex.: após queda do banco)
+CATCHUP_CONFIG = {
+    'enabled': True,
+    'backlog_threshold_records': 200000,  # Registros pendentes na outbox que ativam o modo
+    'drain_batch_size': 200000,           # Lote por transação durante o catch-up
+    'max_connections': 8,                 # Conexões paralelas no dreno
+    'quiet_logging': True,                # Sem log por lote/arquivo durante o catch-up
+    'disable_unique_index': False         # Desabilita o índice único na carga e reconstrói ao final
+}
+
+# Controlador adaptativo do carregador (tamanho de lote e conexões paralelas)
+# Parte de PROCESSING_CONFIG['batch_size'] / ['max_workers'] e ajusta pela latência medida
+ADAPTIVE_LOADER_CONFIG = {
+    'enabled': True,
+    'latency_budget_sec': 5.0,    # Latência máxima aceitável por lote
+    'min_batch_size': 500,
+    'max_batch_size': 200000,
+    'min_workers': 1,
+    'max_workers': 16,
+    'increase_factor': 1.5,       # Crescimento do lote enquanto a vazão melhora
+    'decrease_factor': 0.5        # Redução do lote ao estourar a latência
+}
+
+# Pipeline em estágios (download -> parse/filtro -> carga) com filas limitadas
+PIPELINE_CONFIG = {
+    'enabled': True,
+    'download_workers': 2,        # Cada worker abre sua própria conexão FTP
+    'parse_workers': 2,
+    'load_workers': 1,
+    'queue_size': 4               # Itens em espera entre estágios (backpressure)
+}
+
+# Fontes de logs 'ConsoleEDI_' (vários servidores/diretórios FTP e o compartilhamento SMB legado)
+# 'config' sobrescreve chaves de FTP_CONFIG/SMB_CONFIG. A primeira fonte ativa mantém o nome
+# original dos logs; nas demais o nome local recebe o sufixo _<name> (ex.: ConsoleEDI_20250101_console2.Log).
+# Com uma única fonte FTP sem sobrescritas o ciclo usa o pipeline em estágios (PIPELINE_CONFIG).
+SOURCES = [
+    {'name': 'console_principal', 'type': 'ftp', 'enabled': True, 'config': {}},
+    {'name': 'smb_legado', 'type': 'smb', 'enabled': False, 'config': {}, 'subdir': ''}
+]
+
+# Escalonador justo entre fontes (orçamento global de workers)
+SCHEDULER_CONFIG = {
+    'max_workers': 4,             # Workers compartilhados por todas as fontes
+    'max_per_source': 2           # Conexões/arquivos simultâneos por fonte (padrão de 'max_connections')
+}
+
+# Faixas de prioridade: o ConsoleEDI_ do dia (faixa ativa) antes do backlog
+PRIORITY_CONFIG = {
+    'enabled': True,
+    'active_latency_target_sec': 15,  # Meta entre o início do ciclo e a carga do log do dia
+    'backlog_budget_sec': 45          # No modo daemon, backlog e dreno da outbox só são iniciados até este ponto do ciclo
+}
+
+# Motor asyncio (alternativa ao LogProcessor, selecionado com --engine async)
+ASYNC_ENGINE_CONFIG = {
+    'max_transfers': 8,           # Downloads FTP simultâneos
+    'max_parsers': 2,             # Conversões/filtros simultâneos
+    'max_db_batches': 2,          # Envios simultâneos ao banco
+    'executor_threads': 16        # Threads do executor para ftplib/pyodbc bloqueantes
+}
+
+# Modo daemon (processo contínuo com agendamento interno)
+DAEMON_CONFIG = {
+    'interval_sec': 60,           # Intervalo entre o início de ciclos
+    'lock_file': 'processing.lock',  # Impede ciclos sobrepostos entre processos
+    'daily_report_each_cycle': True
+}
+
+# Monitoramento de diretórios locais/montados (--watch): processa escritas sem esperar o próximo ciclo
+WATCH_CONFIG = {
+    'directories': [],            # Padrão: ponto de montagem do SMB_CONFIG
+    'backend': 'auto',            # 'inotify', 'poll' ou 'auto' (inotify exceto em montagens de rede)
+    'poll_interval_sec': 1.0,     # Intervalo do polling por stat
+    'debounce_sec': 0.2,          # Agrupa escritas em rajada antes de ler
+    'read_chunk_bytes': 4 * 1024 * 1024,  # Bytes lidos por vez a partir do último offset
+    'session_interval_sec': 60    # Uma sessão por janela; janelas sem escrita são coalescidas
+}
+
+# Backfill do histórico ConsoleEDI_*.Log.zip (--backfill): membros descompactados e parseados em processos
+BACKFILL_CONFIG = {
+    'workers': None,              # Processos de parsing (padrão: núcleos da máquina)
+    'max_pending_per_worker': 2,  # Membros em espera por processo (limita ZIPs baixados em disco)
+    'progress_interval_sec': 5    # Intervalo entre as linhas de progresso/vazão
+}
+
+# Deduplicação por ordenação externa no backfill: runs ordenados em disco + merge k-way
+# Cada registro único chega uma única vez à outbox, dispensando remove_duplicated_files após a carga
+EXTERNAL_DEDUPE_CONFIG = {
+    'enabled': True,
+    'work_dir': 'dedupe_runs',    # Runs pendentes sobrevivem a interrupções e entram no próximo merge
+    'run_records': 500000,        # Registros por run (limitado pelo orçamento de memória por processo)
+    'merge_fan_in': 64,           # Runs abertos por passagem de merge
+    'segment_records': 200000     # Registros únicos por segmento gravado na outbox
+}
+
+# Divisão dos logs remotos entre várias instâncias (leases com expiração)
+SHARDING_CONFIG = {
+    'enabled': False,
+    'backend': 'auto',            # 'sqlserver', 'sqlite' ou 'auto' (SQL Server se pyodbc existir)
+    'table': 'EDI_FILE_LEASES',   # Tabela compartilhada de leases no SQL Server
+    'sqlite_path': 'file_leases.db',  # Substituto local (instâncias na mesma máquina / testes)
+    'lease_seconds': 600,         # Lease não renovado expira e é assumido por outra instância
+    'instance_id': None           # Padrão: host:pid
+}
+
+# Cache de resultados de relatórios/estatísticas (invalidado a cada nova sessão)
+RESULTS_CACHE_CONFIG = {
+    'enabled': True,
+    'max_entries': 256            # Entradas menos usadas recentemente são descartadas
+}
+
 # Configurações de Filtros CSV
 CSV_FILTER_CONFIG = {
     'keywords': ['Upload de FTP', 'Envio de e-mail por SMTP'],
@@ -107,8 +255,9 @@ LOGGING_CONFIG = {
 
 # Configurações de Performance
 PERFORMANCE_CONFIG = {
-    'max_memory_usage_mb': 512,
-    'chunk_size': 1000,
+    'max_memory_usage_mb': 512,   # Orçamento para registros em memória (lotes e agregados)
+    'memory_high_watermark': 0.8, # Acima desta fração lotes encolhem e produtores aguardam
+    'chunk_size': 1000,           # Menor lote e unidade de reserva do orçamento
     'enable_parallel_processing': True,
     'max_concurrent_files': 4
 }
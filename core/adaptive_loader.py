@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Controlador Adaptativo do Carregador
+====================================
+Ajusta o tamanho do lote e o número de conexões do dreno da outbox com base
+na latência de ida e volta e na vazão (registros/s) medidas a cada lote.
+"""
+
+import threading
+from typing import Dict, Any, List
+from config.settings import ADAPTIVE_LOADER_CONFIG, PROCESSING_CONFIG
+
+class AdaptiveBatchController:
+    """Busca o ponto de maior vazão dentro do orçamento de latência por lote."""
+    
+    def __init__(self, batch_size: int = None, workers: int = None, max_workers: int = None):
+        config = ADAPTIVE_LOADER_CONFIG
+        self.latency_budget = config['latency_budget_sec']
+        self.min_batch_size = config['min_batch_size']
+        self.max_batch_size = config['max_batch_size']
+        self.min_workers = config['min_workers']
+        self.max_workers = max_workers or config['max_workers']
+        self.increase_factor = config['increase_factor']
+        self.decrease_factor = config['decrease_factor']
+        
+        self.batch_size = self._clamp_batch(batch_size or PROCESSING_CONFIG['batch_size'])
+        self.workers = self._clamp_workers(workers or PROCESSING_CONFIG['max_workers'])
+        
+        self._lock = threading.Lock()
+        self._direction = 1          # +1 aumentando o lote, -1 reduzindo
+        self._last_rate = 0.0
+        self._drain_rates: Dict[int, float] = {}  # Vazão observada por número de conexões
+        self._saved_state = None     # Valores de antes do boost, restaurados por end_boost
+        self.samples: List[Dict[str, Any]] = []
+    
+    def _clamp_batch(self, value: float) -> int:
+        return int(max(self.min_batch_size, min(self.max_batch_size, value)))
+    
+    def _clamp_workers(self, value: int) -> int:
+        return int(max(self.min_workers, min(self.max_workers, value)))
+    
+    def start_session(self):
+        """Zera as amostras da sessão mantendo os valores aprendidos."""
+        with self._lock:
+            self.samples = []
+    
+    def boost(self, batch_size: int, workers: int):
+        """Eleva os valores iniciais (ex.: no modo catch-up) sem reduzir o que já foi aprendido.
+        
+        Os valores anteriores ao primeiro boost são guardados e voltam com end_boost.
+        """
+        with self._lock:
+            if self._saved_state is None:
+                self._saved_state = (self.batch_size, self.workers, self._direction, self._last_rate)
+            self.batch_size = self._clamp_batch(max(self.batch_size, batch_size))
+            self.workers = self._clamp_workers(max(self.workers, workers))
+    
+    def end_boost(self):
+        """Volta aos valores de antes do boost (ex.: fim do catch-up)."""
+        with self._lock:
+            if self._saved_state is None:
+                return
+            self.batch_size, self.workers, self._direction, self._last_rate = self._saved_state
+            self._saved_state = None
+    
+    def record_batch(self, records: int, seconds: float):
+        """Registra um lote enviado e ajusta o tamanho do próximo."""
+        if records <= 0:
+            return
+        rate = records / seconds if seconds > 0 else float(records)
+        
+        with self._lock:
+            self.samples.append({
+                'batch_size': self.batch_size,
+                'records': records,
+                'seconds': seconds,
+                'records_per_sec': rate
+            })
+            
+            # Lotes parciais (fim da outbox) não dizem nada sobre o tamanho ideal
+            if records < self.batch_size:
+                return
+            
+            if seconds > self.latency_budget:
+                self._direction = -1
+                self.batch_size = self._clamp_batch(self.batch_size * self.decrease_factor)
+            else:
+                # Subida de encosta: mantém a direção enquanto a vazão melhora
+                if rate < self._last_rate * 0.95:
+                    self._direction = -self._direction
+                factor = self.increase_factor if self._direction > 0 else 1 / self.increase_factor
+                self.batch_size = self._clamp_batch(self.batch_size * factor)
+            self._last_rate = rate
+    
+    def end_drain(self, workers_used: int, records: int, seconds: float):
+        """Ajusta o número de conexões ao final de um dreno completo."""
+        if records <= 0 or seconds <= 0:
+            return
+        rate = records / seconds
+        
+        with self._lock:
+            self._drain_rates[workers_used] = rate
+            latencies = [sample['seconds'] for sample in self.samples]
+            avg_latency = sum(latencies) / len(latencies) if latencies else 0.0
+            
+            if avg_latency > self.latency_budget:
+                self.workers = self._clamp_workers(workers_used - 1)
+            elif self._drain_rates.get(workers_used - 1, 0) > rate:
+                # Mais conexões não trouxeram ganho: volta ao valor anterior
+                self.workers = self._clamp_workers(workers_used - 1)
+            elif avg_latency < self.latency_budget / 2:
+                self.workers = self._clamp_workers(workers_used + 1)
+    
+    def get_summary(self) -> Dict[str, Any]:
+        """Resumo da sessão para persistência em loader_tuning."""
+        with self._lock:
+            records = sum(sample['records'] for sample in self.samples)
+            seconds = sum(sample['seconds'] for sample in self.samples)
+            return {
+                'batch_size': self.batch_size,
+                'workers': self.workers,
+                'batches': len(self.samples),
+                'records': records,
+                'avg_latency_ms': round(seconds / len(self.samples) * 1000, 1) if self.samples else 0,
+                'records_per_sec': round(records / seconds) if seconds > 0 else 0
+            }
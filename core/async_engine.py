@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de Ingestão asyncio
+=========================
+Alternativa ao pipeline em threads do LogProcessor: um único event loop
+coordena listagem, downloads, parse e envios ao banco, com semáforos
+limitando quantas operações de cada tipo ficam em andamento.
+
+Não há cliente FTP assíncrono entre as dependências, então o ftplib roda em
+um executor de threads de tamanho fixo (assim como o envio ao banco, que usa
+pyodbc/sqlite3 bloqueantes); o número de transferências em andamento é
+limitado pelo semáforo e não pelo número de threads.
+
+O motor cobre o FTP padrão (FTP_CONFIG). Com várias fontes em SOURCES ou
+ZIP_CONFIG habilitado o ciclo segue pelo caminho em threads do LogProcessor.
+"""
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from config.settings import ASYNC_ENGINE_CONFIG, FTP_CONFIG, PROCESSING_CONFIG, ZIP_CONFIG
+from core.processor import LogProcessor
+from core.memory_budget import reset_peak_rss
+from core.scheduler import prioritize
+from core.ftp_utils import FTPClient, disconnect_ftp
+from db.sql_server_client import remove_duplicated_files
+
+class AsyncLogProcessor(LogProcessor):
+    """LogProcessor com o ciclo de ingestão executado em asyncio."""
+    
+    def __init__(self, config: Dict[str, int] = None):
+        super().__init__()
+        self.config = config or ASYNC_ENGINE_CONFIG
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._ftp_pool: Optional[asyncio.Queue] = None
+        self._ftp_clients: List[FTPClient] = []
+    
+    def run_processing(self, persistent: bool = False) -> bool:
+        """Executa um ciclo completo no event loop e retorna o sucesso."""
+        if ZIP_CONFIG['enabled'] or not self._single_default_source():
+            # Fontes adicionais (FairScheduler) e ZIPs só existem no caminho em threads
+            print("ℹ️ SOURCES/ZIP_CONFIG configurados: ciclo executado pelo motor em threads")
+            return super().run_processing(persistent)
+        
+        self.start_time = datetime.now()
+        self.active_load_seconds = None
+        reset_peak_rss()
+        self.reset_cycle()
+        if self.load_controller is not None:
+            self.load_controller.start_session()
+        print(f"\n🚀 INICIANDO PROCESSAMENTO EDI (motor asyncio)")
+        print(f"⏰ Início: {self.start_time.strftime('%d/%m/%Y %H:%M:%S')}")
+        print("=" * 60)
+        
+        if not self.init_databases():
+            return False
+        
+        with ThreadPoolExecutor(max_workers=self.config['executor_threads']) as executor:
+            self._executor = executor
+            try:
+                downloaded = asyncio.run(self._run_cycle(persistent))
+                # Registros já estão no banco ou na outbox local: libera os leases como concluídos
+                if self.leases and downloaded:
+                    self.leases.complete(downloaded)
+            except Exception as e:
+                print(f"\n❌ Erro durante o processamento: {e}")
+                return False
+            finally:
+                self._executor = None
+                if self.leases:
+                    self.leases.release_all()
+        
+        if downloaded is None:
+            return False
+        if not downloaded:
+            if persistent:
+                return self._run_idle_cycle()
+            print("ℹ️ Nenhum arquivo foi baixado via FTP")
+            return False
+        
+        if self.outbox.pending_segments():
+            self.send_to_sql_server([])
+        if not self.deduplicated_in_load:
+            print("\n🧹 Garantindo unicidade dos registros...")
+            remove_duplicated_files()
+        
+        print("\n🧹 Realizando limpeza...")
+        self.csv_processor.cleanup_old_csvs()
+        self._save_processing_session()
+        self.print_summary()
+        return True
+    
+    async def _call(self, func, *args):
+        """Executa uma função bloqueante no executor sem bloquear o event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def _run_cycle(self, persistent: bool) -> Optional[List[str]]:
+        """Lista os logs remotos e processa todos concorrentemente; retorna os baixados."""
+        self._ftp_pool = asyncio.Queue()
+        self._ftp_clients = []
+        try:
+            lister = await self._acquire_ftp()
+            if lister is None:
+                print("✗ Não foi possível conectar ao servidor FTP. Abortando.")
+                return None
+            manifest = self.remote_manifest if persistent else None
+            remote_files, entries = await self._call(
+                lister.select_files, PROCESSING_CONFIG['log_file_pattern'],
+                FTP_CONFIG['local_download_dir'], manifest,
+                self.leases.claim_files if self.leases else None
+            )
+            self._ftp_pool.put_nowait(lister)
+            if not remote_files:
+                return []
+            
+            os.makedirs(FTP_CONFIG['local_download_dir'], exist_ok=True)
+            transfers = asyncio.Semaphore(self.config['max_transfers'])
+            parsers = asyncio.Semaphore(self.config['max_parsers'])
+            db_batches = asyncio.Semaphore(self.config['max_db_batches'])
+            
+            # O log do dia entra primeiro nos semáforos
+            ordered = prioritize(remote_files)
+            results = await asyncio.gather(*(
+                self._process_file(name, transfers, parsers, db_batches) for name in ordered
+            ), return_exceptions=True)
+            downloaded = []
+            for name, result in zip(ordered, results):
+                if isinstance(result, Exception):
+                    # Um log com erro não interrompe os demais: conta o erro e segue
+                    message = f"Erro ao processar {name}: {result}"
+                    print(f"  ✗ {message}")
+                    self.csv_processor.errors.append(message)
+                elif result:
+                    downloaded.append(result)
+            
+            if manifest is not None:
+                for local_file in downloaded:
+                    name = os.path.basename(local_file)
+                    manifest[name] = entries[name]
+            return downloaded
+        finally:
+            for client in self._ftp_clients:
+                await self._call(disconnect_ftp, client)
+    
+    async def _acquire_ftp(self) -> Optional[FTPClient]:
+        """Retorna uma conexão FTP livre, abrindo uma nova até o limite de transferências."""
+        if self._ftp_pool.empty() and len(self._ftp_clients) < self.config['max_transfers']:
+            client = FTPClient()
+            self._ftp_clients.append(client)
+            if not await self._call(client.connect):
+                self._ftp_clients.remove(client)
+                return None
+            return client
+        return await self._ftp_pool.get()
+    
+    async def _process_file(self, remote_file: str, transfers: asyncio.Semaphore,
+                            parsers: asyncio.Semaphore, db_batches: asyncio.Semaphore) -> Optional[str]:
+        """Download -> parse/filtro -> outbox/banco de um log remoto.
+        
+        Retorna o log local só se o CSV filtrado foi gerado e seus registros
+        chegaram à outbox; None em qualquer falha.
+        """
+        local_file = os.path.join(FTP_CONFIG['local_download_dir'], remote_file)
+        
+        async with transfers:
+            client = await self._acquire_ftp()
+            if client is None:
+                self.csv_processor.errors.append(f"Sem conexão FTP para baixar {remote_file}")
+                return None
+            try:
+                downloaded = await self._call(client.download_file, remote_file, local_file)
+            finally:
+                self._ftp_pool.put_nowait(client)
+        if not downloaded:
+            self.csv_processor.errors.append(f"Falha no download de {remote_file}")
+            return None
+        
+        async with parsers:
+            csv_files = await self._call(self.csv_processor.convert_logs_to_csv, [local_file])
+            filtered_files = await self._call(self.csv_processor.filter_csv_files, csv_files) if csv_files else []
+        if not filtered_files:
+            self.csv_processor.errors.append(f"Falha na conversão/filtro de {remote_file}")
+            return None
+        
+        loaded = True
+        for filtered_file in filtered_files:
+            async with db_batches:
+                loaded = await self._call(self.load_csv, filtered_file) and loaded
+        return local_file if loaded else None
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backfill do Histórico Arquivado
+===============================
+Carrega os ZIPs ConsoleEDI_*.Log.zip de diretórios locais ou do FTP.
+
+Cada membro ConsoleEDI_*.Log é descompactado e parseado em um processo do
+pool, que grava os registros filtrados direto em um segmento da outbox. O
+processo principal só baixa os ZIPs, distribui os membros e registra no
+ledger cada membro concluído (com o CRC do diretório central do ZIP) e cada
+ZIP completo em processed_zips. Uma execução interrompida recomeça apenas
+pelos membros que faltavam; os segmentos já gravados são drenados na
+próxima execução.
+
+Com EXTERNAL_DEDUPE_CONFIG ativo os workers gravam runs ordenados em vez de
+segmentos, e o merge k-way (core.external_dedupe) entrega à outbox cada
+registro único uma única vez, dispensando remove_duplicated_files ao final.
+"""
+
+import os
+import time
+import zipfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+from config.settings import BACKFILL_CONFIG, EXTERNAL_DEDUPE_CONFIG, PROCESSING_CONFIG, FTP_CONFIG, OUTBOX_CONFIG
+from core.catchup import select_profile, drain_with_profile
+from core.csv_processor import filter_records
+from core.external_dedupe import ExternalDeduper, run_records_for
+from core.memory_budget import peak_rss_mb, reset_peak_rss
+from core.outbox import Outbox
+from core.traffic import TrafficAccumulator
+from core.zip_processor import ZipProcessor
+
+# Outbox de cada processo do pool (criada no primeiro membro)
+_worker_outbox: Optional[Outbox] = None
+
+def _parse_member(zip_path: str, member_name: str, outbox_dir: str) -> Tuple[Optional[str], int, List[tuple]]:
+    """Executado no pool: parseia um membro e grava os registros filtrados em um segmento.
+    
+    Retorna (segmento, registros, agregados de tráfego); um CRC divergente
+    interrompe a leitura com BadZipFile.
+    """
+    global _worker_outbox
+    if _worker_outbox is None or _worker_outbox.outbox_dir != outbox_dir:
+        _worker_outbox = Outbox(outbox_dir)
+    traffic = TrafficAccumulator()
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        segment = _worker_outbox.append_records(
+            filter_records(traffic.observe(ZipProcessor.iter_member_records(zip_ref, member_name)))
+        )
+    return segment, Outbox.segment_size(segment) if segment else 0, traffic.rows()
+
+def _sort_member(zip_path: str, member_name: str, work_dir: str,
+                 run_records: int) -> Tuple[List[str], int, List[tuple]]:
+    """Executado no pool: parseia um membro e grava os registros filtrados em runs ordenados."""
+    traffic = TrafficAccumulator()
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        runs, total = ExternalDeduper(work_dir, run_records).write_runs(
+            filter_records(traffic.observe(ZipProcessor.iter_member_records(zip_ref, member_name)))
+        )
+    return runs, total, traffic.rows()
+
+class Backfill:
+    """Carga paralela e retomável de ZIPs do histórico pelo LogProcessor."""
+    
+    def __init__(self, processor, config: Dict = None):
+        self.processor = processor
+        self.config = config or BACKFILL_CONFIG
+        self.workers = self.config['workers'] or os.cpu_count() or 1
+        self.state_store = processor.state_store
+        self.deduper = ExternalDeduper(run_records=run_records_for(self.workers)) \
+            if EXTERNAL_DEDUPE_CONFIG['enabled'] else None
+        self.stats = {'archives': 0, 'archives_skipped': 0, 'members': 0, 'members_total': 0,
+                      'members_skipped': 0, 'records': 0, 'bytes': 0, 'errors': 0}
+        # ZIP -> [membros em andamento, membros no ZIP, caminho local]
+        self._archives: Dict[str, list] = {}
+        self._failed = set()
+        self._downloaded = set()
+        self._started = 0.0
+        self._last_progress = 0.0
+    
+    def _is_archive(self, name: str) -> bool:
+        return (name.startswith(PROCESSING_CONFIG['log_file_pattern'])
+                and name.endswith(PROCESSING_CONFIG['zip_file_extension']))
+    
+    def _pending_archives(self, names: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+        """Remove os ZIPs remotos já concluídos (registrados em processed_zips), sem baixá-los.
+        
+        ZIPs locais sempre têm o diretório central lido: o ledger de membros
+        (nome e CRC) decide o que falta, inclusive em um ZIP regravado.
+        """
+        pending = [(name, path) for name, path in names
+                   if path is not None or not self.state_store.is_zip_processed(name)]
+        self.stats['archives_skipped'] = len(names) - len(pending)
+        return pending
+    
+    def run(self, directories: List[str] = None) -> bool:
+        """Carrega os ZIPs dos diretórios informados ou, sem diretórios, do servidor FTP."""
+        from core.ftp_utils import connect_ftp, disconnect_ftp
+        
+        if not self.processor.init_databases():
+            return False
+        self.processor.start_time = datetime.now()
+        reset_peak_rss()
+        
+        print(f"\n🗃️ BACKFILL DO HISTÓRICO ({self.workers} processos)")
+        print("=" * 60)
+        
+        ftp_client = None
+        if directories:
+            archives = [
+                (os.path.basename(path), path)
+                for directory in directories
+                for path in sorted(self.processor.zip_processor.find_zip_files(directory))
+            ]
+        else:
+            ftp_client = connect_ftp()
+            if not ftp_client:
+                print("✗ Não foi possível conectar ao servidor FTP. Abortando.")
+                return False
+            archives = [(name, None) for name in sorted(ftp_client.list_files(PROCESSING_CONFIG['log_file_pattern']))
+                        if self._is_archive(name)]
+        
+        archives = self._pending_archives(archives)
+        print(f"📦 {len(archives)} ZIPs a carregar ({self.stats['archives_skipped']} já concluídos)")
+        
+        self._started = self._last_progress = time.perf_counter()
+        max_pending = self.workers * self.config['max_pending_per_worker']
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {}
+                try:
+                    for zip_name, path in archives:
+                        if path is None:
+                            path = self._download(ftp_client, zip_name)
+                            if path is None:
+                                continue
+                        self._submit_archive(executor, futures, zip_name, path)
+                        # Limita os membros em espera (e os ZIPs baixados ocupando disco)
+                        while len(futures) > max_pending:
+                            self._collect(futures)
+                    while futures:
+                        self._collect(futures)
+                except KeyboardInterrupt:
+                    # Membros ainda na fila não são iniciados; os do ledger não serão relidos
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+        except KeyboardInterrupt:
+            print("\n🛑 Backfill interrompido - a próxima execução continua pelos membros que faltam")
+            return False
+        finally:
+            for path in self._downloaded:
+                if os.path.exists(path):
+                    os.remove(path)
+            if ftp_client:
+                disconnect_ftp(ftp_client)
+        
+        self._print_progress(final=True)
+        
+        if self.deduper is not None:
+            self._load_unique()
+        if self.processor.outbox.pending_segments():
+            # Segmentos sem deduplicação externa (pool gravando direto na outbox, ciclos anteriores
+            # ou banco fora do ar): o volume do backfill normalmente ativa o perfil catch-up
+            self.processor.send_to_sql_server([])
+            if self.processor.sql_success_count and not self.processor.deduplicated_in_load:
+                from db.sql_server_client import remove_duplicated_files
+                print("\n🧹 Garantindo unicidade dos registros...")
+                remove_duplicated_files()
+        self._save_session()
+        
+        return not self.stats['errors']
+    
+    def _load_unique(self):
+        """Merge dos runs para a outbox e carga dos segmentos únicos, sem deduplicação posterior.
+        
+        Nenhum registro se repete entre os segmentos, então conexões paralelas
+        não disputam as mesmas chaves; o que já está no banco é descartado pelo
+        NOT EXISTS da carga (o índice único permanece ativo).
+        """
+        print("\n🧮 DEDUPLICAÇÃO EXTERNA")
+        print("=" * 50)
+        started = time.perf_counter()
+        segments = self.deduper.dedupe_to_outbox(self.processor.outbox)
+        stats = self.deduper.stats
+        print(f"  ✓ {stats['records_in']} registros em {stats['runs']} runs → {stats['unique']} únicos "
+              f"({stats['passes']} passagens de merge, {time.perf_counter() - started:.1f}s)")
+        if not segments:
+            return
+        
+        profile = dict(select_profile(stats['unique']), disable_unique_index=False, deduplicate_after=False)
+        self.processor.load_profile = profile
+        print(f"\n📊 Carregando {len(segments)} segmentos únicos (perfil {profile['name']})...")
+        result = drain_with_profile(self.processor.outbox, profile, segments, self.processor.load_controller)
+        self.processor.sql_success_count += result['segments']
+        print(f"  ✅ {result['segments']} segmentos enviados, {result['inserted']} registros novos")
+    
+    def _download(self, ftp_client, zip_name: str) -> Optional[str]:
+        """Baixa um ZIP remoto para o diretório de downloads (removido ao concluir o ZIP)."""
+        path = os.path.join(FTP_CONFIG['local_download_dir'], zip_name)
+        os.makedirs(FTP_CONFIG['local_download_dir'], exist_ok=True)
+        self._downloaded.add(path)
+        if ftp_client.download_file(zip_name, path):
+            return path
+        self.stats['errors'] += 1
+        return None
+    
+    def _submit_archive(self, executor, futures: Dict, zip_name: str, path: str):
+        """Envia ao pool os membros do ZIP ainda não carregados (ou com CRC diferente do ledger)."""
+        try:
+            with zipfile.ZipFile(path, 'r') as zip_ref:
+                members = ZipProcessor.log_members(zip_ref)
+        except (zipfile.BadZipFile, OSError) as e:
+            print(f"  ✗ ZIP inválido {zip_name}: {e}")
+            self.stats['errors'] += 1
+            self._remove_download(path)
+            return
+        
+        loaded = self.state_store.get_zip_members(zip_name)
+        todo = [member for member in members if loaded.get(member.filename) != member.CRC]
+        self.stats['members_total'] += len(todo)
+        self.stats['members_skipped'] += len(members) - len(todo)
+        
+        if not todo:
+            # Todos os membros já estavam no ledger (ex.: interrupção antes de fechar o ZIP)
+            self.state_store.mark_zip_processed(zip_name, len(members))
+            self.stats['archives_skipped'] += 1
+            self._remove_download(path)
+            return
+        self._archives[zip_name] = [len(todo), len(members), path]
+        for member in todo:
+            if self.deduper is not None:
+                future = executor.submit(_sort_member, path, member.filename,
+                                         self.deduper.work_dir, self.deduper.run_records)
+            else:
+                future = executor.submit(_parse_member, path, member.filename, OUTBOX_CONFIG['outbox_dir'])
+            futures[future] = (zip_name, member.filename, member.CRC, member.file_size)
+    
+    def _collect(self, futures: Dict):
+        """Registra os membros concluídos no ledger e fecha os ZIPs sem membros pendentes."""
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            zip_name, member_name, crc, size = futures.pop(future)
+            try:
+                output, records, traffic = future.result()
+            except Exception as e:
+                print(f"  ✗ Erro em {zip_name}/{member_name}: {e}")
+                self.stats['errors'] += 1
+                self._failed.add(zip_name)
+            else:
+                # Registros já estão na outbox ou em runs: o membro não é relido numa próxima execução
+                self.state_store.mark_zip_member_processed(zip_name, member_name, crc, records)
+                self.state_store.replace_log_traffic(os.path.basename(member_name), traffic)
+                if self.deduper is not None:
+                    # Runs gravados no worker: contados aqui, antes de qualquer merge
+                    self.deduper.count_runs(output, records)
+                self.stats['members'] += 1
+                self.stats['records'] += records
+                self.stats['bytes'] += size
+            
+            self._archives[zip_name][0] -= 1
+            if not self._archives[zip_name][0]:
+                self._finish_archive(zip_name)
+        self._print_progress()
+    
+    def _finish_archive(self, zip_name: str):
+        _, members, path = self._archives.pop(zip_name)
+        if zip_name in self._failed:
+            self.processor.zip_processor.errors.append(f"Erro no backfill de {zip_name}")
+        else:
+            self.state_store.mark_zip_processed(zip_name, members)
+            self.processor.zip_processor.processed_zips.append(zip_name)
+            self.stats['archives'] += 1
+        self._remove_download(path)
+    
+    def _remove_download(self, path: str):
+        if path in self._downloaded:
+            self._downloaded.discard(path)
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _print_progress(self, final: bool = False):
+        """Linha de progresso e vazão a cada progress_interval_sec (e ao final)."""
+        now = time.perf_counter()
+        if not final and now - self._last_progress < self.config['progress_interval_sec']:
+            return
+        self._last_progress = now
+        elapsed = max(now - self._started, 1e-6)
+        stats = self.stats
+        print(f"📈 Backfill: {stats['members']}/{stats['members_total']} membros, "
+              f"{stats['archives']} ZIPs concluídos, {stats['records']} registros | "
+              f"{stats['records'] / elapsed:.0f} reg/s, {stats['bytes'] / elapsed / 1024 / 1024:.1f} MB/s "
+              f"em {elapsed:.1f}s")
+        if final:
+            print(f"   - Membros já carregados anteriormente: {stats['members_skipped']}")
+            print(f"   - Erros: {stats['errors']}")
+    
+    def _save_session(self):
+        processor = self.processor
+        try:
+            self.state_store.save_session(
+                processor.start_time, datetime.now(), self.stats['archives'], self.stats['members'], 0,
+                processor.sql_success_count, self.stats['errors'] + processor.sql_error_count,
+                None, peak_rss_mb()
+            )
+        except Exception as e:
+            print(f"✗ Erro ao salvar sessão: {e}")
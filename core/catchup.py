@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo Catch-up
+=============
+Perfis de carga da outbox: baixa latência (ciclos normais) e alta vazão
+(catch-up), escolhidos a cada ciclo conforme o backlog pendente.
+"""
+
+import os
+import time
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from config.settings import CATCHUP_CONFIG, OUTBOX_CONFIG
+from core.outbox import Outbox
+from core.state_store import get_state_store
+from db.sql_server_client import (
+    remove_duplicated_files, set_unique_index_enabled,
+    send_records_to_sqlite, _connect_sqlite, pyodbc_available
+)
+
+# Chave em state_meta da deduplicação pendente: 'dedupe' ou 'rebuild' (deduplicar e reconstruir o índice)
+PENDING_DEDUPE_KEY = 'pending_dedupe'
+
+def low_latency_profile() -> Dict[str, Any]:
+    """Perfil padrão: lotes moderados, uma conexão e log detalhado."""
+    return {
+        'name': 'baixa latência',
+        'catchup': False,
+        'batch_size': OUTBOX_CONFIG['drain_batch_size'],
+        'workers': 1,
+        'quiet': False,
+        'disable_unique_index': False,
+        'deduplicate_after': False
+    }
+
+def catchup_profile(single_writer: bool = None) -> Dict[str, Any]:
+    """Perfil de catch-up: lotes grandes, conexões paralelas e log mínimo.
+    
+    Com um destino de escritor único (SQLite) conexões paralelas só disputam
+    o lock de escrita, então o dreno usa uma conexão.
+    """
+    if single_writer is None:
+        single_writer = not pyodbc_available()
+    return {
+        'name': 'catch-up',
+        'catchup': True,
+        'batch_size': CATCHUP_CONFIG['drain_batch_size'],
+        'workers': 1 if single_writer else CATCHUP_CONFIG['max_connections'],
+        'quiet': CATCHUP_CONFIG['quiet_logging'],
+        'disable_unique_index': CATCHUP_CONFIG['disable_unique_index'],
+        'deduplicate_after': True
+    }
+
+def select_profile(pending_records: int) -> Dict[str, Any]:
+    """Escolhe o perfil de carga conforme o número de registros pendentes."""
+    if CATCHUP_CONFIG['enabled'] and pending_records >= CATCHUP_CONFIG['backlog_threshold_records']:
+        return catchup_profile()
+    return low_latency_profile()
+
+def drain_with_profile(outbox: Outbox, profile: Dict[str, Any], segments=None,
+                       controller=None, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Drena a outbox com o perfil dado.
+    
+    No catch-up a deduplicação roda uma única vez ao final e, se configurado,
+    o índice único fica desabilitado durante a carga e é reconstruído depois.
+    Segmentos já deduplicados (backfill) usam 'deduplicate_after' False.
+    Com um controlador adaptativo, o perfil de catch-up apenas eleva os
+    valores de partida do controlador; um dreno de baixa latência devolve
+    os valores que o controlador tinha antes do catch-up.
+    
+    A deduplicação só roda depois de um dreno completo e o índice só é
+    reconstruído depois de uma deduplicação bem-sucedida. Enquanto isso não
+    acontece, PENDING_DEDUPE_KEY fica em state_meta e o próximo dreno
+    completo (de qualquer perfil) tenta de novo. Um deadline limita o dreno
+    (ver Outbox.drain) para não atrasar o ciclo seguinte.
+    """
+    if controller is not None:
+        if profile['catchup']:
+            controller.boost(profile['batch_size'], profile['workers'])
+        else:
+            controller.end_boost()
+    
+    store = get_state_store()
+    pending = store.get_meta(PENDING_DEDUPE_KEY)
+    
+    index_disabled = False
+    if profile['catchup'] and profile['disable_unique_index']:
+        index_disabled = set_unique_index_enabled(False)
+        if index_disabled:
+            # Registrado antes da carga: uma queda no meio ainda reconstrói o índice depois
+            pending = 'rebuild'
+            store.set_meta(PENDING_DEDUPE_KEY, pending)
+    
+    result = outbox.drain(
+        segments,
+        batch_size=profile['batch_size'],
+        workers=profile['workers'],
+        quiet=profile['quiet'],
+        check_existing=not index_disabled,
+        controller=controller,
+        deadline=deadline
+    )
+    result['deduplicated'] = False
+    
+    if not (profile['deduplicate_after'] or pending):
+        return result
+    if not result['ok']:
+        # Carga incompleta: deduplicar agora não garante nada e o índice segue desabilitado
+        store.set_meta(PENDING_DEDUPE_KEY, pending or 'dedupe')
+        print(f"  ⚠️ Dreno incompleto: deduplicação{' e reconstrução do índice' if pending == 'rebuild' else ''} "
+              f"adiadas para o próximo dreno")
+        return result
+    
+    print("\n🧹 Catch-up: deduplicação única ao final da carga...")
+    if not remove_duplicated_files():
+        store.set_meta(PENDING_DEDUPE_KEY, pending or 'dedupe')
+        print("  🚨 DEDUPLICAÇÃO FALHOU: "
+              f"{'índice único continua DESABILITADO; ' if pending == 'rebuild' else ''}"
+              "nova tentativa no próximo dreno")
+        return result
+    result['deduplicated'] = True
+    
+    if pending == 'rebuild' and not set_unique_index_enabled(True):
+        print("  🚨 RECONSTRUÇÃO DO ÍNDICE ÚNICO FALHOU: nova tentativa no próximo dreno")
+        return result
+    store.set_meta(PENDING_DEDUPE_KEY, None)
+    return result
+
+def _synthetic_records(num_records: int):
+    """Gera registros sintéticos no formato do CSV filtrado."""
+    base = datetime(2025, 1, 1)
+    formats = ['Upload de FTP', 'Envio de e-mail por SMTP']
+    for i in range(num_records):
+        moment = base + timedelta(seconds=i)
+        yield (moment.strftime('%d/%m/%Y %H:%M:%S'), formats[i % 2], f"ARQ_{i:09d}.txt")
+
+def benchmark_catchup(num_records: int = 200000, segment_records: int = 5000) -> Dict[str, Any]:
+    """Compara os perfis de carga drenando a mesma outbox em um SQLite temporário."""
+    results = {}
+    print(f"\n⏱️ BENCHMARK CATCH-UP ({num_records} registros, SQLite local)")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        for profile in (low_latency_profile(), catchup_profile(single_writer=True)):
+            db_path = os.path.join(work_dir, f"bench_{len(results)}.db")
+            outbox = Outbox(
+                os.path.join(work_dir, f"outbox_{len(results)}"),
+                connect=lambda timeout=None, path=db_path: _connect_sqlite(path),
+                send=lambda conn, records, check_existing=True: send_records_to_sqlite(
+                    conn, records, check_existing, batch_size=len(records)
+                )
+            )
+            
+            records = _synthetic_records(num_records)
+            while True:
+                chunk = [record for _, record in zip(range(segment_records), records)]
+                if not chunk:
+                    break
+                outbox.append_records(chunk)
+            
+            started = time.perf_counter()
+            drain = outbox.drain(
+                batch_size=profile['batch_size'],
+                workers=profile['workers'],
+                quiet=True
+            )
+            elapsed = time.perf_counter() - started
+            rate = drain['records'] / elapsed if elapsed > 0 else 0
+            
+            results[profile['name']] = {
+                'records': drain['records'],
+                'inserted': drain['inserted'],
+                'seconds': round(elapsed, 3),
+                'records_per_sec': round(rate)
+            }
+            print(f"  - {profile['name']}: {drain['records']} registros em {elapsed:.2f}s "
+                  f"({rate:,.0f} registros/s, lote {profile['batch_size']}, "
+                  f"{profile['workers']} conexões)")
+    
+    return results
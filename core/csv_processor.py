@@ -9,10 +9,88 @@ Responsável por converter logs EDI para CSV e aplicar filtros.
 import os
 import re
 import csv
-import sqlite3
 from datetime import datetime
-from typing import List, Optional
-from config.settings import LOCAL_CONFIG, PROCESSING_CONFIG
+from typing import Iterable, Iterator, List, Optional, Tuple
+from config.settings import LOCAL_CONFIG, PROCESSING_CONFIG, CSV_FILTER_CONFIG
+from core.state_store import get_state_store
+from core.memory_budget import get_memory_budget
+from core.traffic import TrafficAccumulator
+
+# Expressões do parser compiladas uma vez por processo
+_DATE_PATTERN = re.compile(r"Data:\s+(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})")
+_PROCESS_PATTERN = re.compile(r"Formato do Processo de EDI:\s+(.+)")
+_FILE_PATTERN = re.compile(r"Nome do Arquivo:\s+(.+)")
+# Rótulo sem valor na linha: o valor está na próxima linha não vazia do bloco
+_EMPTY_LABEL_PATTERN = re.compile(r"(Data|Formato do Processo de EDI|Nome do Arquivo):\s*$")
+_DATE_VALUE_PATTERN = re.compile(r"\s*(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})")
+
+def iter_log_records(lines: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    """Percorre um log bloco a bloco, linha a linha, gerando (data, formato, nome do arquivo).
+    
+    Só o bloco corrente fica em memória, qualquer que seja o tamanho do log.
+    Um rótulo com o valor na linha seguinte (ex.: 'Nome do Arquivo:' e o nome
+    abaixo) é lido como no regex sobre o bloco inteiro usado antes.
+    """
+    separator = PROCESSING_CONFIG['separator_line']
+    date = process = None
+    file_names = []
+    pending_label = None
+    
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.endswith(separator):
+            if date and process:
+                for file_name in file_names:
+                    yield (date, process, file_name)
+            date = process = None
+            file_names = []
+            pending_label = None
+            continue
+        if not line.strip():
+            continue
+        
+        if pending_label is not None:
+            if pending_label == 'Data':
+                date_match = _DATE_VALUE_PATTERN.match(line)
+                date = date or (date_match.group(1) if date_match else None)
+            elif pending_label == 'Nome do Arquivo':
+                file_names.append(line.lstrip())
+            elif process is None:
+                process = line.lstrip()
+            pending_label = None
+        
+        label_match = _EMPTY_LABEL_PATTERN.search(line)
+        if label_match:
+            pending_label = label_match.group(1)
+            continue
+        
+        if date is None:
+            date_match = _DATE_PATTERN.search(line)
+            date = date_match.group(1) if date_match else None
+        if process is None:
+            process_match = _PROCESS_PATTERN.search(line)
+            process = process_match.group(1) if process_match else None
+        file_names.extend(_FILE_PATTERN.findall(line))
+    
+    if date and process:
+        for file_name in file_names:
+            yield (date, process, file_name)
+
+def csv_path_for(log_file: str) -> str:
+    """CSV gerado para um log em LOCAL_CONFIG['output_dir']."""
+    return os.path.join(
+        LOCAL_CONFIG['output_dir'],
+        os.path.basename(log_file).replace(PROCESSING_CONFIG['log_file_extension'], '.csv')
+    )
+
+def filtered_path_for(csv_file: str) -> str:
+    """CSV filtrado gerado a partir de um CSV convertido."""
+    return csv_file.replace('.csv', '_filtrado.csv')
+
+def filter_records(records: Iterable[Tuple[str, str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """Mantém apenas os registros cujo formato contém uma das palavras-chave de CSV_FILTER_CONFIG."""
+    keywords = CSV_FILTER_CONFIG['keywords']
+    return (record for record in records if any(keyword in record[1] for keyword in keywords))
 
 class CsvProcessor:
     """Classe responsável pelo processamento de arquivos CSV."""
@@ -47,6 +125,8 @@ class CsvProcessor:
         converted_files = []
         
         for log_file in log_files:
+            # Produtor aguarda enquanto os estágios seguintes estiverem perto do orçamento de memória
+            get_memory_budget().wait_for_room()
             try:
                 print(f"📄 Convertendo: {os.path.basename(log_file)}")
                 csv_file = self._convert_single_log_to_csv(log_file)
@@ -64,31 +144,21 @@ class CsvProcessor:
     def _convert_single_log_to_csv(self, log_file: str) -> Optional[str]:
         """Converte um único arquivo de log para CSV."""
         try:
-            output_file = os.path.join(
-                LOCAL_CONFIG['output_dir'], 
-                f"{os.path.basename(log_file).replace(PROCESSING_CONFIG['log_file_extension'], '.csv')}"
-            )
+            output_file = csv_path_for(log_file)
             
             with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
                 writer.writerow(['Data', 'Formato do Processo de EDI', 'Nome do Arquivo'])
                 
+                # Agregados de tráfego por hora e formato, calculados na mesma leitura
+                traffic = TrafficAccumulator()
+                
                 with open(log_file, 'r', encoding='utf-8') as infile:
-                    content = infile.read()
-                    blocks = re.split(f"{PROCESSING_CONFIG['separator_line']}\n", content)
-                    
-                    for block in blocks:
-                        date_match = re.search(r"Data:\s+(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})", block)
-                        date = date_match.group(1) if date_match else None
-                        
-                        process_match = re.search(r"Formato do Processo de EDI:\s+(.+)", block)
-                        process = process_match.group(1) if process_match else None
-                        
-                        file_matches = re.findall(r"Nome do Arquivo:\s+(.+)", block)
-                        
-                        if date and process and file_matches:
-                            for file_name in file_matches:
-                                writer.writerow([date, process, file_name])
+                    for date, process, file_name in iter_log_records(infile):
+                        writer.writerow([date, process, file_name])
+                        traffic.add(date, process, file_name)
+            
+            traffic.replace(os.path.basename(log_file))
             
             print(f"  ✓ CSV gerado: {os.path.basename(output_file)}")
             return output_file
@@ -118,7 +188,7 @@ class CsvProcessor:
     def _filter_single_csv(self, csv_file: str) -> Optional[str]:
         """Aplica filtros em um único arquivo CSV."""
         try:
-            filtered_file = csv_file.replace('.csv', '_filtrado.csv')
+            filtered_file = filtered_path_for(csv_file)
             palavras_chave = ['Upload de FTP', 'Envio de e-mail por SMTP']
             
             with open(csv_file, 'r', encoding='utf-8') as infile, \
@@ -153,14 +223,7 @@ class CsvProcessor:
             current_size = os.path.getsize(log_path)
             current_mtime = os.path.getmtime(log_path)
             
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT file_size, file_mtime FROM processed_logs 
-                WHERE log_path = ?
-            """, (log_path,))
-            result = cursor.fetchone()
-            conn.close()
+            result = get_state_store().get_log_state(log_path)
             
             if result is None:
                 # Arquivo nunca foi processado
@@ -190,68 +253,25 @@ class CsvProcessor:
             current_size = os.path.getsize(log_path)
             current_mtime = os.path.getmtime(log_path)
             
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            
-            # Usar INSERT OR REPLACE para atualizar se já existir
-            cursor.execute("""
-                INSERT OR REPLACE INTO processed_logs 
-                (log_path, process_date, file_size, file_mtime) 
-                VALUES (?, ?, ?, ?)
-            """, (log_path, datetime.now(), current_size, current_mtime))
-            
-            conn.commit()
-            conn.close()
+            get_state_store().mark_log_processed(log_path, current_size, current_mtime)
         except Exception as e:
             print(f"✗ Erro ao registrar log processado: {e}")
     
     def init_csv_database(self):
         """Inicializa a tabela de controle de arquivos de log processados."""
-        try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            
-            # Verificar se a tabela existe
-            cursor.execute("""
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='processed_logs'
-            """)
-            table_exists = cursor.fetchone()
-            
-            if table_exists:
-                # Verificar se as colunas file_size e file_mtime existem
-                cursor.execute("PRAGMA table_info(processed_logs)")
-                columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'file_size' not in columns:
-                    cursor.execute("ALTER TABLE processed_logs ADD COLUMN file_size INTEGER")
-                    print("  ✓ Coluna file_size adicionada")
-                
-                if 'file_mtime' not in columns:
-                    cursor.execute("ALTER TABLE processed_logs ADD COLUMN file_mtime REAL")
-                    print("  ✓ Coluna file_mtime adicionada")
-            else:
-                # Criar tabela com as novas colunas
-                cursor.execute("""
-                    CREATE TABLE processed_logs (
-                        log_path TEXT PRIMARY KEY,
-                        process_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        file_size INTEGER,
-                        file_mtime REAL,
-                        csv_generated TEXT,
-                        csv_filtered TEXT
-                    );
-                """)
-                print("  ✓ Tabela processed_logs criada com controle de modificação")
-            
-            conn.commit()
-            conn.close()
-            print("✓ Banco de dados de logs inicializado com sucesso.")
-        except Exception as e:
-            print(f"✗ Erro ao inicializar banco de dados de logs: {e}")
+        # Criação e migração (colunas file_size/file_mtime) ficam no StateStore
+        if not get_state_store().init_schema():
+            print("✗ Erro ao inicializar banco de dados de logs")
             return False
+        print("✓ Banco de dados de logs inicializado com sucesso.")
         return True
     
+    def reset(self):
+        """Zera os contadores para um novo ciclo (modo daemon)."""
+        self.converted_files = []
+        self.filtered_files = []
+        self.errors = []
+    
     def get_summary(self) -> dict:
         """Retorna um resumo do processamento de CSV."""
         return {
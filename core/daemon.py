@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo Daemon
+===========
+Executa ciclos de processamento em um único processo de longa duração,
+mantendo conexão FTP, manifest de arquivos remotos, parsers compilados e
+caches aquecidos entre os ciclos.
+
+Usa o pacote schedule quando disponível e um agendador interno caso
+contrário. SIGTERM/SIGINT encerram o daemon ao fim do ciclo em andamento e
+um lock de arquivo impede ciclos sobrepostos (inclusive de outros processos).
+"""
+
+import os
+import time
+import signal
+import threading
+from datetime import datetime
+from config.settings import DAEMON_CONFIG
+
+try:
+    import schedule
+    SCHEDULE_AVAILABLE = True
+except ImportError:
+    SCHEDULE_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+class ProcessingDaemon:
+    """Agenda ciclos do LogProcessor em intervalo fixo até receber sinal de parada."""
+    
+    def __init__(self, processor, report_manager=None, interval: int = None):
+        self.processor = processor
+        self.report_manager = report_manager
+        self.interval = interval or DAEMON_CONFIG['interval_sec']
+        self.lock_file = DAEMON_CONFIG['lock_file']
+        self._stop = threading.Event()
+        self._cycle_lock = threading.Lock()
+        self.cycles = 0
+        self.skipped_cycles = 0
+    
+    def stop(self, signum=None, frame=None):
+        """Solicita a parada; o ciclo em andamento termina normalmente."""
+        if not self._stop.is_set():
+            print(f"\n🛑 Sinal de parada recebido - encerrando após o ciclo atual...")
+        self._stop.set()
+    
+    def _install_signal_handlers(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+    
+    def _acquire_process_lock(self):
+        """Abre o lock de arquivo entre processos; retorna o descritor ou None se ocupado."""
+        handle = open(self.lock_file, 'a')
+        if not FCNTL_AVAILABLE:
+            return handle
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except OSError:
+            handle.close()
+            return None
+    
+    def run_cycle(self) -> bool:
+        """Executa um ciclo, pulando-o se outro ainda estiver em andamento."""
+        if self._stop.is_set():
+            return False
+        if not self._cycle_lock.acquire(blocking=False):
+            self.skipped_cycles += 1
+            print("⏭️ Ciclo anterior ainda em andamento - ciclo pulado")
+            return False
+        
+        try:
+            handle = self._acquire_process_lock()
+            if handle is None:
+                self.skipped_cycles += 1
+                print(f"⏭️ Outro processo está processando ({self.lock_file}) - ciclo pulado")
+                return False
+            
+            try:
+                self.cycles += 1
+                success = self.processor.run_processing(persistent=True)
+                if success and self.report_manager and DAEMON_CONFIG['daily_report_each_cycle']:
+                    self.report_manager.generate_daily_report()
+                return success
+            finally:
+                handle.close()
+        
+        except Exception as e:
+            print(f"❌ Erro no ciclo do daemon: {e}")
+            return False
+        finally:
+            self._cycle_lock.release()
+    
+    def run(self):
+        """Laço principal do daemon."""
+        self._install_signal_handlers()
+        scheduler_name = "schedule" if SCHEDULE_AVAILABLE else "agendador interno"
+        print(f"🤖 Daemon iniciado (PID {os.getpid()}) - ciclo a cada {self.interval}s ({scheduler_name})")
+        
+        try:
+            if SCHEDULE_AVAILABLE:
+                self._run_with_schedule()
+            else:
+                self._run_with_internal_scheduler()
+        finally:
+            self.processor.close()
+            print(f"👋 Daemon encerrado em {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} "
+                  f"({self.cycles} ciclos, {self.skipped_cycles} pulados)")
+    
+    def _run_with_schedule(self):
+        scheduler = schedule.Scheduler()
+        scheduler.every(self.interval).seconds.do(self.run_cycle)
+        self.run_cycle()
+        
+        while not self._stop.is_set():
+            scheduler.run_pending()
+            idle = scheduler.idle_seconds
+            self._stop.wait(max(0.0, idle) if idle is not None else self.interval)
+    
+    def _run_with_internal_scheduler(self):
+        next_run = time.monotonic()
+        
+        while not self._stop.is_set():
+            self.run_cycle()
+            next_run += self.interval
+            now = time.monotonic()
+            if next_run < now:
+                # Ciclo mais longo que o intervalo: não acumula execuções atrasadas
+                next_run = now
+            self._stop.wait(next_run - now)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deduplicação por Ordenação Externa
+==================================
+Remove registros repetidos de lotes grandes (backfill) sem um conjunto em
+memória: os registros são ordenados em blocos de até run_records e gravados
+como runs no disco; depois os runs são combinados com um merge k-way
+(heapq.merge), que entrega cada registro único uma única vez, em ordem.
+
+Com mais runs que merge_fan_in, passagens intermediárias combinam grupos de
+runs em runs maiores, limitando os arquivos abertos ao mesmo tempo. Cada
+run é gravado em um .tmp e renomeado ao final, então um run interrompido
+nunca entra no merge; runs completos de uma execução interrompida são
+combinados na próxima.
+"""
+
+import os
+import csv
+import heapq
+import itertools
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+from config.settings import EXTERNAL_DEDUPE_CONFIG, PERFORMANCE_CONFIG
+from core.memory_budget import RECORD_OVERHEAD_BYTES
+
+Record = Tuple[str, str, str]
+
+# Sequência compartilhada pelas instâncias do processo (uma por membro nos workers do backfill)
+_run_sequence = itertools.count(1)
+
+def run_records_for(workers: int = 1) -> int:
+    """Registros por run que cabem no orçamento de memória dividido entre os processos."""
+    budget_bytes = PERFORMANCE_CONFIG['max_memory_usage_mb'] * 1024 * 1024
+    fitting = int(budget_bytes // (max(1, workers) * RECORD_OVERHEAD_BYTES * 2))
+    return max(PERFORMANCE_CONFIG['chunk_size'], min(EXTERNAL_DEDUPE_CONFIG['run_records'], fitting))
+
+class ExternalDeduper:
+    """Runs ordenados em disco e merge k-way com descarte de repetidos."""
+    
+    RUN_PREFIX = 'run_'
+    RUN_SUFFIX = '.csv'
+    
+    def __init__(self, work_dir: str = None, run_records: int = None, fan_in: int = None):
+        self.work_dir = work_dir or EXTERNAL_DEDUPE_CONFIG['work_dir']
+        self.run_records = run_records or run_records_for()
+        self.fan_in = max(2, fan_in or EXTERNAL_DEDUPE_CONFIG['merge_fan_in'])
+        self.stats = {'runs': 0, 'passes': 0, 'records_in': 0, 'unique': 0}
+        self._counted_runs = set()  # Runs já somados em stats (gravados aqui ou pelos workers)
+        os.makedirs(self.work_dir, exist_ok=True)
+    
+    def _new_run_path(self) -> str:
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        name = f"{self.RUN_PREFIX}{stamp}_{os.getpid()}_{next(_run_sequence):06d}{self.RUN_SUFFIX}"
+        return os.path.join(self.work_dir, name)
+    
+    def _write_run(self, records: Iterable[Record]) -> Optional[str]:
+        """Grava registros já ordenados em um run de forma atômica."""
+        run_path = self._new_run_path()
+        tmp_path = run_path + '.tmp'
+        count = 0
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as run:
+            writer = csv.writer(run)
+            for record in records:
+                writer.writerow(record)
+                count += 1
+        if not count:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, run_path)
+        return run_path
+    
+    def write_runs(self, records: Iterable[Record]) -> Tuple[List[str], int]:
+        """Ordena os registros em blocos de run_records e grava cada bloco como um run.
+        
+        Repetidos dentro do bloco já são descartados aqui. Retorna os runs
+        gravados e o total de registros recebidos.
+        """
+        runs, total = [], 0
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, self.run_records))
+            if not chunk:
+                break
+            total += len(chunk)
+            run_path = self._write_run(sorted(set(chunk)))
+            if run_path:
+                runs.append(run_path)
+        self.count_runs(runs, total)
+        return runs, total
+    
+    def count_runs(self, runs: List[str], records: int):
+        """Soma em stats runs gravados e os registros recebidos por eles (ex.: nos workers)."""
+        self.stats['runs'] += len(runs)
+        self.stats['records_in'] += records
+        self._counted_runs.update(runs)
+    
+    def _count_leftover_runs(self, runs: List[str]):
+        """Soma em stats os runs de uma execução interrompida, que ninguém contou ainda."""
+        for run_path in runs:
+            if run_path not in self._counted_runs:
+                with open(run_path, 'r', newline='', encoding='utf-8') as run:
+                    self.count_runs([run_path], sum(1 for _ in run))
+    
+    def pending_runs(self) -> List[str]:
+        """Runs completos no diretório de trabalho (inclusive de execuções interrompidas)."""
+        return sorted(
+            os.path.join(self.work_dir, name) for name in os.listdir(self.work_dir)
+            if name.startswith(self.RUN_PREFIX) and name.endswith(self.RUN_SUFFIX)
+        )
+    
+    @staticmethod
+    def _read_run(run_path: str) -> Iterator[Record]:
+        with open(run_path, 'r', newline='', encoding='utf-8') as run:
+            for row in csv.reader(run):
+                if len(row) >= 3:
+                    yield (row[0], row[1], row[2])
+    
+    @staticmethod
+    def _unique(merged: Iterable[Record]) -> Iterator[Record]:
+        """Descarta repetidos consecutivos de um fluxo ordenado."""
+        previous = None
+        for record in merged:
+            if record != previous:
+                previous = record
+                yield record
+    
+    def _reduce_runs(self, runs: List[str]) -> List[str]:
+        """Passagens intermediárias até restarem no máximo fan_in runs."""
+        while len(runs) > self.fan_in:
+            self.stats['passes'] += 1
+            merged_runs = []
+            for start in range(0, len(runs), self.fan_in):
+                group = runs[start:start + self.fan_in]
+                if len(group) == 1:
+                    merged_runs.append(group[0])
+                    continue
+                merged = self._write_run(self._unique(heapq.merge(*(self._read_run(run) for run in group))))
+                # O run combinado já está completo: só então os originais são removidos
+                self.remove_runs(group)
+                if merged:
+                    merged_runs.append(merged)
+            runs = merged_runs
+        return runs
+    
+    def iter_unique(self, runs: List[str] = None) -> Iterator[Record]:
+        """Cada registro único dos runs, uma única vez e em ordem.
+        
+        stats['runs'] e stats['records_in'] contam os runs como foram gravados
+        (antes das passagens intermediárias) e os registros recebidos por eles.
+        """
+        if runs is None:
+            runs = self.pending_runs()
+            self._count_leftover_runs(runs)
+        runs = self._reduce_runs(list(runs))
+        self.stats['passes'] += 1
+        for record in self._unique(heapq.merge(*(self._read_run(run) for run in runs))):
+            self.stats['unique'] += 1
+            yield record
+    
+    def dedupe_to_outbox(self, outbox, segment_records: int = None) -> List[str]:
+        """Grava os registros únicos dos runs pendentes em segmentos da outbox e remove os runs."""
+        segment_records = segment_records or EXTERNAL_DEDUPE_CONFIG['segment_records']
+        runs = self.pending_runs()
+        self._count_leftover_runs(runs)
+        runs = self._reduce_runs(runs)
+        unique = self.iter_unique(runs)
+        segments = []
+        while True:
+            segment = outbox.append_records(itertools.islice(unique, segment_records))
+            if segment is None:
+                break
+            segments.append(segment)
+        # Registros únicos estão na outbox (durável): os runs não são mais necessários
+        self.remove_runs(runs)
+        return segments
+    
+    @staticmethod
+    def remove_runs(runs: List[str]):
+        for run_path in runs:
+            if os.path.exists(run_path):
+                os.remove(run_path)
@@ -9,13 +9,18 @@ Substitui as funcionalidades SMB por conexão FTP.
 import os
 import tempfile
 from ftplib import FTP
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from config.settings import FTP_CONFIG
 
+# Filtro aplicado aos arquivos remotos selecionados: (nomes, linhas do LIST) -> nomes a baixar
+FileFilter = Callable[[List[str], Dict[str, str]], List[str]]
+
 class FTPClient:
     """Cliente FTP para acessar arquivos de log."""
     
-    def __init__(self):
+    def __init__(self, config: Dict = None):
+        # Chaves ausentes vêm de FTP_CONFIG (ex.: fontes adicionais só mudam host/diretório)
+        self.config = {**FTP_CONFIG, **(config or {})}
         self.ftp = None
         self.connected = False
         self.temp_dir = None
@@ -23,29 +28,29 @@ class FTPClient:
     def connect(self) -> bool:
         """Conecta ao servidor FTP."""
         try:
-            print(f"🔗 Conectando ao servidor FTP: {FTP_CONFIG['host']}:{FTP_CONFIG['port']}")
+            print(f"🔗 Conectando ao servidor FTP: {self.config['host']}:{self.config['port']}")
             
             self.ftp = FTP()
             self.ftp.connect(
-                host=FTP_CONFIG['host'],
-                port=FTP_CONFIG['port'],
-                timeout=FTP_CONFIG['timeout']
+                host=self.config['host'],
+                port=self.config['port'],
+                timeout=self.config['timeout']
             )
             
             # Login
             self.ftp.login(
-                user=FTP_CONFIG['username'],
-                passwd=FTP_CONFIG['password']
+                user=self.config['username'],
+                passwd=self.config['password']
             )
             
             # Configurar modo passivo se necessário
-            if FTP_CONFIG.get('passive_mode', True):
+            if self.config.get('passive_mode', True):
                 self.ftp.set_pasv(True)
             
             # Navegar para o diretório especificado
-            if FTP_CONFIG.get('remote_dir'):
-                self.ftp.cwd(FTP_CONFIG['remote_dir'])
-                print(f"✓ Diretório remoto: {FTP_CONFIG['remote_dir']}")
+            if self.config.get('remote_dir'):
+                self.ftp.cwd(self.config['remote_dir'])
+                print(f"✓ Diretório remoto: {self.config['remote_dir']}")
             
             self.connected = True
             print(f"✓ Conexão FTP estabelecida com sucesso")
@@ -70,6 +75,34 @@ class FTPClient:
                 self.ftp = None
                 self.connected = False
     
+    def ensure_connected(self) -> bool:
+        """Verifica a conexão com NOOP e reconecta se o servidor a encerrou."""
+        if self.ftp and self.connected:
+            try:
+                self.ftp.voidcmd('NOOP')
+                return True
+            except Exception:
+                print("⚠ Conexão FTP perdida, reconectando...")
+                self.ftp = None
+                self.connected = False
+        return self.connect()
+    
+    def list_entries(self, pattern: str = None) -> Dict[str, str]:
+        """Lista arquivos com a linha completa do LIST (tamanho e data) de cada um."""
+        if not self.connected:
+            print("✗ Não conectado ao servidor FTP")
+            return {}
+        
+        try:
+            entries = {}
+            self.ftp.retrlines('LIST', lambda x: entries.__setitem__(x.split()[-1], x))
+            if pattern:
+                entries = {name: line for name, line in entries.items() if pattern in name}
+            return entries
+        except Exception as e:
+            print(f"✗ Erro ao listar arquivos: {e}")
+            return {}
+    
     def list_files(self, pattern: str = None) -> List[str]:
         """Lista arquivos no diretório atual, opcionalmente filtrados por padrão."""
         if not self.connected:
@@ -112,16 +145,81 @@ class FTPClient:
             print(f"✗ Erro ao baixar {remote_file}: {e}")
             return False
     
-    def download_files(self, file_pattern: str, local_dir: str) -> List[str]:
-        """Baixa múltiplos arquivos que correspondem ao padrão."""
+    def download_to_spool(self, remote_file: str, max_size: int = 0):
+        """Baixa um arquivo para um buffer seekable (SpooledTemporaryFile) posicionado no início.
+        
+        Até max_size bytes o conteúdo fica em memória; acima disso vai para um
+        arquivo temporário anônimo. Retorna None em caso de erro.
+        """
+        if not self.connected:
+            print(f"✗ Não conectado ao servidor FTP")
+            return None
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+        try:
+            print(f"⬇️ Baixando: {remote_file}")
+            self.ftp.retrbinary(f'RETR {remote_file}', spool.write)
+            spool.seek(0)
+            return spool
+        except Exception as e:
+            spool.close()
+            print(f"✗ Erro ao baixar {remote_file}: {e}")
+            return None
+    
+    def select_files(self, file_pattern: str, local_dir: str,
+                     manifest: Dict[str, str] = None,
+                     file_filter: FileFilter = None) -> Tuple[List[str], Dict[str, str]]:
+        """Lista os arquivos remotos a baixar e as linhas do LIST de cada um.
+        
+        Com um manifest (nome -> linha do LIST da última execução), arquivos
+        cujo tamanho/data não mudaram e que ainda existem localmente ficam de fora.
+        Um file_filter recebe os nomes selecionados e as linhas do LIST e
+        retorna os que devem ser baixados (ex.: leases entre instâncias).
+        """
+        if manifest is None and file_filter is None:
+            return self.list_files(file_pattern), {}
+        
+        entries = self.list_entries(file_pattern)
+        if manifest is None:
+            remote_files = list(entries)
+        else:
+            remote_files = [
+                name for name, line in entries.items()
+                if manifest.get(name) != line or not os.path.exists(os.path.join(local_dir, name))
+            ]
+            if remote_files:
+                print(f"📁 {len(remote_files)} de {len(entries)} arquivos com padrão '{file_pattern}' modificados")
+        
+        if file_filter is not None and remote_files:
+            remote_files = file_filter(remote_files, entries)
+        return remote_files, entries
+    
+    def download_files(self, file_pattern: str, local_dir: str,
+                       manifest: Dict[str, str] = None,
+                       file_filter: FileFilter = None) -> List[str]:
+        """Baixa múltiplos arquivos que correspondem ao padrão.
+        
+        Com um manifest apenas arquivos modificados são baixados (ver
+        select_files). O manifest não é alterado aqui: quem processa os
+        arquivos registra a linha do LIST só depois que os registros chegam
+        à outbox, para que uma falha no parse ou na carga seja refeita.
+        """
         if not self.connected:
             print("✗ Não conectado ao servidor FTP")
             return []
         
         # Listar arquivos que correspondem ao padrão
-        remote_files = self.list_files(file_pattern)
+        remote_files, _ = self.select_files(file_pattern, local_dir, manifest, file_filter)
         if not remote_files:
-            print(f"ℹ️ Nenhum arquivo encontrado com padrão '{file_pattern}'")
+            if manifest is None and file_filter is None:
+                print(f"ℹ️ Nenhum arquivo encontrado com padrão '{file_pattern}'")
+            return []
+        return self.download_selected(remote_files, local_dir)
+    
+    def download_selected(self, remote_files: List[str], local_dir: str) -> List[str]:
+        """Baixa os arquivos já selecionados (ver select_files) para local_dir."""
+        if not self.connected:
+            print("✗ Não conectado ao servidor FTP")
             return []
         
         # Criar diretório local se não existir
@@ -160,9 +258,9 @@ class FTPClient:
         except:
             return False
 
-def connect_ftp():
+def connect_ftp(config: Dict = None):
     """Função de conveniência para conectar ao FTP."""
-    client = FTPClient()
+    client = FTPClient(config)
     if client.connect():
         return client
     return None
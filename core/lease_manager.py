@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leases de Logs Remotos
+======================
+Divide os logs 'ConsoleEDI_' entre várias instâncias do processador.
+
+Cada log é reivindicado por um lease: uma linha em uma tabela compartilhada
+com dono e expiração. Só o dono processa o arquivo; ao concluir, o lease é
+liberado guardando a linha do LIST processada, de modo que nenhuma instância
+o reprocesse até ele mudar. Leases de uma instância que caiu expiram e são
+assumidos pelas demais, então nenhum arquivo fica sem dono.
+
+O backend padrão é uma tabela no SQL Server; sem pyodbc (ou para testes com
+várias instâncias na mesma máquina) um arquivo SQLite faz o mesmo papel.
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from config.settings import SHARDING_CONFIG
+from db.sql_server_client import connect_sql_server, pyodbc_available
+
+class SqliteLeaseBackend:
+    """Tabela de leases em um arquivo SQLite compartilhado."""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: cada UPDATE/INSERT é atômico entre processos
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_leases (
+                    file_name TEXT PRIMARY KEY,
+                    owner TEXT,
+                    expires_at REAL,
+                    done_signature TEXT
+                )
+            """)
+            self._local.conn = conn
+        return conn
+    
+    def claim(self, name: str, signature: str, owner: str, seconds: int) -> bool:
+        conn = self._connect()
+        now = time.time()
+        cursor = conn.execute("""
+            UPDATE file_leases SET owner = ?, expires_at = ?
+            WHERE file_name = ?
+              AND (owner IS NULL OR owner = ? OR expires_at < ?)
+              AND (done_signature IS NULL OR done_signature <> ?)
+        """, (owner, now + seconds, name, owner, now, signature))
+        if cursor.rowcount:
+            return True
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO file_leases (file_name, owner, expires_at) VALUES (?, ?, ?)",
+            (name, owner, now + seconds)
+        )
+        return cursor.rowcount == 1
+    
+    def renew(self, names: List[str], owner: str, seconds: int):
+        conn = self._connect()
+        expires_at = time.time() + seconds
+        conn.executemany(
+            "UPDATE file_leases SET expires_at = ? WHERE file_name = ? AND owner = ?",
+            [(expires_at, name, owner) for name in names]
+        )
+    
+    def finish(self, name: str, owner: str, signature: Optional[str]):
+        conn = self._connect()
+        if signature is None:
+            conn.execute(
+                "UPDATE file_leases SET owner = NULL, expires_at = NULL WHERE file_name = ? AND owner = ?",
+                (name, owner)
+            )
+        else:
+            conn.execute("""
+                UPDATE file_leases SET owner = NULL, expires_at = NULL, done_signature = ?
+                WHERE file_name = ? AND owner = ?
+            """, (signature, name, owner))
+
+class SqlServerLeaseBackend:
+    """Tabela de leases compartilhada no SQL Server (expiração pelo relógio do servidor)."""
+    
+    def __init__(self, table: str):
+        self.table = table
+        self._conn = None
+    
+    def _connect(self):
+        if self._conn is None:
+            conn = connect_sql_server()
+            if conn is None:
+                return None
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                IF OBJECT_ID('{self.table}', 'U') IS NULL
+                CREATE TABLE {self.table} (
+                    file_name NVARCHAR(255) NOT NULL PRIMARY KEY,
+                    owner NVARCHAR(128) NULL,
+                    expires_at DATETIME2 NULL,
+                    done_signature NVARCHAR(512) NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+    
+    def _reset(self):
+        """Descarta a conexão após um erro: a próxima chamada reconecta."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def claim(self, name: str, signature: str, owner: str, seconds: int) -> bool:
+        conn = self._connect()
+        if conn is None:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE {self.table} SET owner = ?, expires_at = DATEADD(second, ?, SYSUTCDATETIME())
+                WHERE file_name = ?
+                  AND (owner IS NULL OR owner = ? OR expires_at < SYSUTCDATETIME())
+                  AND (done_signature IS NULL OR done_signature <> ?)
+            """, (owner, seconds, name, owner, signature))
+            if cursor.rowcount:
+                return True
+            cursor.execute(f"""
+                INSERT INTO {self.table} (file_name, owner, expires_at)
+                VALUES (?, ?, DATEADD(second, ?, SYSUTCDATETIME()))
+            """, (name, owner, seconds))
+            return True
+        except Exception as e:
+            import pyodbc
+            if isinstance(e, pyodbc.IntegrityError):
+                # Violação de chave: outra instância criou o lease primeiro
+                return False
+            self._reset()
+            raise
+    
+    def renew(self, names: List[str], owner: str, seconds: int):
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(f"""
+                UPDATE {self.table} SET expires_at = DATEADD(second, ?, SYSUTCDATETIME())
+                WHERE file_name = ? AND owner = ?
+            """, [(seconds, name, owner) for name in names])
+        except Exception:
+            self._reset()
+            raise
+    
+    def finish(self, name: str, owner: str, signature: Optional[str]):
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            cursor = conn.cursor()
+            if signature is None:
+                cursor.execute(f"""
+                    UPDATE {self.table} SET owner = NULL, expires_at = NULL
+                    WHERE file_name = ? AND owner = ?
+                """, (name, owner))
+            else:
+                cursor.execute(f"""
+                    UPDATE {self.table} SET owner = NULL, expires_at = NULL, done_signature = ?
+                    WHERE file_name = ? AND owner = ?
+                """, (signature, name, owner))
+        except Exception:
+            self._reset()
+            raise
+
+def _create_backend(config: Dict):
+    """Escolhe o backend de leases conforme a configuração."""
+    backend = config['backend']
+    if backend == 'sqlserver' or (backend == 'auto' and pyodbc_available()):
+        return SqlServerLeaseBackend(config['table'])
+    return SqliteLeaseBackend(config['sqlite_path'])
+
+class LeaseManager:
+    """Reivindica, renova e libera os leases dos logs processados por esta instância."""
+    
+    def __init__(self, config: Dict = None, backend=None):
+        self.config = config or SHARDING_CONFIG
+        self.owner = self.config['instance_id'] or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = self.config['lease_seconds']
+        self.backend = backend or _create_backend(self.config)
+        self._lock = threading.Lock()
+        self._held: Dict[str, str] = {}   # Nome -> linha do LIST no momento da reivindicação
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+    
+    def claim_files(self, names: List[str], entries: Dict[str, str]) -> List[str]:
+        """Filtro de arquivos remotos: retorna apenas os que esta instância reivindicou."""
+        claimed = []
+        for name in names:
+            signature = entries.get(name, '')
+            with self._lock:
+                try:
+                    ok = self.backend.claim(name, signature, self.owner, self.lease_seconds)
+                except Exception as e:
+                    print(f"⚠️ Erro ao reivindicar lease de {name}: {e}")
+                    ok = False
+                if ok:
+                    self._held[name] = signature
+            if ok:
+                claimed.append(name)
+        
+        if len(claimed) < len(names):
+            print(f"🔒 {len(names) - len(claimed)} de {len(names)} logs com lease de outra instância ou já processados")
+        if claimed:
+            self._start_heartbeat()
+        return claimed
+    
+    def complete(self, files: List[str]):
+        """Libera os leases de arquivos processados, registrando a versão processada."""
+        with self._lock:
+            for path in files:
+                name = os.path.basename(path)
+                signature = self._held.pop(name, None)
+                if signature is not None:
+                    self.backend.finish(name, self.owner, signature)
+    
+    def release_all(self):
+        """Libera os leases restantes (falhas) para que qualquer instância os assuma."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        self._stop.clear()
+        
+        with self._lock:
+            for name in list(self._held):
+                try:
+                    self.backend.finish(name, self.owner, None)
+                except Exception as e:
+                    # Sem liberação explícita o lease expira sozinho
+                    print(f"⚠️ Erro ao liberar lease de {name}: {e}")
+            self._held.clear()
+    
+    def _start_heartbeat(self):
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._renew_loop, daemon=True)
+            self._heartbeat.start()
+    
+    def _renew_loop(self):
+        """Renova os leases mantidos enquanto o ciclo estiver em andamento."""
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                names = list(self._held)
+                if not names:
+                    continue
+                try:
+                    self.backend.renew(names, self.owner, self.lease_seconds)
+                except Exception as e:
+                    print(f"⚠️ Erro ao renovar leases: {e}")
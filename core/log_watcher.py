@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monitoramento de Logs Locais
+============================
+Para logs em disco local ou no compartilhamento SMB montado: reage a cada
+escrita em vez de esperar o próximo ciclo do daemon.
+
+Usa inotify (via ctypes, sem dependências) quando disponível e polling por
+stat caso contrário. Em montagens de rede (CIFS/NFS) o inotify não enxerga
+escritas feitas por outras máquinas, então o modo automático usa polling.
+
+Os bytes acrescentados a cada log são lidos no próprio arquivo a partir do
+último offset gravado no StateStore, sem cópia para temp_unzipped_logs. Só
+blocos completos (terminados pela linha separadora) são consumidos; um bloco
+ainda em escrita é relido na próxima alteração.
+"""
+
+import os
+import time
+import errno
+import select
+import signal
+import struct
+import threading
+import ctypes
+import ctypes.util
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from config.settings import WATCH_CONFIG, SMB_CONFIG, PROCESSING_CONFIG, CSV_FILTER_CONFIG
+from core.csv_processor import iter_log_records
+from core.memory_budget import peak_rss_mb
+from core.traffic import TrafficAccumulator
+
+_NETWORK_FILESYSTEMS = {'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs'}
+
+# Constantes de <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+_EVENT_HEADER = struct.Struct('iIII')
+
+def _filesystem_type(path: str) -> Optional[str]:
+    """Tipo do sistema de arquivos do ponto de montagem mais específico que contém o caminho."""
+    path = os.path.realpath(path)
+    best, fs_type = '', None
+    try:
+        with open('/proc/mounts', 'r') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+class InotifyWatch:
+    """Observa diretórios com inotify; wait() retorna os caminhos alterados."""
+    
+    def __init__(self, directories: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+        self._dirs: Dict[int, str] = {}
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch falhou em {directory}')
+            self._dirs[wd] = directory
+    
+    def wait(self, timeout: float, debounce: float) -> List[str]:
+        """Aguarda eventos por até timeout segundos, agrupando os que chegam em seguida."""
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            changed.update(self._read_events())
+            # Escritas em rajada geram muitos eventos: agrupa antes de ler o arquivo
+            ready, _, _ = select.select([self.fd], [], [], debounce)
+        return sorted(changed)
+    
+    def _read_events(self) -> List[str]:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name and wd in self._dirs:
+                paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+    
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatch:
+    """Observa diretórios comparando tamanho e mtime a cada intervalo."""
+    
+    def __init__(self, directories: List[str]):
+        self.directories = directories
+        self._seen: Dict[str, Tuple[int, int]] = {}
+    
+    def wait(self, timeout: float, debounce: float = 0) -> List[str]:
+        time.sleep(timeout)
+        changed = []
+        for directory in self.directories:
+            try:
+                for entry in os.scandir(directory):
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    signature = (stat.st_size, stat.st_mtime_ns)
+                    if self._seen.get(entry.path) != signature:
+                        self._seen[entry.path] = signature
+                        changed.append(entry.path)
+            except OSError as e:
+                print(f"⚠️ Erro ao verificar {directory}: {e}")
+        return changed
+    
+    def close(self):
+        pass
+
+class LogWatcher:
+    """Lê os bytes acrescentados aos logs monitorados e os carrega pelo LogProcessor."""
+    
+    def __init__(self, processor, directories: List[str] = None, config: Dict = None):
+        self.processor = processor
+        self.config = config or WATCH_CONFIG
+        self.directories = directories or self.config['directories'] or [SMB_CONFIG['mount_point']]
+        self.state_store = processor.state_store
+        self.separator = PROCESSING_CONFIG['separator_line'].encode('utf-8')
+        self.keywords = CSV_FILTER_CONFIG['keywords']
+        self._stop = threading.Event()
+        self._window_start = datetime.now()
+        self._window_logs = set()
+        self._window_errors = 0
+    
+    def stop(self, signum=None, frame=None):
+        if not self._stop.is_set():
+            print("\n🛑 Sinal de parada recebido - encerrando o monitoramento...")
+        self._stop.set()
+    
+    def _is_log(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return (name.startswith(PROCESSING_CONFIG['log_file_pattern'])
+                and name.endswith(PROCESSING_CONFIG['log_file_extension']))
+    
+    def _create_watch(self):
+        """inotify quando configurado/possível; polling em montagens de rede ou sem inotify."""
+        backend = self.config['backend']
+        if backend == 'auto':
+            network = [d for d in self.directories if _filesystem_type(d) in _NETWORK_FILESYSTEMS]
+            backend = 'poll' if network else 'inotify'
+        if backend == 'inotify':
+            try:
+                watch = InotifyWatch(self.directories)
+                print("👁️ Monitorando com inotify")
+                return watch
+            except (OSError, AttributeError) as e:
+                print(f"⚠️ inotify indisponível ({e}) - usando polling")
+        print(f"👁️ Monitorando com polling a cada {self.config['poll_interval_sec']}s")
+        return PollingWatch(self.directories)
+    
+    def run(self):
+        """Processa o que já existe e depois cada escrita, até receber sinal de parada."""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+        
+        if SMB_CONFIG['mount_point'] in self.directories:
+            from core.smb_utils import mount_smb_share
+            mount_smb_share()
+        if not self.processor.init_databases():
+            return False
+        
+        print(f"\n👁️ MONITORANDO LOGS EM: {', '.join(self.directories)}")
+        self.processor.start_time = self._window_start
+        watch = self._create_watch()
+        try:
+            # Logs já existentes: lê o que foi escrito desde o último offset
+            for directory in self.directories:
+                for name in sorted(os.listdir(directory)):
+                    self.process_file(os.path.join(directory, name))
+            
+            while not self._stop.is_set():
+                for path in watch.wait(self.config['poll_interval_sec'], self.config['debounce_sec']):
+                    self.process_file(path)
+                self._maybe_save_session()
+        finally:
+            watch.close()
+            self._maybe_save_session(force=True)
+            self.processor.close()
+        return True
+    
+    def process_file(self, path: str) -> int:
+        """Carrega os blocos completos acrescentados desde o último offset; retorna os registros."""
+        if not self._is_log(path):
+            return 0
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        
+        stored = self.state_store.get_log_offset(path)
+        offset = stored[1] if stored else 0
+        if stored and (stored[0] != stat.st_ino or stat.st_size < offset):
+            # Log recriado ou truncado: recomeça do início (a carga ignora registros já existentes)
+            print(f"  🔄 {os.path.basename(path)} foi recriado - relendo do início")
+            offset = 0
+        if stat.st_size <= offset:
+            return 0
+        
+        # Lido desde o início, o log substitui os agregados de tráfego dele; depois os trechos são somados
+        replace_traffic = offset == 0
+        loaded = 0
+        try:
+            with open(path, 'rb') as log:
+                log.seek(offset)
+                pending = b''
+                while True:
+                    chunk = log.read(self.config['read_chunk_bytes'])
+                    if not chunk:
+                        break
+                    data = pending + chunk
+                    end = self._complete_blocks_end(data)
+                    pending = data[end:]
+                    if not end:
+                        continue
+                    # Linhas inteiras: a decodificação nunca corta um caractere
+                    lines = data[:end].decode('utf-8', errors='replace').splitlines()
+                    traffic = TrafficAccumulator()
+                    records = [
+                        record for record in traffic.observe(iter_log_records(lines))
+                        if any(keyword in record[1] for keyword in self.keywords)
+                    ]
+                    if records and not self.processor.load_records(records, path):
+                        # Blocos fora da outbox: o offset fica parado e o trecho é relido no próximo evento
+                        self._window_errors += 1
+                        break
+                    if replace_traffic:
+                        traffic.replace(os.path.basename(path))
+                        replace_traffic = False
+                    else:
+                        traffic.merge(os.path.basename(path))
+                    loaded += len(records)
+                    offset += end
+                    self.state_store.save_log_offset(path, stat.st_ino, offset)
+        except Exception as e:
+            self._window_errors += 1
+            print(f"  ✗ Erro ao ler {os.path.basename(path)}: {e}")
+        
+        if loaded:
+            self._window_logs.add(path)
+        return loaded
+    
+    def _complete_blocks_end(self, data: bytes) -> int:
+        """Posição logo após a última linha separadora completa (0 se não houver)."""
+        end = len(data)
+        while True:
+            index = data.rfind(self.separator, 0, end)
+            if index < 0:
+                return 0
+            newline = data.find(b'\n', index + len(self.separator))
+            if newline >= 0 and not data[index + len(self.separator):newline].strip(b'\r'):
+                return newline + 1
+            end = index
+    
+    def _maybe_save_session(self, force: bool = False):
+        """Grava uma sessão por janela de session_interval_sec (janelas ociosas são coalescidas)."""
+        now = datetime.now()
+        if not force and (now - self._window_start).total_seconds() < self.config['session_interval_sec']:
+            return
+        processor = self.processor
+        try:
+            processor.state_store.save_session(
+                self._window_start, now, 0, len(self._window_logs), 0,
+                processor.sql_success_count,
+                self._window_errors + processor.sql_error_count,
+                None, peak_rss_mb()
+            )
+        except Exception as e:
+            print(f"✗ Erro ao salvar sessão: {e}")
+        processor.reset_cycle()
+        self._window_start = processor.start_time = now
+        self._window_logs = set()
+        self._window_errors = 0
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orçamento de Memória
+====================
+Contabiliza os registros mantidos em memória pelos estágios (lotes do dreno
+e agregados do parser) contra PERFORMANCE_CONFIG['max_memory_usage_mb'].
+
+Perto do limite os lotes encolhem até chunk_size e os produtores aguardam;
+o que não cabe é descarregado no disco (envio antecipado do lote ou
+fechamento dos agregados). Também mede o pico de RSS de cada sessão.
+"""
+
+import sys
+import threading
+from typing import Any, Dict, Iterable, Optional
+from config.settings import PERFORMANCE_CONFIG
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# Custo aproximado de uma tupla de registro além do texto dos campos
+RECORD_OVERHEAD_BYTES = 200
+
+def estimate_record_bytes(record: Iterable[str]) -> int:
+    """Estimativa barata da memória ocupada por um registro."""
+    return RECORD_OVERHEAD_BYTES + sum(len(field) for field in record)
+
+class MemoryBudget:
+    """Reserva de bytes compartilhada entre threads com espera quando cheio."""
+    
+    def __init__(self, limit_mb: float = None, high_watermark: float = None):
+        self.limit = int((limit_mb or PERFORMANCE_CONFIG['max_memory_usage_mb']) * 1024 * 1024)
+        self.high_watermark = high_watermark or PERFORMANCE_CONFIG['memory_high_watermark']
+        self.min_batch = PERFORMANCE_CONFIG['chunk_size']
+        self._used = 0
+        self._cond = threading.Condition()
+        self.peak = 0
+        self.stalls = 0
+        self.shrinks = 0
+        self.early_flushes = 0
+    
+    @property
+    def used(self) -> int:
+        return self._used
+    
+    def pressure(self) -> float:
+        """Fração do orçamento em uso."""
+        return self._used / self.limit
+    
+    def try_reserve(self, nbytes: int) -> bool:
+        """Reserva sem esperar; falha se estourar o limite (uma reserva isolada sempre passa)."""
+        with self._cond:
+            if self._used > 0 and self._used + nbytes > self.limit:
+                return False
+            self._used += nbytes
+            self.peak = max(self.peak, self._used)
+            return True
+    
+    def release(self, nbytes: int):
+        """Devolve bytes reservados e acorda produtores em espera."""
+        if nbytes <= 0:
+            return
+        with self._cond:
+            self._used = max(0, self._used - nbytes)
+            self._cond.notify_all()
+    
+    def wait_for_room(self, timeout: float = 60.0) -> bool:
+        """Segura o produtor enquanto o uso estiver acima da marca alta."""
+        with self._cond:
+            if self.pressure() < self.high_watermark:
+                return True
+            self.stalls += 1
+            return self._cond.wait_for(lambda: self.pressure() < self.high_watermark, timeout)
+    
+    def batch_limit(self, batch_size: int, record_bytes: int = RECORD_OVERHEAD_BYTES * 2) -> int:
+        """Tamanho de lote que cabe no espaço livre abaixo da marca alta (mínimo chunk_size)."""
+        available = self.limit * self.high_watermark - self._used
+        fitting = int(available // record_bytes) if available > 0 else 0
+        if fitting >= batch_size:
+            return batch_size
+        self.shrinks += 1
+        return max(self.min_batch, fitting)
+    
+    def get_summary(self) -> Dict[str, Any]:
+        return {
+            'limit_mb': round(self.limit / 1024 / 1024, 1),
+            'peak_buffered_mb': round(self.peak / 1024 / 1024, 1),
+            'stalls': self.stalls,
+            'shrinks': self.shrinks,
+            'early_flushes': self.early_flushes
+        }
+
+_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+def get_memory_budget() -> MemoryBudget:
+    """Orçamento compartilhado pelo processo."""
+    global _budget
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                _budget = MemoryBudget()
+    return _budget
+
+def reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux); sem efeito em outros sistemas."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de RSS desde o início do processo ou do último reset_peak_rss, em MB."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return None
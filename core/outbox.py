@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outbox Local de Registros
+=========================
+Fila durável (append-only) de registros EDI pendentes de envio ao banco.
+
+O parser sempre grava os registros filtrados em segmentos CSV dentro do
+diretório da outbox. O dreno envia os segmentos pendentes em lotes grandes
+quando o banco está acessível e só apaga cada segmento após o commit.
+
+Um segmento gravado com uma origem (o log relido por inteiro a cada ciclo)
+substitui os segmentos pendentes mais antigos da mesma origem, então uma
+queda longa do banco deixa uma cópia de cada log na outbox, não uma por ciclo.
+"""
+
+import os
+import csv
+import glob
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Iterable, Iterator, Tuple, Optional
+from config.settings import OUTBOX_CONFIG, PERFORMANCE_CONFIG
+from db.sql_server_client import connect_sink, send_records, iter_csv_records
+from core.memory_budget import get_memory_budget, estimate_record_bytes
+
+class Outbox:
+    """Fila local de segmentos de registros pendentes para o SQL Server."""
+    
+    SEGMENT_PREFIX = 'seg_'
+    SEGMENT_SUFFIX = '.csv'
+    SOURCE_SEPARATOR = '@'
+    
+    def __init__(self, outbox_dir: str = None, connect: Callable = None, send: Callable = None):
+        self.outbox_dir = outbox_dir or OUTBOX_CONFIG['outbox_dir']
+        # Destino injetável (ex.: SQLite temporário em benchmarks)
+        self._connect = connect or connect_sink
+        self._send = send or send_records
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+        os.makedirs(self.outbox_dir, exist_ok=True)
+    
+    def append_csv(self, csv_file: str, source: str = None) -> Optional[str]:
+        """Grava os registros de um CSV filtrado como um novo segmento."""
+        return self.append_records(iter_csv_records(csv_file), source)
+    
+    def append_records(self, records: Iterable[Tuple[str, str, str]], source: str = None) -> Optional[str]:
+        """Grava registros em um novo segmento de forma atômica e retorna o caminho.
+        
+        Com source (registros de um log inteiro, que só cresce) os segmentos
+        pendentes mais antigos da mesma origem são removidos depois que o novo
+        está gravado: o novo contém todos os registros deles.
+        """
+        with self._sequence_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        base_name = f"{self.SEGMENT_PREFIX}{stamp}_{os.getpid()}_{sequence:06d}"
+        if source:
+            source = self._source_tag(source)
+            base_name += f"{self.SOURCE_SEPARATOR}{source}"
+        tmp_path = os.path.join(self.outbox_dir, base_name + '.tmp')
+        
+        count = 0
+        try:
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as segment:
+                writer = csv.writer(segment)
+                for record in records:
+                    writer.writerow(record)
+                    count += 1
+                segment.flush()
+                os.fsync(segment.fileno())
+        except Exception:
+            # Iterador ou disco falhou no meio: o segmento parcial não fica na outbox
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        if count == 0:
+            os.remove(tmp_path)
+            return None
+        
+        # A quantidade de registros vai no nome para contar pendências sem ler os arquivos
+        segment_path = os.path.join(self.outbox_dir, f"{base_name}_{count}{self.SEGMENT_SUFFIX}")
+        os.replace(tmp_path, segment_path)
+        if source:
+            self._supersede(source, segment_path)
+        return segment_path
+    
+    @staticmethod
+    def _source_tag(source: str) -> str:
+        """Origem segura para o nome do segmento (nome do arquivo, sem separadores)."""
+        return os.path.basename(source).replace(Outbox.SOURCE_SEPARATOR, '-')
+    
+    @staticmethod
+    def segment_source(segment_path: str) -> Optional[str]:
+        """Origem registrada no nome do segmento (None para segmentos sem origem)."""
+        name = os.path.basename(segment_path)[:-len(Outbox.SEGMENT_SUFFIX)]
+        if Outbox.SOURCE_SEPARATOR not in name:
+            return None
+        return name.split(Outbox.SOURCE_SEPARATOR, 1)[1].rsplit('_', 1)[0]
+    
+    def _supersede(self, source: str, segment_path: str) -> int:
+        """Remove os segmentos pendentes da origem gravados antes de segment_path."""
+        pattern = os.path.join(
+            self.outbox_dir,
+            f"{self.SEGMENT_PREFIX}*{self.SOURCE_SEPARATOR}{glob.escape(source)}_*{self.SEGMENT_SUFFIX}"
+        )
+        removed = 0
+        for segment in glob.glob(pattern):
+            # Nomes começam pelo instante de criação: menor nome = segmento mais antigo
+            if segment < segment_path and self.segment_source(segment) == source:
+                try:
+                    os.remove(segment)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # Já drenado por outra thread
+        return removed
+    
+    def pending_segments(self) -> List[str]:
+        """Lista os segmentos pendentes em ordem de criação."""
+        pattern = os.path.join(self.outbox_dir, f"{self.SEGMENT_PREFIX}*{self.SEGMENT_SUFFIX}")
+        return sorted(glob.glob(pattern))
+    
+    def pending_records(self) -> int:
+        """Total de registros pendentes, lido do nome dos segmentos."""
+        return sum(self.segment_size(segment) for segment in self.pending_segments())
+    
+    @staticmethod
+    def segment_size(segment_path: str) -> int:
+        """Quantidade de registros de um segmento."""
+        name = os.path.basename(segment_path)[:-len(Outbox.SEGMENT_SUFFIX)]
+        try:
+            return int(name.rsplit('_', 1)[1])
+        except (IndexError, ValueError):
+            return 0
+    
+    @staticmethod
+    def read_segment(segment_path: str) -> Iterator[Tuple[str, str, str]]:
+        """Lê os registros de um segmento (nenhum se ele foi substituído nesse meio tempo)."""
+        try:
+            segment = open(segment_path, 'r', newline='', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with segment:
+            for row in csv.reader(segment):
+                if len(row) >= 3:
+                    yield (row[0], row[1], row[2])
+    
+    def drain(self, segments: List[str] = None, batch_size: int = None,
+              workers: int = 1, quiet: bool = False, check_existing: bool = True,
+              controller=None, deadline: Optional[float] = None) -> dict:
+        """Envia segmentos pendentes ao banco em lotes e remove os já confirmados.
+        
+        Com workers > 1 os segmentos são divididos entre conexões paralelas.
+        Com um controller (AdaptiveBatchController) o tamanho de cada lote e o
+        número de conexões vêm do controlador, que é alimentado com a latência
+        de cada envio. 'unreachable' indica que a conexão com o banco falhou.
+        Com um deadline (time.monotonic) cada conexão envia ao menos um segmento
+        e não inicia outro depois dele; o resto fica pendente ('ok' False).
+        """
+        segments = self.pending_segments() if segments is None else segments
+        batch_size = batch_size or OUTBOX_CONFIG['drain_batch_size']
+        result = {'segments': 0, 'records': 0, 'inserted': 0, 'ok': True, 'unreachable': False}
+        
+        if not segments:
+            return result
+        
+        if controller is not None:
+            workers = controller.workers
+        workers = max(1, min(workers, len(segments)))
+        started = time.perf_counter()
+        
+        if workers == 1:
+            result = self._drain_group(segments, batch_size, quiet, check_existing, controller, deadline)
+        else:
+            groups = [segments[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(self._drain_group, group, batch_size, quiet, check_existing,
+                                    controller, deadline)
+                    for group in groups
+                ]
+                for future in futures:
+                    group_result = future.result()
+                    for key in ('segments', 'records', 'inserted'):
+                        result[key] += group_result[key]
+                    result['ok'] = result['ok'] and group_result['ok']
+                    result['unreachable'] = result['unreachable'] or group_result['unreachable']
+        
+        if controller is not None and result['ok']:
+            controller.end_drain(workers, result['records'], time.perf_counter() - started)
+        
+        return result
+    
+    def _drain_group(self, segments: List[str], batch_size: int, quiet: bool,
+                     check_existing: bool, controller=None, deadline: Optional[float] = None) -> dict:
+        """Drena um grupo de segmentos usando uma única conexão."""
+        result = {'segments': 0, 'records': 0, 'inserted': 0, 'ok': True, 'unreachable': False}
+        
+        conn = self._connect(OUTBOX_CONFIG['connect_timeout'])
+        if conn is None:
+            print(f"  ⏸️ Banco inacessível - {len(segments)} segmentos mantidos na outbox")
+            result['ok'] = False
+            result['unreachable'] = True
+            return result
+        
+        budget = get_memory_budget()
+        chunk_size = PERFORMANCE_CONFIG['chunk_size']
+        state = {'batch': [], 'completed': [], 'reserved': 0}
+        
+        def flush():
+            """Envia o lote, remove os segmentos concluídos e devolve a reserva de memória."""
+            if state['batch']:
+                self._send_batch(conn, state['batch'], result, quiet, check_existing, controller)
+            result['segments'] += self._remove_segments(state['completed'])
+            budget.release(state['reserved'])
+            state.update(batch=[], completed=[], reserved=0)
+        
+        def batch_limit() -> int:
+            """Tamanho de lote do controlador, reduzido se o orçamento de memória estiver apertado."""
+            return budget.batch_limit(controller.batch_size if controller is not None else batch_size)
+        
+        try:
+            chunk_bytes = 0
+            limit = batch_limit()
+            for index, segment in enumerate(segments):
+                if index and deadline is not None and time.monotonic() >= deadline:
+                    print(f"  ⏱️ Fim do orçamento do ciclo - {len(segments) - index} segmentos ficam para o próximo")
+                    result['ok'] = False
+                    break
+                for record in self.read_segment(segment):
+                    state['batch'].append(record)
+                    chunk_bytes += estimate_record_bytes(record)
+                    
+                    # Reserva o orçamento a cada chunk; sem espaço o lote é enviado antes da hora
+                    if len(state['batch']) % chunk_size == 0:
+                        if budget.try_reserve(chunk_bytes):
+                            state['reserved'] += chunk_bytes
+                        else:
+                            budget.early_flushes += 1
+                            flush()
+                        chunk_bytes = 0
+                        limit = batch_limit()
+                    
+                    if len(state['batch']) >= limit:
+                        flush()
+                        chunk_bytes = 0
+                        limit = batch_limit()
+                state['completed'].append(segment)
+            
+            flush()
+        
+        except Exception as e:
+            print(f"  ✗ Erro ao drenar outbox: {e}")
+            result['ok'] = False
+        finally:
+            budget.release(state['reserved'])
+            conn.close()
+        
+        return result
+    
+    def _send_batch(self, conn, batch: list, result: dict, quiet: bool = False,
+                    check_existing: bool = True, controller=None):
+        """Envia um lote e acumula os contadores do dreno."""
+        started = time.perf_counter()
+        inserted = self._send(conn, batch, check_existing=check_existing)
+        if controller is not None:
+            controller.record_batch(len(batch), time.perf_counter() - started)
+        result['records'] += len(batch)
+        result['inserted'] += inserted
+        if not quiet:
+            print(f"  ✓ Lote de {len(batch)} registros confirmado ({inserted} novos)")
+    
+    @staticmethod
+    def _remove_segments(segments: List[str]) -> int:
+        """Remove segmentos já confirmados no banco."""
+        for segment in segments:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass  # Substituído por um segmento mais novo da mesma origem
+        return len(segments)
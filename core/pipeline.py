@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline em Estágios
+====================
+Sobrepõe download, conversão/filtro e carga: cada estágio tem seus próprios
+workers e as filas limitadas entre eles aplicam backpressure, então o
+primeiro log já está sendo carregado enquanto os seguintes ainda são
+baixados e a memória fica limitada ao tamanho das filas.
+"""
+
+import os
+import time
+import queue
+import itertools
+import threading
+from typing import Dict, List, Any, Optional
+from config.settings import PIPELINE_CONFIG, FTP_CONFIG
+from core.ftp_utils import connect_ftp, disconnect_ftp
+from core.scheduler import BACKLOG_LANE, LANES, classify_lane, prioritize
+
+_DONE = object()  # Sentinela de fim de estágio
+_DONE_RANK = len(LANES)  # Sentinelas saem das filas depois de todos os itens
+
+class StagedPipeline:
+    """Executa download -> parse/filtro -> carga de um ciclo do LogProcessor."""
+    
+    def __init__(self, processor, config: Dict[str, Any] = None):
+        self.processor = processor
+        self.config = config or PIPELINE_CONFIG
+        self._lock = threading.Lock()
+        self.downloaded_files: List[str] = []
+        self.filtered_files: List[str] = []
+        # Logs cujos registros chegaram à outbox (só esses têm o lease concluído)
+        self.completed_files: List[str] = []
+        self._entries: Dict[str, str] = {}
+        self._manifest: Optional[Dict[str, str]] = None
+        self.deferred_files: List[str] = []
+        self._sequence = itertools.count()
+    
+    def run(self, remote_files: List[str], entries: Dict[str, str] = None,
+            manifest: Dict[str, str] = None, deadline: Optional[float] = None) -> List[str]:
+        """Processa os arquivos remotos e retorna os logs baixados.
+        
+        Com um manifest, cada log cujos registros chegaram à outbox tem sua
+        linha do LIST (entries) registrada para que ciclos seguintes o pulem se
+        não mudar; logs com falha no parse ou na carga são refeitos.
+        O log do dia entra primeiro e passa à frente do backlog nas filas entre
+        estágios; após o deadline (modo daemon) nenhum log de backlog é iniciado
+        e os restantes ficam para o próximo ciclo.
+        """
+        local_dir = FTP_CONFIG['local_download_dir']
+        os.makedirs(local_dir, exist_ok=True)
+        self._entries = entries or {}
+        self._manifest = manifest
+        
+        pending = queue.Queue()
+        for remote_file in prioritize(remote_files):
+            pending.put(remote_file)
+        parse_queue = queue.PriorityQueue(maxsize=self.config['queue_size'])
+        load_queue = queue.PriorityQueue(maxsize=self.config['queue_size'])
+        
+        download_workers = max(1, min(self.config['download_workers'], len(remote_files)))
+        parse_workers = max(1, self.config['parse_workers'])
+        load_workers = max(1, self.config['load_workers'])
+        print(f"🔀 Pipeline: {download_workers} download, {parse_workers} parse, "
+              f"{load_workers} carga (filas de {self.config['queue_size']})")
+        
+        stages = [
+            ([self._start(self._download_worker, pending, parse_queue, local_dir, deadline)
+              for _ in range(download_workers)], parse_queue, parse_workers),
+            ([self._start(self._parse_worker, parse_queue, load_queue)
+              for _ in range(parse_workers)], load_queue, load_workers),
+            ([self._start(self._load_worker, load_queue)
+              for _ in range(load_workers)], None, 0)
+        ]
+        
+        # Encerra cada estágio quando o anterior termina
+        for threads, next_queue, next_workers in stages:
+            for thread in threads:
+                thread.join()
+            for _ in range(next_workers):
+                self._put(next_queue, _DONE_RANK, _DONE)
+        
+        if self.deferred_files:
+            print(f"⏭️ {len(self.deferred_files)} logs de backlog adiados para o próximo ciclo")
+        return self.downloaded_files
+    
+    @staticmethod
+    def _start(target, *args) -> threading.Thread:
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+    
+    def _put(self, stage_queue: queue.PriorityQueue, rank: int, item):
+        """Enfileira por faixa (ativa antes do backlog) e ordem de chegada."""
+        stage_queue.put((rank, next(self._sequence), item))
+    
+    def _download_worker(self, pending: queue.Queue, parse_queue: queue.Queue, local_dir: str,
+                         deadline: Optional[float] = None):
+        """Baixa arquivos com uma conexão FTP própria e os entrega ao parse.
+        
+        Um erro inesperado em um arquivo é contado e o worker segue com os
+        próximos, para que o estágio sempre termine e run() não fique preso no join.
+        """
+        client = None
+        try:
+            while True:
+                try:
+                    remote_file = pending.get_nowait()
+                except queue.Empty:
+                    return
+                
+                try:
+                    lane = classify_lane(remote_file)
+                    if lane == BACKLOG_LANE and deadline is not None and time.monotonic() > deadline:
+                        with self._lock:
+                            self.deferred_files.append(remote_file)
+                        continue
+                    
+                    if client is None:
+                        client = connect_ftp()
+                        if client is None:
+                            self._error(f"Sem conexão FTP para baixar {remote_file}")
+                            continue
+                    
+                    local_file = os.path.join(local_dir, remote_file)
+                    if not client.download_file(remote_file, local_file):
+                        self._error(f"Falha no download de {remote_file}")
+                        continue
+                    
+                    with self._lock:
+                        self.downloaded_files.append(local_file)
+                    self._put(parse_queue, LANES.index(lane), local_file)
+                except Exception as e:
+                    self._error(f"Erro no download de {remote_file}: {e}")
+                    # Estado da conexão desconhecido: abre outra no próximo arquivo
+                    if client:
+                        disconnect_ftp(client)
+                        client = None
+        finally:
+            if client:
+                disconnect_ftp(client)
+    
+    def _parse_worker(self, parse_queue: queue.Queue, load_queue: queue.Queue):
+        """Converte e filtra logs baixados, entregando os CSVs filtrados à carga."""
+        csv_processor = self.processor.csv_processor
+        while True:
+            rank, _, log_file = parse_queue.get()
+            if log_file is _DONE:
+                return
+            try:
+                for csv_file in csv_processor.convert_logs_to_csv([log_file]):
+                    for filtered_file in csv_processor.filter_csv_files([csv_file]):
+                        self._put(load_queue, rank, (log_file, filtered_file))
+            except Exception as e:
+                # O worker continua consumindo: o download nunca fica bloqueado na fila cheia
+                self._error(f"Erro no parse de {os.path.basename(log_file)}: {e}")
+    
+    def _load_worker(self, load_queue: queue.Queue):
+        """Grava cada CSV filtrado na outbox e drena apenas o seu segmento."""
+        while True:
+            _, _, item = load_queue.get()
+            if item is _DONE:
+                return
+            log_file, csv_file = item
+            try:
+                loaded = self.processor.load_csv(csv_file)
+            except Exception as e:
+                self._error(f"Erro na carga de {os.path.basename(csv_file)}: {e}")
+                loaded = False
+            with self._lock:
+                self.filtered_files.append(csv_file)
+                if loaded:
+                    self.completed_files.append(log_file)
+                    remote_file = os.path.basename(log_file)
+                    if self._manifest is not None and remote_file in self._entries:
+                        self._manifest[remote_file] = self._entries[remote_file]
+    
+    def _error(self, message: str):
+        print(f"  ✗ {message}")
+        self.processor.csv_processor.errors.append(message)
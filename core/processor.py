@@ -7,25 +7,98 @@ Coordena o processamento de arquivos ZIP e CSV de forma separada.
 """
 
 import os
-import sqlite3
+import time
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
-from config.settings import LOCAL_CONFIG, SMB_CONFIG, PROCESSING_CONFIG, FTP_CONFIG
-from core.zip_processor import ZipProcessor
-from core.csv_processor import CsvProcessor
-from core.ftp_utils import connect_ftp, disconnect_ftp
-from db.sql_server_client import send_data_to_sql, remove_duplicated_files
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import LOCAL_CONFIG, SMB_CONFIG, PROCESSING_CONFIG, FTP_CONFIG, SQL_SCHEMA_CONFIG, ADAPTIVE_LOADER_CONFIG, PIPELINE_CONFIG, SHARDING_CONFIG, SOURCES, PRIORITY_CONFIG, ZIP_CONFIG
+from core.outbox import Outbox
+from core.state_store import get_state_store
+from core.catchup import select_profile, low_latency_profile, drain_with_profile
+from core.adaptive_loader import AdaptiveBatchController
+from core.memory_budget import get_memory_budget, reset_peak_rss, peak_rss_mb
+from core.lease_manager import LeaseManager
+from core.scheduler import FairScheduler, ACTIVE_LANE, classify_lane, backlog_deadline
+from db.sql_server_client import remove_duplicated_files, get_record_count, iter_csv_records, pyodbc_available
 
 class LogProcessor:
     """Classe principal para coordenação do processamento de logs EDI."""
     
     def __init__(self):
-        self.zip_processor = ZipProcessor()
-        self.csv_processor = CsvProcessor()
+        # Processadores e clientes FTP são carregados sob demanda (comandos de leitura não os usam)
+        self._zip_processor = None
+        self._csv_processor = None
+        self.outbox = Outbox()
+        self.state_store = get_state_store()
+        self.load_profile = low_latency_profile()
+        self._load_controller = None
+        self.deduplicated_in_load = False
         self.start_time = None
         self.ftp_client = None
         self.sql_success_count = 0
         self.sql_error_count = 0
+        self._counter_lock = threading.Lock()
+        # Logs remotos já baixados (nome -> linha do LIST), mantido entre ciclos no modo daemon
+        self.remote_manifest: Dict[str, str] = {}
+        # Com várias instâncias, cada log remoto só é processado por quem detém seu lease
+        self.leases = LeaseManager() if SHARDING_CONFIG['enabled'] else None
+        self._sources = None
+        # Segundos entre o início do ciclo e a carga do log do dia (faixa ativa)
+        self.active_load_seconds: Optional[float] = None
+        # Banco inacessível neste ciclo: as cargas por log só gravam na outbox
+        self.sink_unreachable = False
+        # No modo daemon, limite do ciclo também para o dreno da outbox (ver backlog_deadline)
+        self.cycle_deadline: Optional[float] = None
+
+    @property
+    def zip_processor(self):
+        if self._zip_processor is None:
+            from core.zip_processor import ZipProcessor
+            self._zip_processor = ZipProcessor()
+        return self._zip_processor
+
+    @property
+    def load_controller(self):
+        """Controlador adaptativo do dreno (None se desabilitado), criado na primeira carga."""
+        if self._load_controller is None and ADAPTIVE_LOADER_CONFIG['enabled']:
+            # Com SQLite (escritor único) o controlador não abre conexões paralelas
+            self._load_controller = AdaptiveBatchController(
+                max_workers=None if pyodbc_available() else 1
+            )
+        return self._load_controller
+
+    @property
+    def sources(self):
+        """Fontes de logs ativas de SOURCES, cada uma com pool, manifest e contadores próprios."""
+        if self._sources is None:
+            from core.sources import build_sources
+            self._sources = build_sources()
+        return self._sources
+
+    @property
+    def csv_processor(self):
+        if self._csv_processor is None:
+            from core.csv_processor import CsvProcessor
+            self._csv_processor = CsvProcessor()
+        return self._csv_processor
+
+    def reset_cycle(self):
+        """Zera os contadores de ciclo mantendo conexões, manifest e caches."""
+        self.zip_processor.reset()
+        self.csv_processor.reset()
+        self.deduplicated_in_load = False
+        self.sql_success_count = 0
+        self.sql_error_count = 0
+        self.sink_unreachable = False
+
+    def close(self):
+        """Encerra as conexões FTP mantidas entre ciclos."""
+        if self.ftp_client:
+            self.ftp_client.disconnect()
+            self.ftp_client = None
+        for source in self._sources or []:
+            source.close()
 
     def init_databases(self):
         """Inicializa todos os bancos de dados necessários."""
@@ -35,28 +108,10 @@ class LogProcessor:
         os.makedirs(LOCAL_CONFIG['temp_dir'], exist_ok=True)
         os.makedirs(LOCAL_CONFIG['output_dir'], exist_ok=True)
         
-        # Inicializar banco principal
-        try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS processing_sessions (
-                    session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    end_time DATETIME,
-                    zip_files_processed INTEGER DEFAULT 0,
-                    log_files_processed INTEGER DEFAULT 0,
-                    csv_files_generated INTEGER DEFAULT 0,
-                    sql_records_inserted INTEGER DEFAULT 0,
-                    errors_count INTEGER DEFAULT 0
-                );
-            """)
-            conn.commit()
-            conn.close()
-            print("✓ Banco de dados principal inicializado.")
-        except Exception as e:
-            print(f"✗ Erro ao inicializar banco principal: {e}")
+        # Inicializar banco de estado (esquema e migrações rodam uma vez por processo)
+        if not self.state_store.init_schema():
             return False
+        print("✓ Banco de dados principal inicializado.")
         
         # Inicializar bancos específicos
         if not self.zip_processor.init_zip_database():
@@ -67,7 +122,14 @@ class LogProcessor:
         return True
 
     def process_zip_files(self) -> List[str]:
-        """Processa arquivos ZIP com padrão ConsoleEDI_ e retorna lista de arquivos extraídos."""
+        """Processa os ZIPs ConsoleEDI_*.Log.zip do FTP.
+        
+        No modo streaming (ZIP_CONFIG['streaming']) cada ZIP é baixado para um
+        buffer seekable e seus membros são carregados direto na outbox, sem
+        arquivos temporários; retorna uma lista vazia. No modo antigo os ZIPs
+        são baixados e extraídos em temp_unzipped_logs e os logs extraídos são
+        retornados para o processamento CSV.
+        """
         print("\n📦 PROCESSAMENTO DE ARQUIVOS ZIP")
         print("=" * 50)
         print(f"🎯 Padrão de busca: '{PROCESSING_CONFIG['log_file_pattern']}'")
@@ -77,8 +139,15 @@ class LogProcessor:
             print("✗ Cliente FTP não está conectado")
             return []
         
-        # Encontrar arquivos ZIP via FTP
-        zip_files = self.ftp_client.list_files(PROCESSING_CONFIG['log_file_pattern'] + '*.zip')
+        # Encontrar arquivos ZIP via FTP (list_files filtra por substring, não por curinga)
+        zip_files = [
+            name for name in self.ftp_client.list_files(PROCESSING_CONFIG['log_file_pattern'])
+            if name.startswith(PROCESSING_CONFIG['log_file_pattern'])
+            and name.endswith(PROCESSING_CONFIG['zip_file_extension'])
+        ]
+        if ZIP_CONFIG['streaming']:
+            # ZIPs já lidos por completo não mudam: ficam de fora pelo ledger
+            zip_files = [name for name in zip_files if not self.state_store.is_zip_processed(name)]
         
         if not zip_files:
             print("ℹ Nenhum arquivo ZIP com padrão 'ConsoleEDI_' encontrado.")
@@ -86,13 +155,34 @@ class LogProcessor:
         
         print(f"\n📊 Encontrados {len(zip_files)} arquivos ZIP com padrão 'ConsoleEDI_' para processar.")
         
-        # Extrair arquivos ZIP
-        extracted_files = self.zip_processor.extract_zip_files(zip_files)
+        extracted_files = []
+        if ZIP_CONFIG['streaming']:
+            for zip_name in zip_files:
+                spool = self.ftp_client.download_to_spool(zip_name, ZIP_CONFIG['spool_max_bytes'])
+                if spool is None:
+                    self.zip_processor.errors.append(f"Erro ao baixar {zip_name}")
+                    continue
+                with spool:
+                    members = self.zip_processor.stream_zip(spool, zip_name, self.load_records)
+                # Só registra no ledger se todos os membros chegaram à outbox
+                if zip_name in self.zip_processor.processed_zips:
+                    self.state_store.mark_zip_processed(zip_name, members)
+        else:
+            # Modo antigo: baixar e extrair em temp_unzipped_logs
+            local_zips = []
+            for zip_name in zip_files:
+                local_path = os.path.join(FTP_CONFIG['local_download_dir'], zip_name)
+                if self.ftp_client.download_file(zip_name, local_path):
+                    local_zips.append(local_path)
+            extracted_files = self.zip_processor.extract_zip_files(local_zips)
         
         print(f"\n✅ Processamento de ZIPs concluído:")
         zip_summary = self.zip_processor.get_summary()
         print(f"   - ZIPs processados: {zip_summary['zips_processed']}")
-        print(f"   - Arquivos extraídos: {zip_summary['files_extracted']}")
+        if ZIP_CONFIG['streaming']:
+            print(f"   - Logs lidos sem extração: {zip_summary['members_streamed']}")
+        else:
+            print(f"   - Arquivos extraídos: {zip_summary['files_extracted']}")
         print(f"   - Erros: {zip_summary['errors']}")
         
         return extracted_files
@@ -130,97 +220,350 @@ class LogProcessor:
         
         return filtered_files
 
-    def send_to_sql_server(self, csv_files: List[str]):
-        """Envia dados dos CSVs para o SQL Server."""
+    def send_to_sql_server(self, csv_files: List[str]) -> List[str]:
+        """Grava os CSVs filtrados na outbox e drena os pendentes para o SQL Server.
+        
+        No modo daemon o dreno respeita cycle_deadline. Retorna os CSVs cujos
+        registros chegaram à outbox.
+        """
         print("\n🗄️ ENVIANDO DADOS PARA SQL SERVER")
         print("=" * 50)
         
-        if not csv_files:
-            print("ℹ Nenhum arquivo CSV para enviar ao SQL Server.")
-            return
-        
-        print(f"\n📊 Enviando {len(csv_files)} arquivos CSV para o SQL Server...")
-        
+        # O parser sempre grava na outbox, mesmo com o banco fora do ar
+        spooled = []
         for i, csv_file in enumerate(csv_files, 1):
-            print(f"\n[{i}/{len(csv_files)}] Enviando: {os.path.basename(csv_file)}")
-            
-            if send_data_to_sql(csv_file):
-                self.sql_success_count += 1
-                print(f"  ✅ Enviado com sucesso")
-            else:
+            print(f"\n[{i}/{len(csv_files)}] Enfileirando: {os.path.basename(csv_file)}")
+            try:
+                # Cada CSV tem todos os registros do log: substitui o segmento pendente anterior dele
+                segment = self.outbox.append_csv(csv_file, source=csv_file)
+                if segment:
+                    print(f"  ✓ {Outbox.segment_size(segment)} registros gravados na outbox")
+                else:
+                    print(f"  ℹ Nenhum registro para enfileirar")
+                spooled.append(csv_file)
+            except Exception as e:
+                self.sql_error_count += 1
+                print(f"  ❌ Erro ao gravar na outbox: {e}")
+        
+        pending = self.outbox.pending_segments()
+        if not pending:
+            print("ℹ Nenhum registro pendente na outbox.")
+            return spooled
+        
+        pending_records = self.outbox.pending_records()
+        profile = select_profile(pending_records)
+        if profile['name'] != self.load_profile['name']:
+            print(f"\n🔀 Perfil de carga: {self.load_profile['name']} → {profile['name']}")
+        self.load_profile = profile
+        if profile['catchup']:
+            print(f"⚡ Modo catch-up: backlog de {pending_records} registros "
+                  f"(lotes de {profile['batch_size']}, {profile['workers']} conexões)")
+        
+        print(f"\n📊 Drenando {len(pending)} segmentos da outbox ({pending_records} registros)...")
+        started = datetime.now()
+        result = drain_with_profile(self.outbox, profile, pending, self.load_controller, self.cycle_deadline)
+        self.sql_success_count += result['segments']
+        self.deduplicated_in_load = result['deduplicated']
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"  ✅ {result['segments']} segmentos enviados, {result['inserted']} registros novos "
+              f"em {elapsed:.1f}s")
+        
+        if not result['ok']:
+            print(f"  ⏸️ {len(self.outbox.pending_segments())} segmentos aguardando o próximo ciclo")
+        return spooled
+
+    def load_csv(self, csv_file: str) -> bool:
+        """Grava um CSV filtrado na outbox e drena apenas o seu segmento (estágio de carga do pipeline)."""
+        return self.load_records(iter_csv_records(csv_file), csv_file, supersede=True)
+
+    def load_records(self, records, source_file: str, supersede: bool = False) -> bool:
+        """Grava registros (data, formato, arquivo) na outbox e drena apenas o seu segmento.
+        
+        Com supersede=True os registros são o log inteiro e o segmento substitui
+        os pendentes anteriores de source_file. Retorna True se os registros
+        chegaram à outbox (mesmo que o envio ao banco fique para depois) e False
+        se não puderam ser gravados. Depois de uma falha de conexão no ciclo os
+        segmentos ficam só na outbox e o envio fica para o fim do ciclo, sem
+        esperar o connect_timeout a cada log.
+        """
+        try:
+            segment = self.outbox.append_records(records, source_file if supersede else None)
+        except Exception as e:
+            with self._counter_lock:
                 self.sql_error_count += 1
-                print(f"  ❌ Erro no envio")
+            print(f"  ❌ Erro ao gravar {os.path.basename(source_file)} na outbox: {e}")
+            return False
+        
+        if not segment:
+            return True
+        if self.sink_unreachable:
+            print(f"  ⏸️ {os.path.basename(source_file)}: gravado na outbox, envio no fim do ciclo")
+            return True
+        result = drain_with_profile(self.outbox, low_latency_profile(), [segment], self.load_controller)
+        if result['unreachable']:
+            self.sink_unreachable = True
+        with self._counter_lock:
+            self.sql_success_count += result['segments']
+            if classify_lane(source_file) == ACTIVE_LANE and self.start_time:
+                elapsed = (datetime.now() - self.start_time).total_seconds()
+                self.active_load_seconds = max(self.active_load_seconds or 0.0, elapsed)
+        print(f"  ✅ {os.path.basename(source_file)}: {result['inserted']} registros novos")
+        return True
 
-    def run_processing(self):
-        """Executa o processamento completo."""
+    def run_processing(self, persistent: bool = False):
+        """Executa o processamento completo.
+        
+        Com persistent=True (modo daemon) a conexão FTP é reaproveitada entre
+        ciclos, apenas logs remotos modificados desde o último ciclo são
+        baixados e um ciclo sem mudanças apenas drena a outbox e registra a
+        sessão ociosa.
+        """
+        from core.ftp_utils import connect_ftp, disconnect_ftp
+        from core.pipeline import StagedPipeline
+        from core.csv_processor import csv_path_for, filtered_path_for
+        
         self.start_time = datetime.now()
+        self.active_load_seconds = None
+        deadline = self.cycle_deadline = backlog_deadline(persistent)
+        reset_peak_rss()
+        if persistent:
+            self.reset_cycle()
+        if self.load_controller is not None:
+            self.load_controller.start_session()
         print(f"\n🚀 INICIANDO PROCESSAMENTO EDI")
         print(f"⏰ Início: {self.start_time.strftime('%d/%m/%Y %H:%M:%S')}")
         print("=" * 60)
         
+        # Várias fontes (ou uma fonte diferente do FTP padrão): escalonador justo entre fontes
+        if not self._single_default_source():
+            return self._run_sources(persistent, deadline)
+        
         # Conectar ao servidor FTP
-        self.ftp_client = connect_ftp()
+        if persistent and self.ftp_client:
+            if not self.ftp_client.ensure_connected():
+                self.ftp_client = None
+        else:
+            self.ftp_client = connect_ftp()
         if not self.ftp_client:
             print("✗ Não foi possível conectar ao servidor FTP. Abortando.")
             return False
         
+        file_filter = self.leases.claim_files if self.leases else None
         try:
             # Inicializar bancos de dados
             if not self.init_databases():
                 return False
             
-            # PULAR processamento de arquivos ZIP - processar apenas arquivos de log diretamente
-            print("\n📦 PULANDO PROCESSAMENTO DE ARQUIVOS ZIP")
-            print("ℹ️ Processando apenas arquivos de log 'ConsoleEDI_' diretamente...")
-            extracted_files = []
+            if ZIP_CONFIG['enabled']:
+                # Histórico arquivado: no modo streaming os registros já vão para a outbox aqui
+                extracted_files = self.process_zip_files()
+            else:
+                # PULAR processamento de arquivos ZIP - processar apenas arquivos de log diretamente
+                print("\n📦 PULANDO PROCESSAMENTO DE ARQUIVOS ZIP")
+                print("ℹ️ Processando apenas arquivos de log 'ConsoleEDI_' diretamente...")
+                extracted_files = []
             
             # Encontrar e baixar arquivos de log com padrão ConsoleEDI_ via FTP
             print("\n📄 PROCESSANDO ARQUIVOS DE LOG COM PADRÃO 'ConsoleEDI_' VIA FTP")
             print("ℹ️ Baixando logs que começam com 'ConsoleEDI_'...")
             
-            # Baixar arquivos via FTP
-            downloaded_files = self.ftp_client.download_files(
+            manifest = self.remote_manifest if persistent else None
+            remote_files, entries = self.ftp_client.select_files(
                 PROCESSING_CONFIG['log_file_pattern'],
-                FTP_CONFIG['local_download_dir']
+                FTP_CONFIG['local_download_dir'],
+                manifest,
+                file_filter
             )
+            if PIPELINE_CONFIG['enabled']:
+                # Download, parse e carga sobrepostos, com filas limitadas entre os estágios
+                pipeline = StagedPipeline(self)
+                downloaded_files = pipeline.run(remote_files, entries, manifest, deadline) if remote_files else []
+                completed_files = pipeline.completed_files
+            else:
+                # Baixar arquivos via FTP
+                downloaded_files = self.ftp_client.download_selected(
+                    remote_files, FTP_CONFIG['local_download_dir']
+                ) if remote_files else []
             
-            if not downloaded_files:
+            if not downloaded_files and not extracted_files and not self.zip_processor.processed_zips:
+                if persistent:
+                    return self._run_idle_cycle()
                 print("ℹ️ Nenhum arquivo foi baixado via FTP")
                 return False
             
-            # Usar arquivos baixados para processamento
-            all_log_files = downloaded_files
+            if PIPELINE_CONFIG['enabled']:
+                if extracted_files:
+                    # Logs extraídos de ZIPs (modo antigo) seguem o caminho CSV
+                    self.send_to_sql_server(self.process_csv_files(extracted_files))
+                elif self.outbox.pending_segments():
+                    # Backlog anterior e segmentos que não puderam ser enviados pelo pipeline
+                    self.send_to_sql_server([])
+            else:
+                # Usar arquivos baixados e extraídos para processamento
+                all_log_files = downloaded_files + extracted_files
+                
+                # Processar arquivos CSV
+                filtered_csv_files = self.process_csv_files(all_log_files)
+                
+                # Enviar para SQL Server (com controle de duplicatas)
+                print("\n🗄️ ENVIANDO DADOS PARA SQL SERVER")
+                print("ℹ️ Garantindo registros únicos...")
+                spooled = set(self.send_to_sql_server(filtered_csv_files))
+                completed_files = [
+                    log_file for log_file in downloaded_files
+                    if filtered_path_for(csv_path_for(log_file)) in spooled
+                ]
+                # Logs com falha no parse ou na outbox ficam fora do manifest e são refeitos
+                if manifest is not None:
+                    for log_file in completed_files:
+                        remote_file = os.path.basename(log_file)
+                        manifest[remote_file] = entries[remote_file]
             
-            # Processar arquivos CSV
-            filtered_csv_files = self.process_csv_files(all_log_files)
+            # Só os logs cujos registros estão no banco ou na outbox local são concluídos;
+            # os leases dos demais são liberados abaixo para nova tentativa
+            if self.leases:
+                self.leases.complete(completed_files)
             
-            # Enviar para SQL Server (com controle de duplicatas)
-            print("\n🗄️ ENVIANDO DADOS PARA SQL SERVER")
-            print("ℹ️ Garantindo registros únicos...")
-            self.send_to_sql_server(filtered_csv_files)
+            return self._finish_cycle()
             
-            # Remover duplicatas (garantir unicidade)
+        except Exception as e:
+            print(f"\n❌ Erro durante o processamento: {e}")
+            if persistent:
+                # Estado da conexão desconhecido: reabre no próximo ciclo
+                self.close()
+            return False
+        finally:
+            if self.leases:
+                # Leases de arquivos não concluídos voltam a ficar livres para qualquer instância
+                self.leases.release_all()
+            if self.ftp_client and not persistent:
+                disconnect_ftp(self.ftp_client)
+
+    def _finish_cycle(self) -> bool:
+        """Deduplicação, limpeza, registro da sessão e resumo ao final de um ciclo com logs."""
+        # Remover duplicatas (garantir unicidade); o catch-up já deduplicou ao final da carga
+        if not self.deduplicated_in_load:
             print("\n🧹 Garantindo unicidade dos registros...")
             remove_duplicated_files()
+        
+        # Limpeza (apenas CSVs, sem arquivos temporários de ZIP)
+        print("\n🧹 Realizando limpeza...")
+        self.csv_processor.cleanup_old_csvs()
+        
+        # Salvar sessão
+        self._save_processing_session()
+        
+        # Exibir resumo
+        self.print_summary()
+        
+        return True
+
+    def _single_default_source(self) -> bool:
+        """True com uma única fonte FTP sem sobrescritas (ciclo original com FTP_CONFIG)."""
+        return len(self.sources) == 1 and self.sources[0].kind == 'ftp' and not self.sources[0].config
+
+    def _run_sources(self, persistent: bool = False, deadline: Optional[float] = None) -> bool:
+        """Ciclo com várias fontes: cada log é uma tarefa download -> parse -> carga.
+
+        Um FairScheduler divide o orçamento global de workers entre as fontes
+        em rodízio, limitando cada uma às suas conexões. Logs do dia vão na
+        faixa ativa; o backlog não iniciado até o deadline fica para o próximo ciclo.
+        """
+        if not self.init_databases():
+            return False
+        
+        file_filter = self.leases.claim_files if self.leases else None
+        scheduler = FairScheduler(deadline=deadline)
+        try:
+            print(f"\n📡 PROCESSANDO {len(self.sources)} FONTES DE LOGS")
+            os.makedirs(FTP_CONFIG['local_download_dir'], exist_ok=True)
+            for source in self.sources:
+                manifest = source.manifest if persistent else None
+                remote_files, entries = source.select(manifest, file_filter)
+                print(f"  - {source.name} ({source.kind}): {len(remote_files)} logs a processar")
+                scheduler.add_source(source.name, source.max_connections)
+                for remote_file in remote_files:
+                    scheduler.submit(source.name, partial(
+                        self._process_source_file, source, remote_file, entries, manifest
+                    ), classify_lane(source.local_name(remote_file)))
             
-            # Limpeza (apenas CSVs, sem arquivos temporários de ZIP)
-            print("\n🧹 Realizando limpeza...")
-            self.csv_processor.cleanup_old_csvs()
+            results = [result for result in scheduler.run() if result]
+            downloaded_files = [local_file for local_file, _ in results]
+            completed_files = [local_file for local_file, completed in results if completed]
+            self.csv_processor.errors.extend(scheduler.errors)
+            self._print_source_stats()
+            if scheduler.deferred:
+                print(f"⏭️ {scheduler.deferred} logs de backlog adiados para o próximo ciclo")
             
-            # Salvar sessão
-            self._save_processing_session()
+            if not downloaded_files:
+                if persistent:
+                    return self._run_idle_cycle()
+                print("ℹ️ Nenhum log foi obtido das fontes")
+                return False
             
-            # Exibir resumo
-            self.print_summary()
+            # Backlog anterior e segmentos que não puderam ser enviados durante o ciclo
+            if self.outbox.pending_segments():
+                self.send_to_sql_server([])
             
-            return True
+            if self.leases:
+                self.leases.complete(completed_files)
             
+            return self._finish_cycle()
+        
         except Exception as e:
             print(f"\n❌ Erro durante o processamento: {e}")
+            if persistent:
+                self.close()
             return False
         finally:
-            if self.ftp_client:
-                disconnect_ftp(self.ftp_client)
+            if self.leases:
+                self.leases.release_all()
+            if not persistent:
+                for source in self.sources:
+                    source.close()
+
+    def _process_source_file(self, source, remote_file: str, entries: Dict[str, str],
+                             manifest: Optional[Dict[str, str]]) -> Optional[Tuple[str, bool]]:
+        """Download -> parse/filtro -> outbox/banco de um log de uma fonte.
+        
+        Retorna (log local, concluído): concluído só quando o CSV filtrado foi
+        gerado e seus registros chegaram à outbox. None se o download falhou.
+        """
+        started = time.perf_counter()
+        local_file = source.local_path(remote_file)
+        if not source.fetch(remote_file, local_file):
+            source.record(False, time.perf_counter() - started)
+            self.csv_processor.errors.append(f"[{source.name}] Falha no download de {remote_file}")
+            return None
+        
+        csv_files = self.csv_processor.convert_logs_to_csv([local_file])
+        filtered_files = self.csv_processor.filter_csv_files(csv_files) if csv_files else []
+        completed = bool(filtered_files)
+        for filtered_file in filtered_files:
+            completed = self.load_csv(filtered_file) and completed
+        
+        if manifest is not None and completed:
+            manifest[remote_file] = entries[remote_file]
+        source.record(True, time.perf_counter() - started)
+        return local_file, completed
+
+    def _print_source_stats(self):
+        """Contadores acumulados de cada fonte."""
+        print("\n📡 Fontes (acumulado desde o início):")
+        for source in self.sources:
+            stats = source.stats
+            print(f"  - {source.name}: {stats['files']} logs, {stats['errors']} erros, "
+                  f"{stats['seconds']:.1f}s de trabalho")
+
+    def _run_idle_cycle(self) -> bool:
+        """Ciclo sem logs modificados: drena a outbox pendente e registra a sessão."""
+        print("ℹ️ Nenhum log modificado desde o último ciclo")
+        if self.outbox.pending_segments():
+            self.send_to_sql_server([])
+            if self.sql_success_count and not self.deduplicated_in_load:
+                remove_duplicated_files()
+        self._save_processing_session()
+        return True
 
     def _save_processing_session(self):
         """Salva informações da sessão de processamento."""
@@ -229,28 +572,41 @@ class LogProcessor:
             zip_summary = self.zip_processor.get_summary()
             csv_summary = self.csv_processor.get_summary()
             
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO processing_sessions 
-                (start_time, end_time, zip_files_processed, log_files_processed, 
-                 csv_files_generated, sql_records_inserted, errors_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
+            tuning = None
+            if self.load_controller is not None:
+                tuning = self.load_controller.get_summary()
+                tuning['load_profile'] = self.load_profile['name']
+            
+            self.state_store.save_session(
                 self.start_time,
                 end_time,
                 zip_summary['zips_processed'],
                 csv_summary['logs_processed'],
                 csv_summary['csvs_filtered'],
                 self.sql_success_count,
-                zip_summary['errors'] + csv_summary['errors'] + self.sql_error_count
-            ))
-            conn.commit()
-            conn.close()
+                zip_summary['errors'] + csv_summary['errors'] + self.sql_error_count,
+                tuning,
+                peak_rss_mb()
+            )
             
         except Exception as e:
             print(f"✗ Erro ao salvar sessão: {e}")
 
+    def get_summary(self) -> dict:
+        """Retorna os contadores do ciclo atual."""
+        zip_summary = self.zip_processor.get_summary()
+        csv_summary = self.csv_processor.get_summary()
+        return {
+            'zips_processed': zip_summary['zips_processed'],
+            'logs_processed': csv_summary['logs_processed'],
+            'csvs_generated': csv_summary['csvs_generated'],
+            'csvs_filtered': csv_summary['csvs_filtered'],
+            'sql_sent': self.sql_success_count,
+            'sql_errors': self.sql_error_count,
+            'errors': zip_summary['errors'] + csv_summary['errors'] + self.sql_error_count,
+            'error_details': zip_summary['error_details'] + csv_summary['error_details']
+        }
+
     def print_summary(self):
         """Exibe resumo detalhado do processamento."""
         end_time = datetime.now()
@@ -268,9 +624,17 @@ class LogProcessor:
             print(f"⏱️ Duração: {duration}")
         
         print("\n📦 PROCESSAMENTO DE ZIPs:")
-        print(f"   - ZIPs processados: 0 (processamento de ZIPs desabilitado)")
-        print(f"   - Arquivos extraídos: 0 (processamento direto de logs)")
-        print(f"   - Erros: 0")
+        if ZIP_CONFIG['enabled']:
+            print(f"   - ZIPs processados: {zip_summary['zips_processed']}")
+            if ZIP_CONFIG['streaming']:
+                print(f"   - Logs lidos sem extração: {zip_summary['members_streamed']}")
+            else:
+                print(f"   - Arquivos extraídos: {zip_summary['files_extracted']}")
+            print(f"   - Erros: {zip_summary['errors']}")
+        else:
+            print(f"   - ZIPs processados: 0 (processamento de ZIPs desabilitado)")
+            print(f"   - Arquivos extraídos: 0 (processamento direto de logs)")
+            print(f"   - Erros: 0")
         
         print("\n📄 PROCESSAMENTO DE CSVs:")
         print(f"   - Logs processados: {csv_summary['logs_processed']}")
@@ -282,6 +646,19 @@ class LogProcessor:
         print(f"   - Arquivos enviados com sucesso: {self.sql_success_count}")
         print(f"   - Arquivos com erro: {self.sql_error_count}")
         
+        if self.active_load_seconds is not None:
+            target = PRIORITY_CONFIG['active_latency_target_sec']
+            status = "✅" if self.active_load_seconds <= target else "⚠️ acima da meta"
+            print(f"\n⚡ Log do dia carregado {self.active_load_seconds:.1f}s após o início do ciclo "
+                  f"(meta {target}s) {status}")
+        
+        memory = get_memory_budget().get_summary()
+        print("\n🧠 MEMÓRIA:")
+        print(f"   - Pico de RSS: {peak_rss_mb()} MB")
+        print(f"   - Pico em lotes: {memory['peak_buffered_mb']} MB de {memory['limit_mb']} MB "
+              f"(lotes reduzidos: {memory['shrinks']}, envios antecipados: {memory['early_flushes']}, "
+              f"esperas: {memory['stalls']})")
+        
         total_errors = zip_summary['errors'] + csv_summary['errors'] + self.sql_error_count
         print(f"\n❌ TOTAL DE ERROS: {total_errors}")
         
@@ -294,37 +671,24 @@ class LogProcessor:
         
         print("=" * 60)
 
-    def show_status(self):
+    def show_status(self, exact: bool = False):
         """Exibe status detalhado do sistema."""
         print("\n📊 STATUS DETALHADO DO SISTEMA")
         print("=" * 50)
         
         # Status do banco local
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            
-            # Contar ZIPs processados
-            cursor.execute("SELECT COUNT(*) FROM processed_zips")
-            zips_processed = cursor.fetchone()[0]
-            
-            # Contar logs processados
-            cursor.execute("SELECT COUNT(*) FROM processed_logs")
-            logs_processed = cursor.fetchone()[0]
-            
-            # Última sessão
-            cursor.execute("""
-                SELECT start_time, end_time, zip_files_processed, log_files_processed, 
-                       csv_files_generated, sql_records_inserted, errors_count
-                FROM processing_sessions 
-                ORDER BY session_id DESC LIMIT 1
-            """)
-            last_session = cursor.fetchone()
-            
-            conn.close()
+            self.state_store.init_schema()
+            ledger = self.state_store.ledger_counts()
+            zips_processed = ledger['zips']
+            logs_processed = ledger['logs']
+            last_session = self.state_store.last_session()
+            last_tuning = self.state_store.last_loader_tuning()
             
             print(f"📦 ZIPs processados (total): {zips_processed}")
             print(f"📄 Logs processados (total): {logs_processed}")
+            print(f"📮 Outbox pendente: {len(self.outbox.pending_segments())} segmentos "
+                  f"({self.outbox.pending_records()} registros)")
             
             if last_session:
                 print(f"\n🕐 ÚLTIMA SESSÃO:")
@@ -335,6 +699,14 @@ class LogProcessor:
                 print(f"   - CSVs gerados: {last_session[4]}")
                 print(f"   - Registros SQL: {last_session[5]}")
                 print(f"   - Erros: {last_session[6]}")
+                if last_session[7] is not None:
+                    print(f"   - Pico de memória (RSS): {last_session[7]} MB")
+            
+            if last_tuning:
+                print(f"\n⚙️ CARREGADOR (última sessão):")
+                print(f"   - Perfil: {last_tuning[0]}")
+                print(f"   - Lote: {last_tuning[1]} | Conexões: {last_tuning[2]}")
+                print(f"   - Latência média: {last_tuning[3]} ms | Vazão: {last_tuning[4]} registros/s")
                 
         except Exception as e:
             print(f"❌ Erro ao verificar banco local: {e}")
@@ -348,18 +720,16 @@ class LogProcessor:
         print(f"   - Diretório de saída: {LOCAL_CONFIG['output_dir']}")
         print(f"   - Banco local: {LOCAL_CONFIG['local_db']}")
         
-        # Status do SQL Server
-        try:
-            from config.settings import DB_CONFIG
-            import mysql.connector
-            conn = mysql.connector.connect(**DB_CONFIG)
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT COUNT(*) FROM {LOCAL_CONFIG['table_name']}")
-            total_records = cursor.fetchone()[0]
-            conn.close()
-            print(f"   - Registros no SQL Server: {total_records}")
-        except Exception as e:
-            print(f"   - Erro ao conectar SQL Server: {e}")
+        # Status do SQL Server (contagem pelos metadados, exata só sob demanda).
+        # Sem results_cache: a contagem aproximada já é O(1) e muda a cada carga de
+        # qualquer instância, e o --status não grava no banco de estado
+        destination = "SQL Server" if pyodbc_available() else "SQLite local"
+        total_records = get_record_count(exact=exact)
+        if total_records is None:
+            print(f"   - Erro ao consultar registros no {destination}")
+        else:
+            label = "" if exact else " (aprox.)"
+            print(f"   - Registros no {destination}{label}: {total_records}")
 
     def show_config(self):
         """Exibe configurações atuais."""
@@ -370,9 +740,12 @@ class LogProcessor:
         print(f"Compartilhamento SMB: {SMB_CONFIG['share']}")
         print(f"Ponto de montagem: {SMB_CONFIG['mount_point']}")
         print(f"Usuário SMB: {SMB_CONFIG['username']}")
+        active_sources = [f"{source['name']} ({source['type']})" for source in SOURCES if source.get('enabled', True)]
+        print(f"Fontes de logs: {', '.join(active_sources) or 'nenhuma'}")
         print(f"Diretório temporário: {LOCAL_CONFIG['temp_dir']}")
         print(f"Diretório de saída: {LOCAL_CONFIG['output_dir']}")
         print(f"Banco de dados local: {LOCAL_CONFIG['local_db']}")
         print(f"Tabela remota: {LOCAL_CONFIG['table_name']}")
+        print(f"Esquema normalizado de formatos: {'sim' if SQL_SCHEMA_CONFIG['normalized_formats'] else 'não'}")
         print(f"Host do banco remoto: {DB_CONFIG['server']}")
         print(f"Database remoto: {DB_CONFIG['database']}")
@@ -6,75 +6,114 @@ Gerenciador de Relatórios
 Responsável por gerar relatórios e estatísticas do processamento EDI.
 """
 
+import io
 import os
-import sqlite3
 import csv
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterable, Tuple
 from config.settings import LOCAL_CONFIG
+from core.state_store import get_state_store
 
 class ReportManager:
     """Classe responsável por gerar relatórios e estatísticas."""
     
     def __init__(self):
-        self.reports_dir = "reports"
+        self.reports_dir = LOCAL_CONFIG['reports_dir']
         os.makedirs(self.reports_dir, exist_ok=True)
+        self.state_store = get_state_store()
+        self.state_store.init_schema()
+    
+    DAILY_HEADER = [
+        'Sessão ID', 'Início', 'Fim', 'Duração (min)',
+        'ZIPs Processados', 'Logs Processados', 
+        'CSVs Gerados', 'Registros SQL', 'Erros', 'Ciclos'
+    ]
+    
+    @staticmethod
+    def _encode_csv_row(row: List[Any]) -> bytes:
+        """Formata uma linha CSV em bytes (para controlar offsets no arquivo)."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return buffer.getvalue().encode('utf-8')
+    
+    @staticmethod
+    def _daily_row(session: tuple) -> List[Any]:
+        start_time = datetime.fromisoformat(session[1])
+        end_time = datetime.fromisoformat(session[2]) if session[2] else None
+        duration = (end_time - start_time).total_seconds() / 60 if end_time else 0
+        return [
+            session[0], session[1], session[2], f"{duration:.2f}",
+            session[3], session[4], session[5], session[6], session[7],
+            session[8]
+        ]
+    
+    def _daily_report_path(self, date: datetime) -> str:
+        return os.path.join(self.reports_dir, f"relatorio_diario_{date.strftime('%Y%m%d')}.csv")
+    
+    def _write_daily_rows(self, report, sessions: Iterable[tuple], last_id: int,
+                          last_offset: int, last_signature: str) -> Tuple[int, int, str]:
+        """Escreve as sessões no relatório aberto e retorna a nova posição da última linha."""
+        for session in sessions:
+            signature = f"{session[2]}|{session[8]}"
+            if session[0] == last_id:
+                if signature == last_signature:
+                    continue
+                # Sessão já escrita foi estendida: reescreve a partir dela
+                report.seek(last_offset)
+                report.truncate()
+            
+            last_id, last_offset, last_signature = session[0], report.tell(), signature
+            report.write(self._encode_csv_row(self._daily_row(session)))
+        return last_id, last_offset, last_signature
     
     def generate_daily_report(self, date: datetime | None = None) -> str:
-        """Gera relatório diário de processamento."""
+        """Gera relatório diário de processamento.
+        
+        O arquivo é mantido incrementalmente: cada chamada acrescenta apenas as
+        sessões novas. A última linha é reescrita quando a sessão correspondente
+        mudou (ciclos ociosos coalescidos), e o arquivo é refeito por completo
+        quando não existe ou não confere com o estado gravado.
+        """
         if date is None:
             date = datetime.now()
         
-        report_file = os.path.join(
-            self.reports_dir, 
-            f"relatorio_diario_{date.strftime('%Y%m%d')}.csv"
-        )
+        report_file = self._daily_report_path(date)
         
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            
             # Buscar sessões do dia
             start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = start_date + timedelta(days=1)
             
-            cursor.execute("""
-                SELECT 
-                    session_id,
-                    start_time,
-                    end_time,
-                    zip_files_processed,
-                    log_files_processed,
-                    csv_files_generated,
-                    sql_records_inserted,
-                    errors_count
-                FROM processing_sessions 
-                WHERE start_time >= ? AND start_time < ?
-                ORDER BY start_time
-            """, (start_date, end_date))
+            state = self.state_store.get_report_state(report_file)
+            incremental = (
+                state is not None and os.path.exists(report_file)
+                and os.path.getsize(report_file) == state[3]
+            )
+            if incremental:
+                last_id, last_offset, last_signature, _ = state
+            else:
+                last_id, last_offset, last_signature = 0, 0, ''
             
-            sessions = cursor.fetchall()
+            sessions = self.state_store.iter_sessions(start_date, end_date, last_id)
             
-            # Gerar CSV do relatório
-            with open(report_file, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([
-                    'Sessão ID', 'Início', 'Fim', 'Duração (min)',
-                    'ZIPs Processados', 'Logs Processados', 
-                    'CSVs Gerados', 'Registros SQL', 'Erros'
-                ])
+            with open(report_file, 'r+b' if incremental else 'wb') as report:
+                if incremental:
+                    report.seek(0, os.SEEK_END)
+                else:
+                    report.write(self._encode_csv_row(self.DAILY_HEADER))
+                    last_offset = report.tell()
                 
-                for session in sessions:
-                    start_time = datetime.fromisoformat(session[1])
-                    end_time = datetime.fromisoformat(session[2]) if session[2] else None
-                    duration = (end_time - start_time).total_seconds() / 60 if end_time else 0
-                    
-                    writer.writerow([
-                        session[0], session[1], session[2], f"{duration:.2f}",
-                        session[3], session[4], session[5], session[6], session[7]
-                    ])
+                last_id, last_offset, last_signature = self._write_daily_rows(
+                    report, sessions, last_id, last_offset, last_signature
+                )
+                file_size = report.tell()
+            
+            self.state_store.save_report_state(
+                report_file, last_id, last_offset, last_signature, file_size
+            )
             
-            conn.close()
             print(f"✅ Relatório diário gerado: {os.path.basename(report_file)}")
             return report_file
             
@@ -82,6 +121,72 @@ class ReportManager:
             print(f"❌ Erro ao gerar relatório diário: {e}")
             return ""
     
+    def generate_report_range(self, start_date: datetime, end_date: datetime,
+                              workers: int = 1) -> List[str]:
+        """Regera os relatórios diários de start_date a end_date (inclusive).
+        
+        As sessões são lidas em uma única passada, dia a dia, e cada dia é
+        escrito assim que sua última sessão é lida, sem acumular o histórico em
+        memória. Com workers > 1 o intervalo é dividido em faixas contíguas de
+        dias processadas em paralelo.
+        """
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        days = (end_date - start_date).days
+        if days <= 0:
+            return []
+        
+        workers = max(1, min(workers, days))
+        step = -(-days // workers)
+        partitions = [
+            (start_date + timedelta(days=i), min(end_date, start_date + timedelta(days=i + step)))
+            for i in range(0, days, step)
+        ]
+        
+        print(f"📊 Regerando {days} relatórios diários ({len(partitions)} partições)...")
+        try:
+            if len(partitions) == 1:
+                report_files = self._write_daily_partition(*partitions[0])
+            else:
+                with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+                    results = executor.map(lambda part: self._write_daily_partition(*part), partitions)
+                    report_files = [report_file for files in results for report_file in files]
+        except Exception as e:
+            print(f"❌ Erro ao gerar relatórios do período: {e}")
+            return []
+        
+        print(f"✅ {len(report_files)} relatórios diários gerados")
+        return report_files
+    
+    def _write_daily_partition(self, start_date: datetime, end_date: datetime) -> List[str]:
+        """Escreve um relatório diário por dia de [start_date, end_date) em uma passada."""
+        sessions_by_day = groupby(
+            self.state_store.iter_sessions(start_date, end_date),
+            key=lambda session: session[1][:10]
+        )
+        group = next(sessions_by_day, None)
+        report_files = []
+        
+        day = start_date
+        while day < end_date:
+            sessions = ()
+            if group is not None and group[0] == day.strftime('%Y-%m-%d'):
+                sessions = group[1]
+            
+            report_file = self._daily_report_path(day)
+            with open(report_file, 'wb') as report:
+                report.write(self._encode_csv_row(self.DAILY_HEADER))
+                state = self._write_daily_rows(report, sessions, 0, report.tell(), '')
+                file_size = report.tell()
+            self.state_store.save_report_state(report_file, *state, file_size)
+            report_files.append(report_file)
+            
+            if sessions:
+                group = next(sessions_by_day, None)
+            day += timedelta(days=1)
+        
+        return report_files
+    
     def generate_weekly_report(self, start_date: datetime | None = None) -> str:
         """Gera relatório semanal de processamento."""
         if start_date is None:
@@ -98,26 +203,11 @@ class ReportManager:
         )
         
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            
             # Estatísticas por dia
-            cursor.execute("""
-                SELECT 
-                    DATE(start_time) as data,
-                    COUNT(*) as sessoes,
-                    SUM(zip_files_processed) as total_zips,
-                    SUM(log_files_processed) as total_logs,
-                    SUM(csv_files_generated) as total_csvs,
-                    SUM(sql_records_inserted) as total_sql,
-                    SUM(errors_count) as total_erros
-                FROM processing_sessions 
-                WHERE start_time >= ? AND start_time < ?
-                GROUP BY DATE(start_time)
-                ORDER BY data
-            """, (start_date, end_date))
-            
-            daily_stats = cursor.fetchall()
+            daily_stats = self.state_store.cached(
+                'weekly_totals', {'start': start_date.strftime('%Y-%m-%d')},
+                lambda: self.state_store.daily_totals(start_date, end_date)
+            )
             
             # Gerar CSV do relatório
             with open(report_file, 'w', newline='', encoding='utf-8') as csvfile:
@@ -130,7 +220,6 @@ class ReportManager:
                 for stat in daily_stats:
                     writer.writerow(stat)
             
-            conn.close()
             print(f"✅ Relatório semanal gerado: {os.path.basename(report_file)}")
             return report_file
             
@@ -138,50 +227,66 @@ class ReportManager:
             print(f"❌ Erro ao gerar relatório semanal: {e}")
             return None
     
-    def get_processing_statistics(self, days: int = 30) -> Dict[str, Any]:
-        """Retorna estatísticas gerais do processamento."""
+    def generate_traffic_report(self, date: datetime | None = None) -> str:
+        """Gera relatório de tráfego EDI por hora e formato a partir dos agregados locais."""
+        if date is None:
+            date = datetime.now()
+        
+        report_file = os.path.join(
+            self.reports_dir, 
+            f"relatorio_trafego_{date.strftime('%Y%m%d')}.csv"
+        )
+        
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
+            start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_date = start_date + timedelta(days=1)
             
+            traffic = self.state_store.traffic_by_hour(start_date, end_date)
+            totals = {}
+            
+            with open(report_file, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['Hora', 'Formato do Processo de EDI', 'Registros', 'Arquivos Distintos'])
+                
+                for hour, formato, records, distinct_files in traffic:
+                    writer.writerow([hour, formato, records, distinct_files])
+                    totals[formato] = totals.get(formato, 0) + records
+            
+            print(f"\n📈 TRÁFEGO EDI DE {start_date.strftime('%d/%m/%Y')}")
+            for formato, records in sorted(totals.items(), key=lambda item: -item[1]):
+                print(f"   - {formato}: {records} registros")
+            
+            print(f"✅ Relatório de tráfego gerado: {os.path.basename(report_file)}")
+            return report_file
+            
+        except Exception as e:
+            print(f"❌ Erro ao gerar relatório de tráfego: {e}")
+            return ""
+    
+    def get_processing_statistics(self, days: int = 30) -> Dict[str, Any]:
+        """Retorna estatísticas gerais do processamento (memorizadas até a próxima sessão)."""
+        end_date = datetime.now()
+        return self.state_store.cached(
+            'processing_statistics',
+            {'days': days, 'hour': end_date.strftime('%Y-%m-%d %H')},
+            lambda: self._compute_processing_statistics(days, end_date)
+        )
+    
+    def _compute_processing_statistics(self, days: int, end_date: datetime) -> Dict[str, Any]:
+        try:
             # Período
-            end_date = datetime.now()
             start_date = end_date - timedelta(days=days)
             
             # Estatísticas gerais
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_sessoes,
-                    SUM(zip_files_processed) as total_zips,
-                    SUM(log_files_processed) as total_logs,
-                    SUM(csv_files_generated) as total_csvs,
-                    SUM(sql_records_inserted) as total_sql,
-                    SUM(errors_count) as total_erros,
-                    AVG((julianday(end_time) - julianday(start_time)) * 24 * 60) as avg_duration_min
-                FROM processing_sessions 
-                WHERE start_time >= ?
-            """, (start_date,))
-            
-            general_stats = cursor.fetchone()
+            general_stats = self.state_store.period_totals(start_date)
             
             # Última sessão
-            cursor.execute("""
-                SELECT start_time, end_time, zip_files_processed, log_files_processed,
-                       csv_files_generated, sql_records_inserted, errors_count
-                FROM processing_sessions 
-                ORDER BY session_id DESC LIMIT 1
-            """)
-            
-            last_session = cursor.fetchone()
+            last_session = self.state_store.last_session()
             
             # Arquivos processados
-            cursor.execute("SELECT COUNT(*) FROM processed_zips")
-            total_zips_processed = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM processed_logs")
-            total_logs_processed = cursor.fetchone()[0]
-            
-            conn.close()
+            ledger = self.state_store.ledger_counts()
+            total_zips_processed = ledger['zips']
+            total_logs_processed = ledger['logs']
             
             stats = {
                 'periodo_dias': days,
@@ -257,6 +362,7 @@ class ReportManager:
                     file_path = os.path.join(self.reports_dir, report_file)
                     if os.path.getmtime(file_path) < cutoff_date:
                         os.remove(file_path)
+                        self.state_store.delete_report_state(file_path)
                         print(f"🗑️ Removido relatório antigo: {report_file}")
                         
         except Exception as e:
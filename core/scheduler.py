@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Escalonador Justo entre Fontes
+==============================
+Divide um orçamento global de workers entre as fontes de logs. Cada worker
+livre atende as fontes em rodízio, e cada fonte tem um limite de tarefas em
+andamento (suas conexões), de modo que uma fonte lenta ou com muitos
+arquivos não ocupa todos os workers nem atrasa as demais.
+
+As tarefas são separadas em duas faixas: a ativa (o ConsoleEDI_ do dia,
+acompanhado pela operação quase em tempo real) e a de backlog (histórico e
+reprocessamentos), que só recebe workers quando não há trabalho ativo.
+"""
+
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from config.settings import SCHEDULER_CONFIG, PRIORITY_CONFIG, PROCESSING_CONFIG
+
+ACTIVE_LANE = 'active'
+BACKLOG_LANE = 'backlog'
+LANES = (ACTIVE_LANE, BACKLOG_LANE)
+
+def active_log_marker(now: datetime = None) -> str:
+    """Prefixo do log do dia (ex.: ConsoleEDI_20250101)."""
+    return f"{PROCESSING_CONFIG['log_file_pattern']}{(now or datetime.now()).strftime('%Y%m%d')}"
+
+def classify_lane(name: str, now: datetime = None) -> str:
+    """Faixa de um log: ativa para o log do dia, backlog para os demais."""
+    if PRIORITY_CONFIG['enabled'] and active_log_marker(now) in name:
+        return ACTIVE_LANE
+    return BACKLOG_LANE
+
+def prioritize(names: List[str], now: datetime = None) -> List[str]:
+    """Ordena os logs com o do dia primeiro, mantendo a ordem dos demais."""
+    return sorted(names, key=lambda name: LANES.index(classify_lane(name, now)))
+
+def backlog_deadline(persistent: bool) -> Optional[float]:
+    """No modo daemon, instante (monotônico) após o qual nenhum log de backlog é iniciado.
+    
+    O dreno da outbox no fim do ciclo também para de iniciar segmentos nesse
+    instante. O que sobrar fica para o ciclo seguinte, então o log do dia
+    nunca espera mais que um ciclo por um catch-up.
+    """
+    if persistent and PRIORITY_CONFIG['enabled']:
+        return time.monotonic() + PRIORITY_CONFIG['backlog_budget_sec']
+    return None
+
+class FairScheduler:
+    """Executa tarefas de várias fontes com rodízio, limite por fonte e faixas de prioridade."""
+    
+    def __init__(self, max_workers: int = None, default_limit: int = None,
+                 deadline: Optional[float] = None):
+        self.max_workers = max_workers or SCHEDULER_CONFIG['max_workers']
+        self.default_limit = default_limit or SCHEDULER_CONFIG['max_per_source']
+        self.deadline = deadline
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Dict[str, deque]] = {lane: {} for lane in LANES}
+        self._limits: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._order: List[str] = []
+        self._cursor = 0
+        self.results: List[Any] = []
+        self.errors: List[str] = []
+        self.deferred = 0
+    
+    def add_source(self, source: str, limit: int = None):
+        """Registra uma fonte com seu limite de tarefas simultâneas."""
+        if source not in self._running:
+            for lane in LANES:
+                self._queues[lane][source] = deque()
+            self._running[source] = 0
+            self._order.append(source)
+        self._limits[source] = max(1, limit or self.default_limit)
+    
+    def submit(self, source: str, task: Callable[[], Any], lane: str = BACKLOG_LANE):
+        """Enfileira uma tarefa (ex.: download -> parse -> carga de um log) da fonte."""
+        if source not in self._running:
+            self.add_source(source)
+        self._queues[lane][source].append(task)
+    
+    def pending(self, lane: str = None) -> int:
+        lanes = (lane,) if lane else LANES
+        return sum(len(tasks) for name in lanes for tasks in self._queues[name].values())
+    
+    def run(self) -> List[Any]:
+        """Executa todas as tarefas e retorna os resultados na ordem de conclusão."""
+        workers = min(self.max_workers, self.pending())
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results
+    
+    def _next_task(self):
+        """Próxima tarefa: faixa ativa primeiro, backlog em rodízio; None quando acabar."""
+        with self._cond:
+            while True:
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    # Orçamento do ciclo esgotado: o backlog restante fica para o próximo
+                    for tasks in self._queues[BACKLOG_LANE].values():
+                        self.deferred += len(tasks)
+                        tasks.clear()
+                
+                # Tarefas ativas ignoram o limite da fonte (a fonte reserva uma conexão para elas)
+                for source in self._order:
+                    if self._queues[ACTIVE_LANE][source]:
+                        self._running[source] += 1
+                        return source, self._queues[ACTIVE_LANE][source].popleft()
+                
+                if not self.pending():
+                    return None, None
+                for offset in range(len(self._order)):
+                    source = self._order[(self._cursor + offset) % len(self._order)]
+                    if self._queues[BACKLOG_LANE][source] and self._running[source] < self._limits[source]:
+                        self._cursor = (self._cursor + offset + 1) % len(self._order)
+                        self._running[source] += 1
+                        return source, self._queues[BACKLOG_LANE][source].popleft()
+                # Fontes com tarefas estão no limite: espera alguma terminar
+                self._cond.wait()
+    
+    def _worker(self):
+        while True:
+            source, task = self._next_task()
+            if task is None:
+                return
+            try:
+                result = task()
+                with self._cond:
+                    self.results.append(result)
+            except Exception as e:
+                with self._cond:
+                    self.errors.append(f"[{source}] {e}")
+            finally:
+                with self._cond:
+                    self._running[source] -= 1
+                    self._cond.notify_all()
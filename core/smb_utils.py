@@ -2,28 +2,29 @@ import os
 import subprocess
 from config.settings import SMB_CONFIG
 
-def mount_smb_share():
-    """Monta o compartilhamento SMB no Linux."""
+def mount_smb_share(config=None):
+    """Monta o compartilhamento SMB no Linux (padrão: SMB_CONFIG)."""
+    config = config or SMB_CONFIG
     try:
         # Criar diretório de montagem se não existir
-        if not os.path.exists(SMB_CONFIG['mount_point']):
-            os.makedirs(SMB_CONFIG['mount_point'])
-            print(f"✓ Diretório de montagem criado: {SMB_CONFIG['mount_point']}")
+        if not os.path.exists(config['mount_point']):
+            os.makedirs(config['mount_point'])
+            print(f"✓ Diretório de montagem criado: {config['mount_point']}")
         # Verificar se já está montado
-        if os.path.ismount(SMB_CONFIG['mount_point']):
-            print(f"✓ Compartilhamento já montado em: {SMB_CONFIG['mount_point']}")
+        if os.path.ismount(config['mount_point']):
+            print(f"✓ Compartilhamento já montado em: {config['mount_point']}")
             return True
         # Comando para montar o compartilhamento
         mount_cmd = [
             'sudo', 'mount', '-t', 'cifs',
-            f"//{SMB_CONFIG['host']}/{SMB_CONFIG['share']}",
-            SMB_CONFIG['mount_point'],
-            '-o', f"username={SMB_CONFIG['username']},password={SMB_CONFIG['password']},iocharset=utf8,file_mode=0777,dir_mode=0777"
+            f"//{config['host']}/{config['share']}",
+            config['mount_point'],
+            '-o', f"username={config['username']},password={config['password']},iocharset=utf8,file_mode=0777,dir_mode=0777"
         ]
-        print(f"🔗 Montando compartilhamento SMB: //{SMB_CONFIG['host']}/{SMB_CONFIG['share']}")
+        print(f"🔗 Montando compartilhamento SMB: //{config['host']}/{config['share']}")
         result = subprocess.run(mount_cmd, capture_output=True, text=True)
         if result.returncode == 0:
-            print(f"✓ Compartilhamento montado com sucesso em: {SMB_CONFIG['mount_point']}")
+            print(f"✓ Compartilhamento montado com sucesso em: {config['mount_point']}")
             return True
         else:
             print(f"✗ Erro ao montar compartilhamento: {result.stderr}")
@@ -32,11 +33,12 @@ def mount_smb_share():
         print(f"✗ Erro ao montar compartilhamento SMB: {e}")
         return False
 
-def unmount_smb_share():
+def unmount_smb_share(config=None):
     """Desmonta o compartilhamento SMB."""
-    if os.path.ismount(SMB_CONFIG['mount_point']):
+    config = config or SMB_CONFIG
+    if os.path.ismount(config['mount_point']):
         try:
-            subprocess.run(['sudo', 'umount', SMB_CONFIG['mount_point']], check=True)
-            print(f"✓ Compartilhamento desmontado: {SMB_CONFIG['mount_point']}")
+            subprocess.run(['sudo', 'umount', config['mount_point']], check=True)
+            print(f"✓ Compartilhamento desmontado: {config['mount_point']}")
         except Exception as e:
             print(f"⚠ Aviso: Não foi possível desmontar o compartilhamento: {e}")
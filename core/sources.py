@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fontes de Logs EDI
+==================
+Cada fonte configurada em SOURCES (servidor/diretório FTP ou compartilhamento
+SMB legado) tem seu próprio pool de conexões, manifest de arquivos já baixados
+e contadores, e entrega os logs 'ConsoleEDI_' no diretório local de downloads.
+"""
+
+import os
+import queue
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+from config.settings import SOURCES, FTP_CONFIG, SMB_CONFIG, PROCESSING_CONFIG, SCHEDULER_CONFIG
+from core.ftp_utils import FTPClient, FileFilter, disconnect_ftp
+from core.smb_utils import mount_smb_share
+
+class LogSource:
+    """Fonte de logs: listagem, seleção de arquivos modificados e cópia local."""
+    
+    kind = 'base'
+    
+    def __init__(self, name: str, config: Dict = None, primary: bool = False):
+        self.name = name
+        self.config = config or {}
+        self.primary = primary
+        self.max_connections = self.config.get('max_connections', SCHEDULER_CONFIG['max_per_source'])
+        self.local_dir = FTP_CONFIG['local_download_dir']
+        # Nome remoto -> assinatura (linha do LIST ou tamanho/data), mantido entre ciclos no modo daemon
+        self.manifest: Dict[str, str] = {}
+        self.stats = {'files': 0, 'errors': 0, 'seconds': 0.0}
+        self._stats_lock = threading.Lock()
+    
+    def local_name(self, remote_name: str) -> str:
+        """Nome local do log; fora da fonte principal recebe o nome da fonte para não colidir."""
+        if self.primary:
+            return remote_name
+        root, ext = os.path.splitext(remote_name)
+        return f"{root}_{self.name}{ext}"
+    
+    def local_path(self, remote_name: str) -> str:
+        return os.path.join(self.local_dir, self.local_name(remote_name))
+    
+    def list_entries(self) -> Dict[str, str]:
+        """Nome remoto -> assinatura de cada log da fonte."""
+        raise NotImplementedError
+    
+    def fetch(self, remote_name: str, local_path: str) -> bool:
+        """Copia um log remoto para o caminho local."""
+        raise NotImplementedError
+    
+    def close(self):
+        """Libera as conexões da fonte."""
+    
+    def select(self, manifest: Dict[str, str] = None,
+               file_filter: FileFilter = None) -> Tuple[List[str], Dict[str, str]]:
+        """Lista os logs a baixar e a assinatura de cada um (ver FTPClient.select_files).
+        
+        O file_filter (leases) recebe os nomes locais, únicos entre fontes.
+        """
+        entries = self.list_entries()
+        remote_files = [
+            name for name, signature in entries.items()
+            if manifest is None or manifest.get(name) != signature
+            or not os.path.exists(self.local_path(name))
+        ]
+        if manifest is not None and remote_files:
+            print(f"📁 [{self.name}] {len(remote_files)} de {len(entries)} logs modificados")
+        
+        if file_filter is not None and remote_files:
+            by_local = {self.local_name(name): name for name in remote_files}
+            local_entries = {self.local_name(name): entries[name] for name in remote_files}
+            remote_files = [by_local[name] for name in file_filter(list(by_local), local_entries)]
+        return remote_files, entries
+    
+    def record(self, ok: bool, seconds: float):
+        """Acumula os contadores da fonte (chamado pelos workers)."""
+        with self._stats_lock:
+            self.stats['files' if ok else 'errors'] += 1
+            self.stats['seconds'] += seconds
+
+class FtpSource(LogSource):
+    """Servidor/diretório FTP com um pool de até max_connections conexões."""
+    
+    kind = 'ftp'
+    
+    def __init__(self, name: str, config: Dict = None, primary: bool = False):
+        super().__init__(name, config, primary)
+        self.ftp_config = {**FTP_CONFIG, **self.config}
+        self._pool: queue.Queue = queue.Queue()
+        self._clients: List[FTPClient] = []
+        self._pool_lock = threading.Lock()
+    
+    def _acquire(self) -> Optional[FTPClient]:
+        """Conexão livre do pool, abrindo uma nova até o limite da fonte."""
+        try:
+            client = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                # Uma conexão além do limite fica para o log do dia (faixa ativa do FairScheduler)
+                can_open = len(self._clients) < self.max_connections + 1
+                if can_open:
+                    client = FTPClient(self.ftp_config)
+                    self._clients.append(client)
+            if not can_open:
+                client = self._pool.get()
+            elif not client.connect():
+                with self._pool_lock:
+                    self._clients.remove(client)
+                return None
+            return client
+        
+        # Conexões do pool podem ter sido encerradas pelo servidor entre ciclos
+        if client.ensure_connected():
+            return client
+        with self._pool_lock:
+            self._clients.remove(client)
+        return None
+    
+    def _release(self, client: FTPClient):
+        self._pool.put(client)
+    
+    def list_entries(self) -> Dict[str, str]:
+        client = self._acquire()
+        if client is None:
+            print(f"✗ [{self.name}] Não foi possível conectar ao servidor FTP {self.ftp_config['host']}")
+            return {}
+        try:
+            return client.list_entries(PROCESSING_CONFIG['log_file_pattern'])
+        finally:
+            self._release(client)
+    
+    def fetch(self, remote_name: str, local_path: str) -> bool:
+        client = self._acquire()
+        if client is None:
+            return False
+        try:
+            return client.download_file(remote_name, local_path)
+        finally:
+            self._release(client)
+    
+    def close(self):
+        with self._pool_lock:
+            clients, self._clients = self._clients, []
+            self._pool = queue.Queue()
+        for client in clients:
+            disconnect_ftp(client)
+
+class SmbSource(LogSource):
+    """Compartilhamento SMB legado, montado em SMB_CONFIG['mount_point']."""
+    
+    kind = 'smb'
+    
+    def __init__(self, name: str, config: Dict = None, primary: bool = False, subdir: str = ''):
+        super().__init__(name, config, primary)
+        self.smb_config = {**SMB_CONFIG, **self.config}
+        self.directory = os.path.join(self.smb_config['mount_point'], subdir)
+    
+    def list_entries(self) -> Dict[str, str]:
+        if not mount_smb_share(self.smb_config):
+            return {}
+        entries = {}
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and PROCESSING_CONFIG['log_file_pattern'] in entry.name:
+                    stat = entry.stat()
+                    entries[entry.name] = f"{stat.st_size} {int(stat.st_mtime)}"
+        except OSError as e:
+            print(f"✗ [{self.name}] Erro ao listar {self.directory}: {e}")
+        return entries
+    
+    def fetch(self, remote_name: str, local_path: str) -> bool:
+        try:
+            shutil.copyfile(os.path.join(self.directory, remote_name), local_path)
+            return True
+        except OSError as e:
+            print(f"✗ [{self.name}] Erro ao copiar {remote_name}: {e}")
+            return False
+
+def build_sources(sources: List[Dict] = None) -> List[LogSource]:
+    """Cria as fontes ativas de SOURCES; a primeira mantém os nomes originais dos logs."""
+    result = []
+    for entry in sources if sources is not None else SOURCES:
+        if not entry.get('enabled', True):
+            continue
+        primary = not result
+        if entry['type'] == 'ftp':
+            result.append(FtpSource(entry['name'], entry.get('config'), primary))
+        elif entry['type'] == 'smb':
+            result.append(SmbSource(entry['name'], entry.get('config'), primary, entry.get('subdir', '')))
+        else:
+            print(f"⚠️ Tipo de fonte desconhecido ignorado: {entry['type']} ({entry['name']})")
+    return result
@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de Estado Local
+=============================
+Dono único do banco SQLite de controle (processed_files.db).
+
+Mantém uma conexão por thread (e por processo), com WAL habilitado para que
+leitores não bloqueiem o escritor, executa a criação/migração do esquema uma
+única vez e expõe métodos tipados para o ledger de arquivos, as sessões de
+processamento e as consultas dos relatórios. As instruções SQL são fixas e
+reaproveitadas pelo cache de prepared statements do sqlite3.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config.settings import LOCAL_CONFIG, SQLITE_CONFIG, RESULTS_CACHE_CONFIG
+
+# Versão do formato das tabelas de rollup; ao mudar, o histórico é reagregado
+ROLLUP_VERSION = 1
+ROLLUP_TABLES = ('session_rollup_hourly', 'session_rollup_daily')
+
+class StateStore:
+    """Acesso centralizado ao banco SQLite de estado."""
+    
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or LOCAL_CONFIG['local_db']
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+    
+    def connection(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual, abrindo-a na primeira chamada."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_CONFIG['busy_timeout_ms'] / 1000,
+                cached_statements=256,
+                check_same_thread=False
+            )
+            conn.execute(f"PRAGMA journal_mode={SQLITE_CONFIG['journal_mode']}")
+            conn.execute(f"PRAGMA synchronous={SQLITE_CONFIG['synchronous']}")
+            conn.execute(f"PRAGMA cache_size=-{SQLITE_CONFIG['cache_size_kb']}")
+            conn.execute(f"PRAGMA temp_store={SQLITE_CONFIG['temp_store']}")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Fecha a conexão da thread atual."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    # ------------------------------------------------------------------
+    # Esquema
+    # ------------------------------------------------------------------
+    
+    def init_schema(self) -> bool:
+        """Cria e migra todas as tabelas de controle (apenas uma vez por processo)."""
+        if self._schema_ready:
+            return True
+        
+        with self._schema_lock:
+            if self._schema_ready:
+                return True
+            try:
+                conn = self.connection()
+                with conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS processing_sessions (
+                            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            end_time DATETIME,
+                            zip_files_processed INTEGER DEFAULT 0,
+                            log_files_processed INTEGER DEFAULT 0,
+                            csv_files_generated INTEGER DEFAULT 0,
+                            sql_records_inserted INTEGER DEFAULT 0,
+                            errors_count INTEGER DEFAULT 0,
+                            run_count INTEGER DEFAULT 1,
+                            busy_seconds REAL,
+                            peak_rss_mb REAL
+                        );
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS loader_tuning (
+                            session_id INTEGER PRIMARY KEY,
+                            load_profile TEXT,
+                            batch_size INTEGER,
+                            workers INTEGER,
+                            batches INTEGER,
+                            records INTEGER,
+                            avg_latency_ms REAL,
+                            records_per_sec INTEGER
+                        );
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS processed_zips (
+                            zip_path TEXT PRIMARY KEY,
+                            process_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            extracted_files_count INTEGER DEFAULT 0
+                        );
+                    """)
+                    # Membros de ZIPs já carregados (backfill): CRC do diretório central do ZIP
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS processed_zip_members (
+                            zip_path TEXT,
+                            member_name TEXT,
+                            crc INTEGER,
+                            records INTEGER DEFAULT 0,
+                            process_date DATETIME,
+                            PRIMARY KEY (zip_path, member_name)
+                        );
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS processed_logs (
+                            log_path TEXT PRIMARY KEY,
+                            process_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            file_size INTEGER,
+                            file_mtime REAL,
+                            csv_generated TEXT,
+                            csv_filtered TEXT
+                        );
+                    """)
+                    # Migração de bancos antigos sem controle de modificação
+                    self._add_missing_columns(conn, 'processed_logs', {
+                        'file_size': 'INTEGER',
+                        'file_mtime': 'REAL'
+                    })
+                    # Coalescência de ciclos ociosos: quantos ciclos a linha representa
+                    # e a soma das durações individuais desses ciclos
+                    self._add_missing_columns(conn, 'processing_sessions', {
+                        'run_count': 'INTEGER DEFAULT 1',
+                        'busy_seconds': 'REAL',
+                        'peak_rss_mb': 'REAL'
+                    })
+                    conn.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_sessions_start_time
+                        ON processing_sessions (start_time);
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS state_meta (
+                            key TEXT PRIMARY KEY,
+                            value TEXT
+                        );
+                    """)
+                    # Tráfego EDI agregado durante o parsing, por log, hora e formato
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS edi_traffic_hourly (
+                            log_name TEXT,
+                            hour TEXT,
+                            formato TEXT,
+                            records INTEGER DEFAULT 0,
+                            distinct_files INTEGER DEFAULT 0,
+                            PRIMARY KEY (log_name, hour, formato)
+                        );
+                    """)
+                    conn.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_traffic_hour
+                        ON edi_traffic_hourly (hour);
+                    """)
+                    # Resultados memorizados de relatórios e estatísticas
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS results_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            watermark TEXT,
+                            value TEXT,
+                            last_used REAL
+                        );
+                    """)
+                    # Posição de escrita dos relatórios incrementais
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS report_state (
+                            report_path TEXT PRIMARY KEY,
+                            last_session_id INTEGER,
+                            last_row_offset INTEGER,
+                            last_row_signature TEXT,
+                            file_size INTEGER
+                        );
+                    """)
+                    # Posição de leitura dos logs monitorados (--watch): bytes já consumidos por inode
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS log_offsets (
+                            log_path TEXT PRIMARY KEY,
+                            inode INTEGER,
+                            byte_offset INTEGER,
+                            updated_at DATETIME
+                        );
+                    """)
+                    # Rollups por hora e por dia, mantidos a cada sessão gravada
+                    for table, bucket in zip(ROLLUP_TABLES, ('hour', 'day')):
+                        conn.execute(f"""
+                            CREATE TABLE IF NOT EXISTS {table} (
+                                {bucket} TEXT PRIMARY KEY,
+                                sessions INTEGER DEFAULT 0,
+                                zip_files INTEGER DEFAULT 0,
+                                log_files INTEGER DEFAULT 0,
+                                csv_files INTEGER DEFAULT 0,
+                                sql_records INTEGER DEFAULT 0,
+                                errors INTEGER DEFAULT 0,
+                                busy_seconds REAL DEFAULT 0
+                            );
+                        """)
+                if self.get_meta('rollup_version') != str(ROLLUP_VERSION):
+                    self.backfill_rollups()
+                self._schema_ready = True
+                return True
+            except Exception as e:
+                print(f"✗ Erro ao inicializar banco de estado: {e}")
+                return False
+    
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+        """Adiciona colunas ausentes em uma tabela existente."""
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                print(f"  ✓ Coluna {name} adicionada em {table}")
+    
+    # ------------------------------------------------------------------
+    # Ledger de arquivos
+    # ------------------------------------------------------------------
+    
+    def is_zip_processed(self, zip_path: str) -> bool:
+        """Indica se o ZIP já está registrado no ledger."""
+        row = self.connection().execute(
+            "SELECT 1 FROM processed_zips WHERE zip_path = ?", (zip_path,)
+        ).fetchone()
+        return row is not None
+    
+    def mark_zip_processed(self, zip_path: str, extracted_files_count: int = 0):
+        """Registra um ZIP como processado."""
+        conn = self.connection()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO processed_zips (zip_path, process_date, extracted_files_count)
+                VALUES (?, ?, ?)
+            """, (zip_path, datetime.now(), extracted_files_count))
+    
+    def get_zip_members(self, zip_path: str) -> Dict[str, int]:
+        """Membros já carregados de um ZIP: nome -> CRC."""
+        return dict(self.connection().execute(
+            "SELECT member_name, crc FROM processed_zip_members WHERE zip_path = ?", (zip_path,)
+        ).fetchall())
+    
+    def mark_zip_member_processed(self, zip_path: str, member_name: str, crc: int, records: int = 0):
+        """Registra um membro de ZIP cujos registros já estão na outbox."""
+        conn = self.connection()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO processed_zip_members (zip_path, member_name, crc, records, process_date)
+                VALUES (?, ?, ?, ?, ?)
+            """, (zip_path, member_name, crc, records, datetime.now()))
+    
+    def get_log_state(self, log_path: str) -> Optional[Tuple[int, float]]:
+        """Retorna (tamanho, mtime) registrados para um log ou None."""
+        return self.connection().execute(
+            "SELECT file_size, file_mtime FROM processed_logs WHERE log_path = ?", (log_path,)
+        ).fetchone()
+    
+    def mark_log_processed(self, log_path: str, file_size: int, file_mtime: float):
+        """Registra um log como processado com tamanho e timestamp."""
+        conn = self.connection()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO processed_logs
+                (log_path, process_date, file_size, file_mtime)
+                VALUES (?, ?, ?, ?)
+            """, (log_path, datetime.now(), file_size, file_mtime))
+    
+    def get_log_offset(self, log_path: str) -> Optional[Tuple[int, int]]:
+        """Retorna (inode, offset) já lidos de um log monitorado ou None."""
+        return self.connection().execute(
+            "SELECT inode, byte_offset FROM log_offsets WHERE log_path = ?", (log_path,)
+        ).fetchone()
+    
+    def save_log_offset(self, log_path: str, inode: int, byte_offset: int):
+        """Grava até onde um log monitorado já foi lido."""
+        conn = self.connection()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO log_offsets (log_path, inode, byte_offset, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (log_path, inode, byte_offset, datetime.now()))
+    
+    def ledger_counts(self) -> Dict[str, int]:
+        """Totais de ZIPs e logs registrados no ledger."""
+        conn = self.connection()
+        return {
+            'zips': conn.execute("SELECT COUNT(*) FROM processed_zips").fetchone()[0],
+            'logs': conn.execute("SELECT COUNT(*) FROM processed_logs").fetchone()[0]
+        }
+    
+    def clear_tables(self, tables: List[str]):
+        """Apaga o conteúdo das tabelas de controle informadas."""
+        conn = self.connection()
+        with conn:
+            for table in tables:
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("DELETE FROM results_cache")
+    
+    # ------------------------------------------------------------------
+    # Sessões de processamento
+    # ------------------------------------------------------------------
+    
+    def save_session(self, start_time: datetime, end_time: datetime, zip_files: int,
+                     log_files: int, csv_files: int, sql_records: int, errors: int,
+                     tuning: Dict[str, Any] = None, peak_rss_mb: float = None) -> int:
+        """Grava uma sessão (e o ajuste do carregador, se houver) e retorna o session_id.
+        
+        Ciclos sem nenhum trabalho (todos os contadores zerados) são coalescidos
+        na última linha quando ela também é ociosa e do mesmo dia: a linha
+        estende o fim, incrementa run_count e acumula busy_seconds.
+        """
+        duration = (end_time - start_time).total_seconds()
+        is_idle = not any((zip_files, log_files, csv_files, sql_records, errors))
+        
+        conn = self.connection()
+        with conn:
+            session_id = self._coalesce_idle(conn, start_time, end_time, duration, peak_rss_mb) if is_idle else None
+            
+            if session_id is None:
+                cursor = conn.execute("""
+                    INSERT INTO processing_sessions
+                    (start_time, end_time, zip_files_processed, log_files_processed,
+                     csv_files_generated, sql_records_inserted, errors_count,
+                     run_count, busy_seconds, peak_rss_mb)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                """, (start_time, end_time, zip_files, log_files, csv_files,
+                      sql_records, errors, duration, peak_rss_mb))
+                session_id = cursor.lastrowid
+            
+            self._update_rollups(conn, start_time, (1, zip_files, log_files, csv_files,
+                                                    sql_records, errors, duration))
+            
+            if tuning is not None:
+                conn.execute("""
+                    INSERT OR REPLACE INTO loader_tuning
+                    (session_id, load_profile, batch_size, workers, batches,
+                     records, avg_latency_ms, records_per_sec)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    session_id, tuning['load_profile'], tuning['batch_size'],
+                    tuning['workers'], tuning['batches'], tuning['records'],
+                    tuning['avg_latency_ms'], tuning['records_per_sec']
+                ))
+        return session_id
+    
+    @staticmethod
+    def _coalesce_idle(conn: sqlite3.Connection, start_time: datetime, end_time: datetime,
+                       duration: float, peak_rss_mb: float = None) -> Optional[int]:
+        """Estende a última sessão ociosa do mesmo dia; retorna seu id ou None."""
+        last = conn.execute("""
+            SELECT session_id, start_time, zip_files_processed, log_files_processed,
+                   csv_files_generated, sql_records_inserted, errors_count
+            FROM processing_sessions
+            ORDER BY session_id DESC LIMIT 1
+        """).fetchone()
+        if last is None or any(last[2:]):
+            return None
+        if str(last[1])[:10] != start_time.strftime('%Y-%m-%d'):
+            return None
+        
+        conn.execute("""
+            UPDATE processing_sessions
+            SET end_time = ?,
+                run_count = COALESCE(run_count, 1) + 1,
+                busy_seconds = COALESCE(busy_seconds,
+                    (julianday(end_time) - julianday(start_time)) * 86400) + ?,
+                peak_rss_mb = MAX(COALESCE(peak_rss_mb, 0), COALESCE(?, 0))
+            WHERE session_id = ?
+        """, (end_time, duration, peak_rss_mb, last[0]))
+        return last[0]
+    
+    def last_session(self) -> Optional[tuple]:
+        """Última sessão: início, fim, zips, logs, csvs, registros SQL, erros e pico de RSS (MB)."""
+        return self.connection().execute("""
+            SELECT start_time, end_time, zip_files_processed, log_files_processed,
+                   csv_files_generated, sql_records_inserted, errors_count, peak_rss_mb
+            FROM processing_sessions
+            ORDER BY session_id DESC LIMIT 1
+        """).fetchone()
+    
+    def last_loader_tuning(self) -> Optional[tuple]:
+        """Perfil, lote, conexões, latência e vazão do carregador na última sessão."""
+        return self.connection().execute("""
+            SELECT load_profile, batch_size, workers, avg_latency_ms, records_per_sec
+            FROM loader_tuning ORDER BY session_id DESC LIMIT 1
+        """).fetchone()
+    
+    def session_count(self) -> int:
+        """Total de sessões (ciclos) registradas, contando os ciclos ociosos coalescidos."""
+        return self.connection().execute(
+            "SELECT COALESCE(SUM(COALESCE(run_count, 1)), 0) FROM processing_sessions"
+        ).fetchone()[0]
+    
+    # ------------------------------------------------------------------
+    # Rollups de sessões
+    # ------------------------------------------------------------------
+    
+    def get_meta(self, key: str) -> Optional[str]:
+        """Lê um valor da tabela state_meta."""
+        row = self.connection().execute(
+            "SELECT value FROM state_meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set_meta(self, key: str, value: Optional[str]):
+        """Grava um valor na tabela state_meta (None remove a chave)."""
+        conn = self.connection()
+        with conn:
+            if value is None:
+                conn.execute("DELETE FROM state_meta WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO state_meta (key, value) VALUES (?, ?)", (key, value))
+    
+    @staticmethod
+    def _update_rollups(conn: sqlite3.Connection, start_time: datetime, totals: tuple):
+        """Soma os totais de um ciclo nos buckets de hora e dia do seu início."""
+        buckets = (start_time.strftime('%Y-%m-%d %H:00'), start_time.strftime('%Y-%m-%d'))
+        for (table, bucket), key in zip(zip(ROLLUP_TABLES, ('hour', 'day')), buckets):
+            conn.execute(f"""
+                INSERT INTO {table}
+                ({bucket}, sessions, zip_files, log_files, csv_files, sql_records, errors, busy_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT({bucket}) DO UPDATE SET
+                    sessions = sessions + excluded.sessions,
+                    zip_files = zip_files + excluded.zip_files,
+                    log_files = log_files + excluded.log_files,
+                    csv_files = csv_files + excluded.csv_files,
+                    sql_records = sql_records + excluded.sql_records,
+                    errors = errors + excluded.errors,
+                    busy_seconds = busy_seconds + excluded.busy_seconds
+            """, (key,) + tuple(totals))
+    
+    def backfill_rollups(self) -> int:
+        """Recalcula os rollups a partir de processing_sessions; retorna os dias agregados.
+        
+        Ciclos ociosos coalescidos entram inteiros no bucket do início da linha.
+        """
+        conn = self.connection()
+        with conn:
+            for (table, bucket), fmt in zip(zip(ROLLUP_TABLES, ('hour', 'day')),
+                                            ('%Y-%m-%d %H:00', '%Y-%m-%d')):
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"""
+                    INSERT INTO {table}
+                    ({bucket}, sessions, zip_files, log_files, csv_files, sql_records, errors, busy_seconds)
+                    SELECT
+                        strftime('{fmt}', start_time),
+                        SUM(COALESCE(run_count, 1)),
+                        SUM(zip_files_processed),
+                        SUM(log_files_processed),
+                        SUM(csv_files_generated),
+                        SUM(sql_records_inserted),
+                        SUM(errors_count),
+                        SUM(COALESCE(busy_seconds,
+                            (julianday(end_time) - julianday(start_time)) * 86400, 0))
+                    FROM processing_sessions
+                    GROUP BY 1
+                """)
+            conn.execute(
+                "INSERT OR REPLACE INTO state_meta (key, value) VALUES ('rollup_version', ?)",
+                (str(ROLLUP_VERSION),)
+            )
+            conn.execute("DELETE FROM results_cache")
+        return conn.execute("SELECT COUNT(*) FROM session_rollup_daily").fetchone()[0]
+    
+    # ------------------------------------------------------------------
+    # Tráfego EDI
+    # ------------------------------------------------------------------
+    
+    def replace_log_traffic(self, log_name: str, rows: List[Tuple[str, str, int, int]]):
+        """Substitui os agregados de um log por (hora, formato, registros, arquivos distintos).
+        
+        Cada log é reprocessado por inteiro quando muda, então os agregados
+        anteriores dele são descartados em vez de somados.
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM edi_traffic_hourly WHERE log_name = ?", (log_name,))
+            conn.executemany("""
+                INSERT INTO edi_traffic_hourly (log_name, hour, formato, records, distinct_files)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(log_name,) + tuple(row) for row in rows])
+    
+    def merge_log_traffic(self, log_name: str, rows: List[Tuple[str, str, int, int]]):
+        """Soma (hora, formato, registros, arquivos distintos) de um trecho novo de um log (--watch)."""
+        conn = self.connection()
+        with conn:
+            conn.executemany("""
+                INSERT INTO edi_traffic_hourly (log_name, hour, formato, records, distinct_files)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(log_name, hour, formato) DO UPDATE SET
+                    records = records + excluded.records,
+                    distinct_files = distinct_files + excluded.distinct_files
+            """, [(log_name,) + tuple(row) for row in rows])
+    
+    def traffic_by_hour(self, start: datetime, end: datetime) -> List[tuple]:
+        """Tráfego por hora e formato em [start, end): hora, formato, registros e arquivos distintos.
+        
+        Os distintos são somados entre logs: um nome presente em mais de um log
+        (ou em trechos diferentes do --watch) conta mais de uma vez.
+        """
+        return self.connection().execute("""
+            SELECT hour, formato, SUM(records), SUM(distinct_files)
+            FROM edi_traffic_hourly
+            WHERE hour >= ? AND hour < ?
+            GROUP BY hour, formato
+            ORDER BY hour, formato
+        """, (start.strftime('%Y-%m-%d %H:00'), end.strftime('%Y-%m-%d %H:00'))).fetchall()
+    
+    # ------------------------------------------------------------------
+    # Estado dos relatórios incrementais
+    # ------------------------------------------------------------------
+    
+    def get_report_state(self, report_path: str) -> Optional[tuple]:
+        """Estado de um relatório: último session_id, offset da última linha, assinatura e tamanho."""
+        return self.connection().execute("""
+            SELECT last_session_id, last_row_offset, last_row_signature, file_size
+            FROM report_state WHERE report_path = ?
+        """, (report_path,)).fetchone()
+    
+    def save_report_state(self, report_path: str, last_session_id: int, last_row_offset: int,
+                          last_row_signature: str, file_size: int):
+        """Grava a posição de escrita de um relatório."""
+        conn = self.connection()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO report_state
+                (report_path, last_session_id, last_row_offset, last_row_signature, file_size)
+                VALUES (?, ?, ?, ?, ?)
+            """, (report_path, last_session_id, last_row_offset, last_row_signature, file_size))
+    
+    def delete_report_state(self, report_path: str):
+        """Esquece o estado de um relatório removido."""
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM report_state WHERE report_path = ?", (report_path,))
+    
+    # ------------------------------------------------------------------
+    # Cache de resultados
+    # ------------------------------------------------------------------
+    
+    def _cache_watermark(self) -> str:
+        """Marca d'água das sessões: última linha (id e ciclos) e versão dos rollups.
+        
+        Ciclos ociosos coalescidos não criam um novo session_id, por isso o
+        run_count da última linha também faz parte da marca.
+        """
+        row = self.connection().execute("""
+            SELECT session_id, COALESCE(run_count, 1)
+            FROM processing_sessions
+            ORDER BY session_id DESC LIMIT 1
+        """).fetchone()
+        session_id, run_count = row if row else (0, 0)
+        return f"{session_id}.{run_count}@{ROLLUP_VERSION}"
+    
+    def cached(self, name: str, params: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+        """Retorna o resultado memorizado de compute() para (name, params).
+        
+        A entrada vale enquanto nenhuma sessão nova for gravada. Resultados
+        vazios (None ou {}) não são memorizados. Os valores passam por JSON,
+        então tuplas voltam como listas.
+        """
+        if not RESULTS_CACHE_CONFIG['enabled']:
+            return compute()
+        
+        cache_key = f"{name}:{json.dumps(params, sort_keys=True, default=str)}"
+        watermark = self._cache_watermark()
+        conn = self.connection()
+        
+        row = conn.execute(
+            "SELECT watermark, value FROM results_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row is not None and row[0] == watermark:
+            with conn:
+                conn.execute("UPDATE results_cache SET last_used = ? WHERE cache_key = ?",
+                             (time.time(), cache_key))
+            return json.loads(row[1])
+        
+        value = compute()
+        if value is None or value == {}:
+            return value
+        
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO results_cache (cache_key, watermark, value, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (cache_key, watermark, json.dumps(value, default=str), time.time()))
+            conn.execute("""
+                DELETE FROM results_cache WHERE cache_key NOT IN (
+                    SELECT cache_key FROM results_cache ORDER BY last_used DESC LIMIT ?
+                )
+            """, (RESULTS_CACHE_CONFIG['max_entries'],))
+        return json.loads(json.dumps(value, default=str))
+    
+    # ------------------------------------------------------------------
+    # Consultas de relatórios
+    # ------------------------------------------------------------------
+    
+    def iter_sessions(self, start: datetime, end: datetime, min_session_id: int = 0) -> Iterator[tuple]:
+        """Itera as sessões com início em [start, end) e id >= min_session_id, por dia e session_id.
+        
+        Dentro do dia a ordem é a de gravação (session_id), não a de start_time:
+        --watch, --backfill e o daemon gravam no mesmo banco e uma sessão longa
+        pode começar antes de outra já gravada. Assim a última linha de um
+        relatório é sempre a de maior session_id, usado para retomar a escrita.
+        """
+        return self.connection().execute("""
+            SELECT
+                session_id,
+                start_time,
+                end_time,
+                zip_files_processed,
+                log_files_processed,
+                csv_files_generated,
+                sql_records_inserted,
+                errors_count,
+                COALESCE(run_count, 1)
+            FROM processing_sessions
+            WHERE start_time >= ? AND start_time < ? AND session_id >= ?
+            ORDER BY substr(start_time, 1, 10), session_id
+        """, (start, end, min_session_id))
+    
+    def daily_totals(self, start: datetime, end: datetime) -> List[tuple]:
+        """Totais por dia (rollup diário): data, sessões, zips, logs, csvs, registros SQL e erros."""
+        return self.connection().execute("""
+            SELECT day, sessions, zip_files, log_files, csv_files, sql_records, errors
+            FROM session_rollup_daily
+            WHERE day >= ? AND day < ?
+            ORDER BY day
+        """, (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))).fetchall()
+    
+    def period_totals(self, start: datetime) -> tuple:
+        """Totais desde start: sessões, zips, logs, csvs, registros SQL, erros e duração média.
+        
+        O dia parcial do início vem do rollup por hora e os dias completos do
+        rollup diário, então o custo não depende do tamanho do período.
+        """
+        next_day = (start + timedelta(days=1)).strftime('%Y-%m-%d')
+        row = self.connection().execute("""
+            SELECT
+                SUM(sessions), SUM(zip_files), SUM(log_files), SUM(csv_files),
+                SUM(sql_records), SUM(errors), SUM(busy_seconds)
+            FROM (
+                SELECT sessions, zip_files, log_files, csv_files, sql_records, errors, busy_seconds
+                FROM session_rollup_hourly
+                WHERE hour >= ? AND hour < ?
+                UNION ALL
+                SELECT sessions, zip_files, log_files, csv_files, sql_records, errors, busy_seconds
+                FROM session_rollup_daily
+                WHERE day >= ?
+            )
+        """, (start.strftime('%Y-%m-%d %H:00'), next_day, next_day)).fetchone()
+        sessions, busy_seconds = row[0], row[6]
+        avg_duration_min = busy_seconds / 60.0 / sessions if sessions else None
+        return row[:6] + (avg_duration_min,)
+
+_stores: Dict[Tuple[int, str], StateStore] = {}
+_stores_lock = threading.Lock()
+
+def get_state_store(db_path: str = None) -> StateStore:
+    """Retorna o StateStore do processo atual (recriado após fork)."""
+    key = (os.getpid(), db_path or LOCAL_CONFIG['local_db'])
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = StateStore(key[1])
+                _stores[key] = store
+    return store
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agregados de Tráfego EDI
+========================
+Registros e arquivos distintos por hora e formato, acumulados enquanto os
+registros passam pelo parser em qualquer caminho de ingestão (CSV do ciclo,
+--watch, ZIPs em streaming e backfill) e gravados em edi_traffic_hourly.
+
+Os nomes de arquivo ficam em um conjunto por (hora, formato) durante a
+leitura de um log, então horas fora de ordem não contam o mesmo nome duas
+vezes. Se o orçamento de memória acabar, os conjuntos são fechados em
+contagens e um nome visto de novo depois disso volta a ser contado; o mesmo
+vale entre trechos do --watch e entre logs diferentes (os distintos de cada
+log são somados no relatório). Nesses casos o número de distintos é um
+limite superior.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
+from config.settings import PERFORMANCE_CONFIG
+from core.memory_budget import RECORD_OVERHEAD_BYTES, get_memory_budget
+from core.state_store import get_state_store
+
+Record = Tuple[str, str, str]
+
+class TrafficAccumulator:
+    """Agregados (hora, formato) -> registros e arquivos distintos de um log ou trecho."""
+    
+    def __init__(self):
+        # (hora, formato) -> [registros, distintos fechados, nomes em aberto]
+        self._buckets: Dict[Tuple[str, str], list] = {}
+        self._date_prefix = None
+        self._hour = None
+        self._pending_names = 0
+        self._reserved = 0
+    
+    def add(self, date: str, process: str, file_name: str):
+        """Conta um registro (data no formato do log: dd/mm/aaaa hh:mm:ss)."""
+        if date[:13] != self._date_prefix:
+            try:
+                self._hour = datetime.strptime(date, '%d/%m/%Y %H:%M:%S').strftime('%Y-%m-%d %H:00')
+            except ValueError:
+                return
+            self._date_prefix = date[:13]
+        
+        bucket = self._buckets.setdefault((self._hour, process), [0, 0, set()])
+        bucket[0] += 1
+        if file_name not in bucket[2]:
+            bucket[2].add(file_name)
+            self._pending_names += 1
+            if self._pending_names >= PERFORMANCE_CONFIG['chunk_size']:
+                self._reserve_names()
+    
+    def observe(self, records: Iterable[Record]) -> Iterator[Record]:
+        """Repassa os registros contando cada um (para caminhos que só iteram)."""
+        for record in records:
+            self.add(*record)
+            yield record
+    
+    def _reserve_names(self):
+        """Reserva no orçamento os nomes acumulados; sem espaço, fecha os conjuntos."""
+        nbytes = self._pending_names * RECORD_OVERHEAD_BYTES
+        self._pending_names = 0
+        if get_memory_budget().try_reserve(nbytes):
+            self._reserved += nbytes
+            return
+        self._close_buckets()
+    
+    def _close_buckets(self):
+        """Converte os nomes em aberto de cada bucket em contagem e devolve a memória."""
+        for bucket in self._buckets.values():
+            if bucket[2]:
+                bucket[1] += len(bucket[2])
+                bucket[2] = set()
+        get_memory_budget().release(self._reserved)
+        self._reserved = 0
+    
+    def rows(self) -> List[Tuple[str, str, int, int]]:
+        """Fecha os agregados e retorna (hora, formato, registros, arquivos distintos)."""
+        self._close_buckets()
+        self._pending_names = 0
+        return [
+            (hour, process, records, distinct)
+            for (hour, process), (records, distinct, _) in self._buckets.items()
+        ]
+    
+    def replace(self, log_name: str):
+        """Grava os agregados de um log lido por inteiro, substituindo os anteriores dele."""
+        get_state_store().replace_log_traffic(log_name, self.rows())
+    
+    def merge(self, log_name: str):
+        """Soma os agregados de um trecho novo do log aos já gravados."""
+        get_state_store().merge_log_traffic(log_name, self.rows())
@@ -4,15 +4,21 @@
 Processador de Arquivos ZIP
 ===========================
 Responsável por extrair e processar arquivos ZIP contendo logs EDI.
+
+No modo streaming (ZIP_CONFIG['streaming']) cada membro ConsoleEDI_*.Log é
+lido direto do ZIP pelo parser de blocos, sem extração para disco. O ZIP
+pode ser um caminho local ou um buffer seekable (ex.: download do FTP).
 """
 
+import io
 import os
 import zipfile
-import sqlite3
 import shutil
-from datetime import datetime
-from typing import List, Tuple
+from typing import BinaryIO, Callable, Iterator, List, Tuple, Union
 from config.settings import LOCAL_CONFIG, PROCESSING_CONFIG
+from core.csv_processor import iter_log_records, filter_records
+from core.state_store import get_state_store
+from core.traffic import TrafficAccumulator
 
 class ZipProcessor:
     """Classe responsável pelo processamento de arquivos ZIP."""
@@ -20,6 +26,7 @@ class ZipProcessor:
     def __init__(self):
         self.extracted_files = []
         self.processed_zips = []
+        self.streamed_members = []
         self.errors = []
         
     def find_zip_files(self, base_dir: str) -> List[str]:
@@ -97,16 +104,71 @@ class ZipProcessor:
         self.extracted_files = extracted_files
         return extracted_files
     
+    @staticmethod
+    def log_members(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+        """Membros ConsoleEDI_*.Log listados no diretório central do ZIP (com nome, tamanho e CRC)."""
+        members = []
+        for member in zip_ref.infolist():
+            member_name = os.path.basename(member.filename)
+            if member.is_dir():
+                continue
+            if (member_name.startswith(PROCESSING_CONFIG['log_file_pattern']) and
+                    member_name.endswith(PROCESSING_CONFIG['log_file_extension'])):
+                members.append(member)
+            elif member_name.endswith('.Log'):
+                print(f"  ⚠️ Arquivo ignorado no ZIP (padrão diferente): {member.filename}")
+        return members
+    
+    @staticmethod
+    def iter_member_records(zip_ref: zipfile.ZipFile, member: Union[str, zipfile.ZipInfo]) -> Iterator[Tuple[str, str, str]]:
+        """Registros de um membro, lidos do ZIP conforme o parser avança (o CRC é conferido no fim)."""
+        with zip_ref.open(member) as raw:
+            yield from iter_log_records(io.TextIOWrapper(raw, encoding='utf-8', errors='replace'))
+    
+    def iter_zip_members(self, zip_source: Union[str, BinaryIO]) -> Iterator[Tuple[str, Iterator[Tuple[str, str, str]]]]:
+        """Percorre os membros ConsoleEDI_*.Log de um ZIP gerando (nome do membro, registros).
+        
+        Os registros de cada membro devem ser consumidos antes de avançar para o
+        próximo: o membro é lido do ZIP conforme o parser avança.
+        """
+        with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+            for member in self.log_members(zip_ref):
+                yield os.path.basename(member.filename), self.iter_member_records(zip_ref, member)
+    
+    def stream_zip(self, zip_source: Union[str, BinaryIO], zip_name: str,
+                   load_records: Callable[[Iterator[Tuple[str, str, str]], str], bool]) -> int:
+        """Entrega os registros filtrados de cada membro a load_records(registros, membro).
+        
+        load_records retorna se os registros chegaram à outbox. Retorna o número
+        de membros carregados; se a leitura falhar ou algum membro não chegar à
+        outbox o ZIP não entra em processed_zips e é relido no próximo ciclo.
+        """
+        members = 0
+        complete = True
+        try:
+            print(f"📦 Lendo membros de: {zip_name}")
+            for member_name, records in self.iter_zip_members(zip_source):
+                traffic = TrafficAccumulator()
+                if not load_records(filter_records(traffic.observe(records)), member_name):
+                    complete = False
+                    continue
+                traffic.replace(member_name)
+                self.streamed_members.append(f"{zip_name}/{member_name}")
+                members += 1
+            if complete:
+                self.processed_zips.append(zip_name)
+            else:
+                print(f"  ⚠️ {zip_name}: membros fora da outbox, será relido no próximo ciclo")
+        except Exception as e:
+            error_msg = f"Erro ao ler {zip_name}: {e}"
+            print(f"  ✗ {error_msg}")
+            self.errors.append(error_msg)
+        return members
+    
     def _is_zip_processed(self, zip_path: str) -> bool:
         """Verifica se um arquivo ZIP já foi processado."""
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM processed_zips WHERE zip_path = ?", (zip_path,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result is not None:
+            if get_state_store().is_zip_processed(zip_path):
                 # Verificar se os arquivos extraídos ainda existem
                 zip_name = os.path.splitext(os.path.basename(zip_path))[0]
                 extract_dir = os.path.join(LOCAL_CONFIG['temp_dir'], zip_name)
@@ -136,40 +198,31 @@ class ZipProcessor:
     def _mark_zip_as_processed(self, zip_path: str):
         """Marca um arquivo ZIP como processado."""
         try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO processed_zips (zip_path, process_date) VALUES (?, ?)", 
-                         (zip_path, datetime.now()))
-            conn.commit()
-            conn.close()
+            get_state_store().mark_zip_processed(zip_path)
         except Exception as e:
             print(f"✗ Erro ao registrar ZIP processado: {e}")
     
     def init_zip_database(self):
         """Inicializa a tabela de controle de arquivos ZIP processados."""
-        try:
-            conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS processed_zips (
-                    zip_path TEXT PRIMARY KEY,
-                    process_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    extracted_files_count INTEGER DEFAULT 0
-                );
-            """)
-            conn.commit()
-            conn.close()
-            print("✓ Banco de dados de ZIPs inicializado com sucesso.")
-        except Exception as e:
-            print(f"✗ Erro ao inicializar banco de dados de ZIPs: {e}")
+        if not get_state_store().init_schema():
+            print("✗ Erro ao inicializar banco de dados de ZIPs")
             return False
+        print("✓ Banco de dados de ZIPs inicializado com sucesso.")
         return True
     
+    def reset(self):
+        """Zera os contadores para um novo ciclo (modo daemon)."""
+        self.extracted_files = []
+        self.processed_zips = []
+        self.streamed_members = []
+        self.errors = []
+    
     def get_summary(self) -> dict:
         """Retorna um resumo do processamento de ZIPs."""
         return {
             'zips_processed': len(self.processed_zips),
             'files_extracted': len(self.extracted_files),
+            'members_streamed': len(self.streamed_members),
             'errors': len(self.errors),
             'error_details': self.errors
         }
@@ -2,135 +2,477 @@ import csv
 import sqlite3
 from datetime import datetime
 import os
-try:
-    import pyodbc
-    PYODBC_AVAILABLE = True
-except ImportError:
-    print("⚠️ pyodbc não disponível - modo de processamento local apenas")
-    PYODBC_AVAILABLE = False
-from config.settings import DB_CONFIG, LOCAL_CONFIG
+# pyodbc só é importado quando um comando usa o destino: comandos somente leitura não pagam o custo
+_pyodbc_available = None
+_local_mode_warned = False
+from config.settings import DB_CONFIG, LOCAL_CONFIG, SQLITE_CONFIG, PROCESSING_CONFIG, SQL_SCHEMA_CONFIG
 
-def send_data_to_sql(csv_file):
-    """Envia dados CSV para banco de dados SQL Server ou SQLite local."""
-    if not PYODBC_AVAILABLE:
-        print(f"  ⚠️ pyodbc não disponível - salvando dados localmente em SQLite: {os.path.basename(csv_file)}")
-        return send_data_to_sqlite(csv_file)
-        
+# Cache local formato_processo -> format_id da dimensão EDI_FORMATS
+_format_cache = {}
+
+# Largura de nome_arquivo na tabela de fatos (a chave do índice único tem limite de 1700 bytes)
+_FACT_NAME_LENGTH = 400
+
+# Formato usado na migração para registros legados sem formato_processo
+_MISSING_FORMAT = '(sem formato)'
+
+# Chave em state_meta do total de linhas da tabela edi_logs local
+_SQLITE_ROW_COUNTER = 'edi_logs_rows'
+
+def _build_connection_string():
+    """Monta a string de conexão ODBC para o SQL Server."""
+    return (
+        f"DRIVER={{{DB_CONFIG['driver']}}};"
+        f"SERVER={DB_CONFIG['server']};"
+        f"DATABASE={DB_CONFIG['database']};"
+        f"UID={DB_CONFIG['username']};"
+        f"PWD={DB_CONFIG['password']};"
+        f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+        f"TrustServerCertificate={DB_CONFIG.get('trust_server_certificate', 'yes')};"
+    )
+
+def pyodbc_available():
+    """Importa o pyodbc na primeira chamada e guarda se ele pode ser usado.
+    
+    Um pyodbc instalado mas que falha ao carregar (ex.: sem libodbc) conta
+    como indisponível, e os registros vão para o SQLite local.
+    """
+    global _pyodbc_available
+    if _pyodbc_available is None:
+        try:
+            import pyodbc
+            _pyodbc_available = True
+        except ImportError:
+            _pyodbc_available = False
+    return _pyodbc_available
+
+def _warn_local_mode():
+    """Avisa uma única vez que o destino é o SQLite local."""
+    global _local_mode_warned
+    if not _local_mode_warned:
+        print("⚠️ pyodbc não disponível - modo de processamento local apenas")
+        _local_mode_warned = True
+
+def connect_sql_server(timeout=None):
+    """Abre uma conexão com o SQL Server ou retorna None se ele estiver inacessível."""
     try:
-        # Construir string de conexão para SQL Server
-        conn_str = (
-            f"DRIVER={{{DB_CONFIG['driver']}}};"
-            f"SERVER={DB_CONFIG['server']};"
-            f"DATABASE={DB_CONFIG['database']};"
-            f"UID={DB_CONFIG['username']};"
-            f"PWD={DB_CONFIG['password']};"
-            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
-            f"TrustServerCertificate={DB_CONFIG.get('trust_server_certificate', 'yes')};"
-        )
+        import pyodbc
+        return pyodbc.connect(_build_connection_string(), timeout=timeout or DB_CONFIG['timeout'])
+    except Exception as e:
+        print(f"  ✗ SQL Server inacessível: {e}")
+        return None
+
+def _table_type(cursor, name):
+    """Retorna 'BASE TABLE', 'VIEW' ou None para um objeto do esquema dbo."""
+    cursor.execute("""
+        SELECT TABLE_TYPE FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = ?;
+    """, (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _ensure_sql_table(cursor):
+    """Cria a tabela EDI_LOGS no SQL Server se ela ainda não existir."""
+    if SQL_SCHEMA_CONFIG['normalized_formats']:
+        _ensure_normalized_schema(cursor)
+        return
+    
+    check_table_query = f"""
+    SELECT COUNT(*)
+    FROM INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = '{LOCAL_CONFIG['table_name']}';
+    """
+    cursor.execute(check_table_query)
+    table_exists = cursor.fetchone()[0]
+    
+    if table_exists == 0:
+        create_table_query = f"""
+        CREATE TABLE {LOCAL_CONFIG['table_name']} (
+            id INT IDENTITY(1,1) PRIMARY KEY,
+            data DATETIME2,
+            formato_processo NVARCHAR(255),
+            nome_arquivo NVARCHAR(MAX)
+        );
         
-        conn = pyodbc.connect(conn_str)
+        CREATE UNIQUE INDEX idx_unique_log
+        ON {LOCAL_CONFIG['table_name']} (data, formato_processo, nome_arquivo);
+        """
+        cursor.execute(create_table_query)
+        print(f"  ✓ Tabela {LOCAL_CONFIG['table_name']} criada no banco de dados.")
+
+def _ensure_normalized_schema(cursor):
+    """Cria a dimensão EDI_FORMATS, a tabela de fatos e a view EDI_LOGS compatível."""
+    formats_table = SQL_SCHEMA_CONFIG['formats_table']
+    fact_table = SQL_SCHEMA_CONFIG['fact_table']
+    view_name = LOCAL_CONFIG['table_name']
+    
+    if _table_type(cursor, formats_table) is None:
+        cursor.execute(f"""
+            CREATE TABLE {formats_table} (
+                format_id SMALLINT IDENTITY(1,1) PRIMARY KEY,
+                formato_processo NVARCHAR(255) NOT NULL,
+                CONSTRAINT uq_{formats_table.lower()}_formato UNIQUE (formato_processo)
+            );
+        """)
+        print(f"  ✓ Tabela {formats_table} criada no banco de dados.")
+    
+    if _table_type(cursor, fact_table) is None:
+        cursor.execute(f"""
+            CREATE TABLE {fact_table} (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                data DATETIME2(0) NOT NULL,
+                format_id SMALLINT NOT NULL REFERENCES {formats_table} (format_id),
+                nome_arquivo NVARCHAR({_FACT_NAME_LENGTH}) NOT NULL
+            );
+        """)
+        cursor.execute(f"""
+            CREATE UNIQUE INDEX idx_unique_log_data
+            ON {fact_table} (data, format_id, nome_arquivo);
+        """)
+        print(f"  ✓ Tabela {fact_table} criada no banco de dados.")
+    
+    view_type = _table_type(cursor, view_name)
+    if view_type == 'BASE TABLE':
+        raise RuntimeError(
+            f"{view_name} ainda é uma tabela; execute 'python cli/main.py --migrate-formats' "
+            f"para migrar para o esquema normalizado"
+        )
+    if view_type is None:
+        cursor.execute(f"""
+            CREATE VIEW {view_name} AS
+            SELECT d.id, d.data, f.formato_processo, d.nome_arquivo
+            FROM {fact_table} d
+            JOIN {formats_table} f ON f.format_id = d.format_id;
+        """)
+        print(f"  ✓ View {view_name} criada sobre {fact_table}.")
+
+def _resolve_format_ids(cursor, formats):
+    """Retorna o format_id de cada formato, usando o cache local e criando os que faltam."""
+    formats_table = SQL_SCHEMA_CONFIG['formats_table']
+    if not _format_cache:
+        cursor.execute(f"SELECT formato_processo, format_id FROM {formats_table};")
+        _format_cache.update({row[0]: row[1] for row in cursor.fetchall()})
+    
+    missing = [formato for formato in formats if formato not in _format_cache]
+    if not missing:
+        return _format_cache
+    
+    for formato in missing:
+        # HOLDLOCK mantém o range travado entre a verificação e o INSERT: duas
+        # instâncias criando o mesmo formato não violam a restrição UNIQUE
+        cursor.execute(f"""
+            MERGE {formats_table} WITH (HOLDLOCK) AS f
+            USING (SELECT ? AS formato_processo) AS s
+            ON f.formato_processo = s.formato_processo
+            WHEN NOT MATCHED THEN
+                INSERT (formato_processo) VALUES (s.formato_processo);
+        """, (formato,))
+    # Os novos formatos são confirmados em uma transação própria antes de entrar
+    # no cache: um rollback do lote não deixa no cache um format_id inexistente
+    cursor.connection.commit()
+    for formato in missing:
+        cursor.execute(f"SELECT format_id FROM {formats_table} WHERE formato_processo = ?;", (formato,))
+        _format_cache[formato] = cursor.fetchone()[0]
+    
+    return _format_cache
+
+def migrate_to_normalized_schema():
+    """Migra EDI_LOGS para a dimensão EDI_FORMATS + tabela de fatos, mantendo EDI_LOGS como view.
+    
+    A migração é abortada antes de qualquer alteração se algum nome_arquivo
+    não couber na tabela de fatos. Registros sem formato_processo entram com
+    o formato _MISSING_FORMAT; os sem data ou nome_arquivo (colunas NOT NULL
+    na tabela de fatos) ficam só na tabela legada e são contados no relatório.
+    """
+    if not pyodbc_available():
+        print("  ⚠️ pyodbc não disponível - migração aplicável apenas ao SQL Server")
+        return False
+    
+    table = LOCAL_CONFIG['table_name']
+    formats_table = SQL_SCHEMA_CONFIG['formats_table']
+    fact_table = SQL_SCHEMA_CONFIG['fact_table']
+    legacy_table = SQL_SCHEMA_CONFIG['legacy_table']
+    
+    try:
+        conn = connect_sql_server()
+        if conn is None:
+            return False
         cursor = conn.cursor()
         
-        # Verifica se a tabela existe
-        check_table_query = f"""
-        SELECT COUNT(*)
-        FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = '{LOCAL_CONFIG['table_name']}';
-        """
-        cursor.execute(check_table_query)
-        table_exists = cursor.fetchone()[0]
+        if _table_type(cursor, table) != 'BASE TABLE':
+            print(f"  ℹ {table} já está no esquema normalizado (ou não existe).")
+            _ensure_normalized_schema(cursor)
+            conn.commit()
+            conn.close()
+            return True
         
-        # Cria a tabela se ela não existir
-        if table_exists == 0:
-            create_table_query = f"""
-            CREATE TABLE {LOCAL_CONFIG['table_name']} (
-                id INT IDENTITY(1,1) PRIMARY KEY,
-                data DATETIME2,
-                formato_processo NVARCHAR(255),
-                nome_arquivo NVARCHAR(MAX)
+        cursor.execute(f"""
+            SELECT MAX(LEN(nome_arquivo)),
+                   SUM(CASE WHEN formato_processo IS NULL THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN data IS NULL OR nome_arquivo IS NULL THEN 1 ELSE 0 END)
+            FROM {table};
+        """)
+        longest_name, missing_formats, incomplete_rows = cursor.fetchone()
+        if (longest_name or 0) > _FACT_NAME_LENGTH:
+            print(f"  ✗ Migração abortada: {table} tem nome_arquivo com {longest_name} caracteres "
+                  f"e a tabela de fatos aceita até {_FACT_NAME_LENGTH}. Nada foi alterado.")
+            conn.close()
+            return False
+        
+        print(f"  🔄 Renomeando {table} para {legacy_table}...")
+        cursor.execute(f"EXEC sp_rename 'dbo.{table}', '{legacy_table}';")
+        _ensure_normalized_schema(cursor)
+        
+        print(f"  🔄 Populando {formats_table}...")
+        cursor.execute(f"""
+            INSERT INTO {formats_table} (formato_processo)
+            SELECT DISTINCT COALESCE(l.formato_processo, ?) FROM {legacy_table} l
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {formats_table} f
+                WHERE f.formato_processo = COALESCE(l.formato_processo, ?)
             );
-            
-            CREATE UNIQUE INDEX idx_unique_log
-            ON {LOCAL_CONFIG['table_name']} (data, formato_processo, nome_arquivo);
-            """
-            cursor.execute(create_table_query)
-            print(f"  ✓ Tabela {LOCAL_CONFIG['table_name']} criada no banco de dados.")
-        
-        # Inserção de dados no banco
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader)  # Pular o cabeçalho
-            insert_query = f"""
-            IF NOT EXISTS (
-                SELECT 1 FROM {LOCAL_CONFIG['table_name']} 
-                WHERE data = ? AND formato_processo = ? AND nome_arquivo = ?
-            )
-            INSERT INTO {LOCAL_CONFIG['table_name']} (data, formato_processo, nome_arquivo) 
-            VALUES (?, ?, ?)
-            """
-            inserted_count = 0
-            for row in reader:
-                try:
-                    # Converter data para formato SQL Server
-                    converted_date = datetime.strptime(row[0], '%d/%m/%Y %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-                    cursor.execute(insert_query, (converted_date, row[1], row[2], converted_date, row[1], row[2]))
-                    if cursor.rowcount > 0:
-                        inserted_count += 1
-                except ValueError as e:
-                    print(f"    ⚠ Erro ao converter data: {row[0]} - {e}")
-                    continue
+        """, (_MISSING_FORMAT, _MISSING_FORMAT))
         
+        print(f"  🔄 Copiando registros para {fact_table}...")
+        cursor.execute(f"""
+            INSERT INTO {fact_table} (data, format_id, nome_arquivo)
+            SELECT l.data, f.format_id, l.nome_arquivo
+            FROM {legacy_table} l
+            JOIN {formats_table} f ON f.formato_processo = COALESCE(l.formato_processo, ?)
+            WHERE l.data IS NOT NULL AND l.nome_arquivo IS NOT NULL
+            GROUP BY l.data, f.format_id, l.nome_arquivo;
+        """, (_MISSING_FORMAT,))
+        copied_count = cursor.rowcount
         conn.commit()
+        
         cursor.close()
         conn.close()
+        _format_cache.clear()
+        print(f"  ✓ {copied_count} registros migrados; tabela original mantida como {legacy_table}.")
+        if missing_formats:
+            print(f"  ⚠️ {missing_formats} registros sem formato_processo migrados com o formato '{_MISSING_FORMAT}'")
+        if incomplete_rows:
+            print(f"  ⚠️ {incomplete_rows} registros sem data ou nome_arquivo não migrados "
+                  f"(continuam em {legacy_table})")
+        return True
+    except Exception as e:
+        print(f"  ✗ Erro na migração para o esquema normalizado: {e}")
+        return False
+
+def _convert_date(value):
+    """Converte a data do log (dd/mm/aaaa hh:mm:ss) para o formato do SQL Server."""
+    return datetime.strptime(value, '%d/%m/%Y %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+
+def iter_csv_records(csv_file):
+    """Percorre um CSV filtrado gerando registros (data, formato, nome do arquivo) sem carregá-lo inteiro."""
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Pular o cabeçalho
+        for row in reader:
+            if len(row) < 3:
+                print(f"    ⚠ Linha inválida ignorada: {row}")
+                continue
+            yield (row[0], row[1], row[2])
+
+def read_csv_records(csv_file):
+    """Lê um CSV filtrado e retorna a lista de registros (data, formato, nome do arquivo)."""
+    return list(iter_csv_records(csv_file))
+
+def send_records_to_sql(conn, records, check_existing=True):
+    """Carrega um lote de registros no SQL Server em uma única transação.
+    
+    Os registros vão para uma tabela temporária via fast_executemany e entram
+    na tabela final com um único INSERT ... SELECT que ignora o que já existe.
+    Com check_existing=False (índice único desabilitado no modo catch-up) a
+    verificação é pulada e a deduplicação fica para o final da carga.
+    Retorna o número de registros inseridos.
+    """
+    rows = []
+    for data, formato, nome in records:
+        try:
+            rows.append((_convert_date(data), formato, nome))
+        except ValueError as e:
+            print(f"    ⚠ Erro ao converter data: {data} - {e}")
+    if not rows:
+        return 0
+    
+    cursor = conn.cursor()
+    try:
+        _ensure_sql_table(cursor)
+        if SQL_SCHEMA_CONFIG['normalized_formats']:
+            inserted_count = _insert_normalized(cursor, rows, check_existing)
+        else:
+            inserted_count = _insert_denormalized(cursor, rows, check_existing)
+        conn.commit()
+        return inserted_count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _insert_denormalized(cursor, rows, check_existing=True):
+    """Insere registros na tabela EDI_LOGS original via tabela temporária."""
+    table = LOCAL_CONFIG['table_name']
+    cursor.execute("""
+        CREATE TABLE #edi_logs_stage (
+            data DATETIME2,
+            formato_processo NVARCHAR(255),
+            nome_arquivo NVARCHAR(4000)
+        );
+    """)
+    cursor.fast_executemany = True
+    cursor.executemany("INSERT INTO #edi_logs_stage VALUES (?, ?, ?)", rows)
+    existing_filter = f"""
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} t
+            WHERE t.data = s.data
+              AND t.formato_processo = s.formato_processo
+              AND t.nome_arquivo = s.nome_arquivo
+        )""" if check_existing else ""
+    cursor.execute(f"""
+        INSERT INTO {table} (data, formato_processo, nome_arquivo)
+        SELECT DISTINCT s.data, s.formato_processo, s.nome_arquivo
+        FROM #edi_logs_stage s{existing_filter};
+    """)
+    inserted_count = cursor.rowcount
+    cursor.execute("DROP TABLE #edi_logs_stage;")
+    return inserted_count
+
+def _insert_normalized(cursor, rows, check_existing=True):
+    """Insere registros na tabela de fatos usando as chaves SMALLINT da dimensão de formatos."""
+    fact_table = SQL_SCHEMA_CONFIG['fact_table']
+    format_ids = _resolve_format_ids(cursor, {row[1] for row in rows})
+    cursor.execute(f"""
+        CREATE TABLE #edi_logs_stage (
+            data DATETIME2(0),
+            format_id SMALLINT,
+            nome_arquivo NVARCHAR({_FACT_NAME_LENGTH})
+        );
+    """)
+    cursor.fast_executemany = True
+    cursor.executemany(
+        "INSERT INTO #edi_logs_stage VALUES (?, ?, ?)",
+        [(data, format_ids[formato], nome) for data, formato, nome in rows]
+    )
+    existing_filter = f"""
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {fact_table} t
+            WHERE t.data = s.data
+              AND t.format_id = s.format_id
+              AND t.nome_arquivo = s.nome_arquivo
+        )""" if check_existing else ""
+    cursor.execute(f"""
+        INSERT INTO {fact_table} (data, format_id, nome_arquivo)
+        SELECT DISTINCT s.data, s.format_id, s.nome_arquivo
+        FROM #edi_logs_stage s{existing_filter};
+    """)
+    inserted_count = cursor.rowcount
+    cursor.execute("DROP TABLE #edi_logs_stage;")
+    return inserted_count
+
+def connect_sink(timeout=None):
+    """Abre a conexão com o destino dos registros (SQL Server ou SQLite local)."""
+    if not pyodbc_available():
+        _warn_local_mode()
+        return _connect_sqlite()
+    return connect_sql_server(timeout)
+
+def send_records(conn, records, check_existing=True):
+    """Envia um lote de registros ao destino aberto por connect_sink."""
+    if not pyodbc_available():
+        # Mesma semântica do SQL Server: o lote recebido é uma única transação
+        return send_records_to_sqlite(conn, records, check_existing, batch_size=len(records))
+    return send_records_to_sql(conn, records, check_existing)
+
+def send_data_to_sql(csv_file):
+    """Envia dados CSV para banco de dados SQL Server ou SQLite local."""
+    if not pyodbc_available():
+        print(f"  ⚠️ pyodbc não disponível - salvando dados localmente em SQLite: {os.path.basename(csv_file)}")
+        return send_data_to_sqlite(csv_file)
+    
+    try:
+        conn = connect_sql_server()
+        if conn is None:
+            return False
+        
+        inserted_count = send_records_to_sql(conn, read_csv_records(csv_file))
+        conn.close()
         print(f"  ✓ {inserted_count} registros inseridos no banco de dados.")
         return True
     except Exception as e:
         print(f"  ✗ Erro ao enviar dados para banco: {e}")
         return False
 
+def _unique_index():
+    """Nome do índice único e tabela física conforme o esquema configurado."""
+    if SQL_SCHEMA_CONFIG['normalized_formats']:
+        return 'idx_unique_log_data', SQL_SCHEMA_CONFIG['fact_table']
+    return 'idx_unique_log', LOCAL_CONFIG['table_name']
+
+def set_unique_index_enabled(enabled):
+    """Desabilita (carga em massa) ou reconstrói o índice único no SQL Server.
+    
+    A reconstrução falha se houver duplicatas, por isso deve ser chamada
+    depois de remove_duplicated_files().
+    """
+    if not pyodbc_available():
+        print("  ℹ SQLite local: restrição UNIQUE não pode ser desabilitada, mantida ativa")
+        return True
+    
+    index_name, table = _unique_index()
+    action = 'REBUILD' if enabled else 'DISABLE'
+    try:
+        conn = connect_sql_server()
+        if conn is None:
+            return False
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER INDEX {index_name} ON {table} {action};")
+        conn.commit()
+        cursor.close()
+        conn.close()
+        print(f"  ✓ Índice {index_name} {'reconstruído' if enabled else 'desabilitado'}")
+        return True
+    except Exception as e:
+        print(f"  ✗ Erro ao alterar índice {index_name}: {e}")
+        return False
+
+def _dedupe_target():
+    """Tabela física e colunas da chave de unicidade conforme o esquema configurado."""
+    if SQL_SCHEMA_CONFIG['normalized_formats']:
+        return SQL_SCHEMA_CONFIG['fact_table'], 'data, format_id, nome_arquivo'
+    return LOCAL_CONFIG['table_name'], 'data, formato_processo, nome_arquivo'
+
 def remove_duplicated_files():
     """Remove registros duplicados na tabela edi_logs, mantendo apenas o menor id para cada combinação única."""
-    if not PYODBC_AVAILABLE:
+    if not pyodbc_available():
         print("  ⚠️ pyodbc não disponível - remoção de duplicatas no SQLite local")
         return remove_duplicated_files_sqlite()
-        
+    
     try:
         print("  🔄 Conectando ao SQL Server para remoção de duplicatas...")
-        # Construir string de conexão para SQL Server
-        conn_str = (
-            f"DRIVER={{{DB_CONFIG['driver']}}};"
-            f"SERVER={DB_CONFIG['server']};"
-            f"DATABASE={DB_CONFIG['database']};"
-            f"UID={DB_CONFIG['username']};"
-            f"PWD={DB_CONFIG['password']};"
-            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
-            f"TrustServerCertificate={DB_CONFIG.get('trust_server_certificate', 'yes')};"
-        )
-        
-        conn = pyodbc.connect(conn_str)
+        conn = connect_sql_server()
+        if conn is None:
+            return False
         cursor = conn.cursor()
         
-        # Contar registros antes da remoção
-        cursor.execute(f"SELECT COUNT(*) FROM {LOCAL_CONFIG['table_name']}")
-        records_before = cursor.fetchone()[0]
-        
-        print(f"  📊 Registros antes da limpeza: {records_before}")
+        # No esquema normalizado as duplicatas são verificadas na tabela de fatos
+        table, key_columns = _dedupe_target()
         
         # Query otimizada para remover duplicatas
         delete_query = f'''
         WITH DuplicatesToRemove AS (
             SELECT id,
                    ROW_NUMBER() OVER (
-                       PARTITION BY data, formato_processo, nome_arquivo 
+                       PARTITION BY {key_columns}
                        ORDER BY id
                    ) as rn
-            FROM {LOCAL_CONFIG['table_name']}
+            FROM {table}
         )
-        DELETE FROM {LOCAL_CONFIG['table_name']}
+        DELETE FROM {table}
         WHERE id IN (
-            SELECT id 
-            FROM DuplicatesToRemove 
+            SELECT id
+            FROM DuplicatesToRemove
             WHERE rn > 1
         );
         '''
@@ -139,12 +481,11 @@ def remove_duplicated_files():
         deleted_count = cursor.rowcount
         conn.commit()
         
-        # Contar registros após a remoção
-        cursor.execute(f"SELECT COUNT(*) FROM {LOCAL_CONFIG['table_name']}")
-        records_after = cursor.fetchone()[0]
+        # Contagem aproximada pelos metadados (sem varrer a tabela)
+        records_after = _count_sql_records(cursor, exact=False)
         
-        print(f"  ✓ {deleted_count} duplicatas removidas da tabela {LOCAL_CONFIG['table_name']}.")
-        print(f"    Registros após limpeza: {records_after}")
+        print(f"  ✓ {deleted_count} duplicatas removidas da tabela {table}.")
+        print(f"    Registros após limpeza (aprox.): {records_after}")
         
         cursor.close()
         conn.close()
@@ -153,87 +494,165 @@ def remove_duplicated_files():
         print(f"  ✗ Erro ao remover duplicatas: {e}")
         return False
 
-def send_data_to_sqlite(csv_file):
-    """Salva dados CSV em banco SQLite local."""
+def _count_sql_records(cursor, exact=False):
+    """Conta registros no SQL Server; a versão aproximada lê só os metadados das partições."""
+    table, _ = _dedupe_target()
+    if exact:
+        cursor.execute(f"SELECT COUNT_BIG(*) FROM {table};")
+        return cursor.fetchone()[0]
+    
     try:
-        # Conectar ao banco SQLite local
-        conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-        cursor = conn.cursor()
-        
-        # Criar tabela se não existir
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS edi_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT,
-                formato_processo TEXT,
-                nome_arquivo TEXT,
-                UNIQUE(data, formato_processo, nome_arquivo)
-            )
-        """)
-        
-        # Inserir dados do CSV
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader)  # Pular cabeçalho
-            
-            inserted_count = 0
-            for row in reader:
-                try:
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO edi_logs (data, formato_processo, nome_arquivo) 
-                        VALUES (?, ?, ?)
-                    """, (row[0], row[1], row[2]))
-                    if cursor.rowcount > 0:
-                        inserted_count += 1
-                except Exception as e:
-                    print(f"    ⚠ Erro ao inserir linha: {row} - {e}")
-                    continue
+            SELECT SUM(row_count) FROM sys.dm_db_partition_stats
+            WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1);
+        """, (table,))
+    except Exception:
+        # sys.dm_db_partition_stats exige VIEW DATABASE STATE; sys.partitions não
+        cursor.execute("""
+            SELECT SUM(rows) FROM sys.partitions
+            WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1);
+        """, (table,))
+    return cursor.fetchone()[0] or 0
+
+def _count_sqlite_records(conn, exact=False):
+    """Conta registros no SQLite; sem exact lê o contador de linhas mantido a cada inserção.
+    
+    O contador (state_meta 'edi_logs_rows') soma as linhas realmente inseridas
+    (conn.total_changes), então duplicatas ignoradas pelo INSERT OR IGNORE não
+    contam. O AUTOINCREMENT (sqlite_sequence) não serve: avança mesmo nelas.
+    """
+    _ensure_sqlite_table(conn)
+    if exact:
+        return conn.execute("SELECT COUNT(*) FROM edi_logs").fetchone()[0]
+    row = conn.execute(
+        "SELECT value FROM state_meta WHERE key = ?", (_SQLITE_ROW_COUNTER,)
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+def get_record_count(exact=False):
+    """Retorna o total de registros no destino (aproximado por padrão) ou None em caso de erro."""
+    try:
+        if not pyodbc_available():
+            conn = _connect_sqlite()
+            total = _count_sqlite_records(conn, exact)
+            conn.close()
+            return total
         
-        conn.commit()
+        conn = connect_sql_server()
+        if conn is None:
+            return None
+        cursor = conn.cursor()
+        total = _count_sql_records(cursor, exact)
+        cursor.close()
+        conn.close()
+        return total
+    except Exception as e:
+        print(f"  ✗ Erro ao contar registros: {e}")
+        return None
+
+def _connect_sqlite(db_path=None):
+    """Abre o SQLite local com os pragmas de desempenho (WAL, synchronous, cache)."""
+    conn = sqlite3.connect(db_path or LOCAL_CONFIG['local_db'], timeout=SQLITE_CONFIG['busy_timeout_ms'] / 1000)
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_CONFIG['journal_mode']}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_CONFIG['synchronous']}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CONFIG['cache_size_kb']}")
+    cursor.execute(f"PRAGMA temp_store={SQLITE_CONFIG['temp_store']}")
+    cursor.close()
+    return conn
+
+def _ensure_sqlite_table(conn):
+    """Cria a tabela edi_logs local; a restrição UNIQUE é o único mecanismo de deduplicação.
+    
+    Também garante o contador de linhas em state_meta; em bancos antigos ele
+    parte de um COUNT(*) feito uma única vez.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS edi_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT,
+            formato_processo TEXT,
+            nome_arquivo TEXT,
+            UNIQUE(data, formato_processo, nome_arquivo)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS state_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    row = conn.execute(
+        "SELECT 1 FROM state_meta WHERE key = ?", (_SQLITE_ROW_COUNTER,)
+    ).fetchone()
+    if row is None:
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO state_meta (key, value) SELECT ?, COUNT(*) FROM edi_logs",
+                (_SQLITE_ROW_COUNTER,)
+            )
+
+def send_records_to_sqlite(conn, records, check_existing=True, batch_size=None):
+    """Insere registros no SQLite local em lotes, uma transação por lote.
+    
+    A restrição UNIQUE do SQLite não pode ser desabilitada, então
+    check_existing é aceito apenas por compatibilidade com o SQL Server.
+    """
+    _ensure_sqlite_table(conn)
+    insert_query = """
+        INSERT OR IGNORE INTO edi_logs (data, formato_processo, nome_arquivo)
+        VALUES (?, ?, ?)
+    """
+    batch_size = batch_size or PROCESSING_CONFIG['batch_size']
+    inserted_count = 0
+    for i in range(0, len(records), batch_size):
+        inserted_count += _insert_sqlite_batch(conn, insert_query, records[i:i + batch_size])
+    return inserted_count
+
+def send_data_to_sqlite(csv_file):
+    """Salva dados CSV em banco SQLite local."""
+    try:
+        conn = _connect_sqlite()
+        inserted_count = send_records_to_sqlite(conn, read_csv_records(csv_file))
         conn.close()
         
         print(f"  ✓ {inserted_count} registros salvos no banco SQLite local.")
         return True
-        
+    
     except Exception as e:
         print(f"  ✗ Erro ao salvar dados no SQLite: {e}")
         return False
 
+def _insert_sqlite_batch(conn, insert_query, batch):
+    """Insere um lote com executemany em uma única transação e retorna quantas linhas entraram.
+    
+    O contador de linhas é atualizado na mesma transação.
+    """
+    with conn:
+        changes_before = conn.total_changes
+        conn.executemany(insert_query, batch)
+        inserted = conn.total_changes - changes_before
+        if inserted:
+            conn.execute(
+                "UPDATE state_meta SET value = CAST(value AS INTEGER) + ? WHERE key = ?",
+                (inserted, _SQLITE_ROW_COUNTER)
+            )
+    return inserted
+
 def remove_duplicated_files_sqlite():
-    """Remove registros duplicados na tabela edi_logs do SQLite local."""
+    """Garante unicidade no SQLite local.
+    
+    A restrição UNIQUE(data, formato_processo, nome_arquivo) combinada com
+    INSERT OR IGNORE já impede duplicatas na inserção, então não há mais
+    varredura/DELETE sobre a tabela inteira a cada ciclo.
+    """
     try:
-        # Conectar ao banco SQLite local
-        conn = sqlite3.connect(LOCAL_CONFIG['local_db'])
-        cursor = conn.cursor()
-        
-        # Contar registros antes da remoção
-        cursor.execute("SELECT COUNT(*) FROM edi_logs")
-        records_before = cursor.fetchone()[0]
-        
-        # Remover duplicatas mantendo apenas o menor id para cada combinação única
-        delete_query = '''
-        DELETE FROM edi_logs 
-        WHERE id NOT IN (
-            SELECT MIN(id)
-            FROM edi_logs
-            GROUP BY data, formato_processo, nome_arquivo
-        );
-        '''
-        cursor.execute(delete_query)
-        deleted_count = cursor.rowcount
-        conn.commit()
-        
-        # Contar registros após a remoção
-        cursor.execute("SELECT COUNT(*) FROM edi_logs")
-        records_after = cursor.fetchone()[0]
-        
-        print(f"  ✓ {deleted_count} duplicatas removidas da tabela SQLite local.")
-        print(f"    Registros antes: {records_before} | Registros após: {records_after}")
-        
-        cursor.close()
+        conn = _connect_sqlite()
+        _ensure_sqlite_table(conn)
         conn.close()
+        print("  ✓ Unicidade garantida pela restrição UNIQUE da tabela SQLite local.")
         return True
-        
+    
     except Exception as e:
-        print(f"  ✗ Erro ao remover duplicatas no SQLite: {e}")
+        print(f"  ✗ Erro ao verificar tabela SQLite: {e}")
         return False
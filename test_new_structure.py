@@ -9,6 +9,8 @@ Script para verificar se todos os módulos estão funcionando corretamente.
 import sys
 import os
 import sqlite3
+import subprocess
+import tempfile
 from datetime import datetime
 
 # Adicionar o diretório atual ao path
@@ -222,6 +224,142 @@ def test_report_generation():
         print(f"❌ Erro ao testar relatórios: {e}")
         return False
 
+def _parse_log_blocks(content):
+    """Parser anterior (re.split por bloco), referência para o parser linha a linha."""
+    import re
+    from config.settings import PROCESSING_CONFIG
+    
+    records = []
+    for block in re.split(f"{PROCESSING_CONFIG['separator_line']}\n", content):
+        date_match = re.search(r"Data:\s+(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})", block)
+        process_match = re.search(r"Formato do Processo de EDI:\s+(.+)", block)
+        file_matches = re.findall(r"Nome do Arquivo:\s+(.+)", block)
+        if date_match and process_match and file_matches:
+            for file_name in file_matches:
+                records.append((date_match.group(1), process_match.group(1), file_name))
+    return records
+
+def test_log_parser():
+    """Testa se o parser linha a linha gera os mesmos registros do parser por blocos."""
+    print("\n📄 Testando parser de logs...")
+    
+    try:
+        from config.settings import PROCESSING_CONFIG
+        from core.csv_processor import iter_log_records
+        
+        separator = PROCESSING_CONFIG['separator_line']
+        content = (
+            # Valores na mesma linha, vários arquivos no bloco
+            "Data: 19/10/2026 10:00:00\n"
+            "Formato do Processo de EDI: Upload de FTP\n"
+            "Nome do Arquivo: NFE_001.xml\n"
+            "Nome do Arquivo: NFE_002.xml\n"
+            f"{separator}\n"
+            # Valores na linha seguinte (com linha em branco e espaços no fim do rótulo)
+            "Data:\n"
+            "  19/10/2026 11:00:00\n"
+            "Formato do Processo de EDI:   \n"
+            "\n"
+            "Envio de e-mail por SMTP\n"
+            "Nome do Arquivo:\n"
+            "   CTE_003.xml\n"
+            "Nome do Arquivo: CTE_004.xml\n"
+            f"{separator}\n"
+            # Bloco sem formato: descartado pelos dois parsers
+            "Data: 19/10/2026 12:00:00\n"
+            "Nome do Arquivo: SEM_FORMATO.xml\n"
+            f"{separator}\n"
+            # Último bloco sem separador e sem quebra de linha final
+            "Data: 19/10/2026 13:00:00\n"
+            "Formato do Processo de EDI: Upload de FTP\n"
+            "Nome do Arquivo: NFE_005.xml\n"
+            "Nome do Arquivo: NFE_006.xml"
+        )
+        
+        expected = _parse_log_blocks(content)
+        with tempfile.TemporaryDirectory() as work_dir:
+            log_path = os.path.join(work_dir, 'ConsoleEDI_teste.Log')
+            with open(log_path, 'w', encoding='utf-8') as log:
+                log.write(content)
+            with open(log_path, 'r', encoding='utf-8') as log:
+                records = list(iter_log_records(log))
+        
+        if len(expected) != 6:
+            print(f"❌ Parser por blocos gerou {len(expected)} registros (esperados 6)")
+            return False
+        if records != expected:
+            print(f"❌ Parser linha a linha divergiu do parser por blocos:")
+            print(f"   esperado: {expected}")
+            print(f"   obtido:   {records}")
+            return False
+        
+        print(f"✅ Parser linha a linha confere com o parser por blocos ({len(records)} registros)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erro ao testar parser de logs: {e}")
+        return False
+
+# Comandos somente leitura usados em health checks: orçamento de importação/execução
+STARTUP_BUDGET_SEC = 1.0
+STARTUP_COMMANDS = ['--config', '--stats', '--status']
+# Preparação antes da medição: --status lê um SQLite temporário, sem tentar o SQL Server
+STARTUP_SETUP = {
+    '--status': (
+        "import config.settings, db.sql_server_client\n"
+        "config.settings.LOCAL_CONFIG['local_db'] = 'startup_status.db'\n"
+        "db.sql_server_client._pyodbc_available = False\n"
+    )
+}
+HEAVY_MODULES = ['pyodbc', 'mysql.connector', 'ftplib', 'zipfile',
+                 'core.zip_processor', 'core.csv_processor']
+
+def test_startup_time():
+    """Testa se os comandos somente leitura iniciam rápido e sem módulos pesados."""
+    print("\n⏱️ Testando tempo de inicialização da CLI...")
+    
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    main_path = os.path.join(project_dir, 'cli', 'main.py')
+    probe = (
+        "import sys, time, runpy\n"
+        f"sys.path.insert(0, {project_dir!r})\n"
+        "exec(sys.argv[2])\n"
+        "start = time.perf_counter()\n"
+        "sys.argv = ['main.py', sys.argv[1]]\n"
+        f"runpy.run_path({main_path!r}, run_name='__main__')\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(f'STARTUP {time.perf_counter() - start:.3f} {\",\".join(heavy)}')\n"
+    )
+    
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for command in STARTUP_COMMANDS:
+                result = subprocess.run(
+                    [sys.executable, '-c', probe, command, STARTUP_SETUP.get(command, '')],
+                    cwd=work_dir, capture_output=True, text=True, timeout=60
+                )
+                line = next((l for l in result.stdout.splitlines() if l.startswith('STARTUP')), None)
+                if result.returncode != 0 or line is None:
+                    print(f"❌ {command} falhou: {result.stderr.strip()[-200:]}")
+                    return False
+                
+                parts = line.split()
+                elapsed = float(parts[1])
+                heavy = parts[2] if len(parts) > 2 else ''
+                if heavy:
+                    print(f"❌ {command} importou módulos pesados: {heavy}")
+                    return False
+                if elapsed > STARTUP_BUDGET_SEC:
+                    print(f"❌ {command} levou {elapsed:.3f}s (orçamento: {STARTUP_BUDGET_SEC}s)")
+                    return False
+                print(f"✅ {command}: {elapsed:.3f}s")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erro ao medir inicialização: {e}")
+        return False
+
 def main():
     """Executa todos os testes."""
     print("🧪 TESTE DA NOVA ESTRUTURA DO PROCESSADOR EDI")
@@ -233,6 +371,8 @@ def main():
         ("Bancos de Dados", test_database_creation),
         ("Processadores", test_processors),
         ("Relatórios", test_report_generation),
+        ("Parser de Logs", test_log_parser),
+        ("Inicialização", test_startup_time),
     ]
     
     passed = 0